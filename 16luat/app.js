@@ -1,6 +1,11 @@
 // app.js
 const API_URL = 'http://localhost:5000';
-let allRules = [];
+let allRules = [];        // Các luật đã tải về bảng (theo trang)
+let ruleCount = 0;        // Tổng số luật trên server
+let nextRuleCursor = null;
+const RULE_PAGE_SIZE = 100;
+// File .xlsx/.csv lớn hơn ngưỡng này được gửi nguyên file để server tự đọc (/rules/import)
+const SERVER_IMPORT_MIN_BYTES = 1024 * 1024;
 let savedInitialFacts = [];
 let savedGoals = [];
 
@@ -24,22 +29,62 @@ window.addEventListener('DOMContentLoaded', function() {
     fetchRulesFromServer();
 });
 
-async function fetchRulesFromServer() {
+// Tham số lọc phía server lấy từ ô tìm kiếm (vế trái / vế phải / khoảng ID "10-50")
+function ruleFilterParams() {
+    const text = document.getElementById('searchBox').value.trim();
+    const field = document.getElementById('searchField').value;
+    const params = new URLSearchParams();
+    if (!text) return params;
+    if (field === 'id') {
+        const parts = text.split('-').map(x => x.trim());
+        const lo = parts[0], hi = parts.length > 1 ? parts[1] : parts[0];
+        if (lo) params.set('id_min', lo);
+        if (hi) params.set('id_max', hi);
+    } else {
+        params.set(field === 'premise' ? 'q_premise' : 'q_conclusion', text);
+    }
+    return params;
+}
+
+// Tải trang đầu (reset = true) hoặc trang kế tiếp của bảng luật
+async function fetchRulesFromServer(reset = true) {
     try {
-        const response = await fetch(`${API_URL}/rules`);
+        const params = ruleFilterParams();
+        const filtered = [...params.keys()].length > 0;
+        params.set('limit', RULE_PAGE_SIZE);
+        if (!reset && nextRuleCursor) params.set('cursor', nextRuleCursor);
+
+        const response = await fetch(`${API_URL}/rules?${params}`);
+        if (!response.ok) throw new Error((await response.json()).error);
         const rules = await response.json();
-        allRules = rules;
+        const total = parseInt(response.headers.get('X-Total-Count') || '0');
+        nextRuleCursor = response.headers.get('X-Next-Cursor');
+        if (!filtered) ruleCount = total;
+
+        allRules = reset ? rules : allRules.concat(rules);
         if (allRules.length > 0) {
             hienThiBangLuat(allRules);
         } else {
             const tbody = document.getElementById('ruleTable').getElementsByTagName('tbody')[0];
-            tbody.innerHTML = '<tr><td colspan="5" style="text-align: center;">Chưa có dữ liệu. Vui lòng tải lên file luật hoặc thêm mới.</td></tr>';
+            tbody.innerHTML = filtered
+                ? '<tr><td colspan="5" style="text-align: center;">Không có luật nào khớp bộ lọc.</td></tr>'
+                : '<tr><td colspan="5" style="text-align: center;">Chưa có dữ liệu. Vui lòng tải lên file luật hoặc thêm mới.</td></tr>';
         }
+        capNhatChanBangLuat(total);
     } catch (error) {
         console.error('Error loading rules:', error);
     }
 }
 
+function capNhatChanBangLuat(total) {
+    document.getElementById('ruleTableInfo').textContent = `Đang hiển thị ${allRules.length} / ${total} luật`;
+    document.getElementById('loadMoreRules').style.display = nextRuleCursor ? 'inline-block' : 'none';
+}
+
+function taiThemLuat() {
+    fetchRulesFromServer(false);
+}
+
 // ==================== UPLOAD FILE & SAVE TO SERVER ====================
 function taiLenTapLuat(event) {
     const file = event.target.files[0];
@@ -49,6 +94,12 @@ function taiLenTapLuat(event) {
     
     statusDiv.innerHTML = '<div class="loading show">⏳ Đang xử lý file...</div>';
     
+    if (file.size >= SERVER_IMPORT_MIN_BYTES && /\.(xlsx|csv)$/i.test(file.name)) {
+        importRulesOnServer(file, statusDiv);
+        event.target.value = '';
+        return;
+    }
+    
     const reader = new FileReader();
     
     reader.onload = function(e) {
@@ -71,8 +122,8 @@ function taiLenTapLuat(event) {
                 note: (row.Note || row.note || '').toString()
             }));
             
-            // Gửi lên server để lưu
-            saveRulesToServer(parsedRules, statusDiv);
+            // Chỉ gửi những luật server chưa có hoặc đã khác (không được thì gửi cả file)
+            uploadRulesIncremental(parsedRules, statusDiv);
             
         } catch (error) {
             console.error('Error:', error);
@@ -83,6 +134,127 @@ function taiLenTapLuat(event) {
     reader.readAsArrayBuffer(file);
 }
 
+// Gửi nguyên file cho server đọc theo dòng; server trả về NDJSON tiến độ/lỗi từng dòng
+async function importRulesOnServer(file, statusDiv) {
+    const formData = new FormData();
+    formData.append('file', file);
+    formData.append('mode', 'replace');
+    const rowErrors = [];
+    let done = null;
+    let fatal = null;
+
+    const handleEvent = (event) => {
+        if (event.type === 'error') {
+            rowErrors.push(`Dòng ${event.row}${event.id ? ` (ID ${event.id})` : ''}: ${event.error}`);
+        } else if (event.type === 'progress') {
+            statusDiv.innerHTML = `<div class="loading show">⏳ Đã đọc ${event.rows} dòng, ${event.valid} luật hợp lệ, ${event.errors} dòng lỗi...</div>`;
+        } else if (event.type === 'done') {
+            done = event;
+        } else if (event.type === 'fatal') {
+            fatal = event;
+        }
+    };
+
+    try {
+        const response = await fetch(`${API_URL}/rules/import`, { method: 'POST', body: formData });
+        if (!response.ok) {
+            const result = await response.json();
+            statusDiv.innerHTML = `<div class="error">❌ Lỗi server: ${result.error}</div>`;
+            return;
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (true) {
+            const { value, done: finished } = await reader.read();
+            if (finished) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.filter(line => line.trim()).forEach(line => handleEvent(JSON.parse(line)));
+        }
+        if (buffer.trim()) handleEvent(JSON.parse(buffer));
+    } catch (error) {
+        statusDiv.innerHTML = '<div class="error">❌ Không thể kết nối đến server để nhập file!</div>';
+        return;
+    }
+
+    fetchRulesFromServer();
+    const errorList = rowErrors.length
+        ? `<div style="max-height: 150px; overflow-y: auto; font-size: 12px;">${rowErrors.join('<br>')}</div>`
+        : '';
+    if (fatal) {
+        statusDiv.innerHTML = `<div class="error">❌ ${fatal.error}</div>${errorList}`;
+    } else if (done) {
+        const summary = `✅ Đã nhập ${done.written} luật, xóa ${done.deleted} luật cũ (${done.total} luật trong hệ thống)`;
+        statusDiv.innerHTML = done.errors
+            ? `<div class="error">${summary} - ${done.errors} dòng lỗi bị bỏ qua</div>${errorList}`
+            : `<div class="success">${summary}</div>`;
+    }
+}
+
+// Băm một luật giống rule_hash() ở server: SHA-1 của JSON [id, veTrai, vePhai, note]
+async function hashRule(rule) {
+    const canonical = JSON.stringify([
+        String(rule.id ?? ''), String(rule.veTrai ?? ''), String(rule.vePhai ?? ''), String(rule.note ?? '')
+    ]);
+    const digest = await crypto.subtle.digest('SHA-1', new TextEncoder().encode(canonical));
+    return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+}
+
+async function uploadRulesIncremental(rules, statusDiv) {
+    // crypto.subtle chỉ có trong secure context (https/localhost)
+    if (!(window.crypto && crypto.subtle)) {
+        return saveRulesToServer(rules, statusDiv);
+    }
+    try {
+        const byId = new Map();
+        rules.forEach(rule => byId.set(String(rule.id), rule));
+        // ID trống/trùng: gửi cả file để /rules/upload từ chối và liệt kê các ID lỗi
+        if (byId.size !== rules.length || byId.has('')) {
+            return saveRulesToServer(rules, statusDiv);
+        }
+        const hashes = {};
+        for (const [id, rule] of byId) {
+            hashes[id] = await hashRule(rule);
+        }
+
+        const diffResponse = await fetch(`${API_URL}/rules/upload/diff`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ hashes: hashes })
+        });
+        if (!diffResponse.ok) {
+            return saveRulesToServer(rules, statusDiv);
+        }
+        const diff = await diffResponse.json();
+        const changedRules = [...diff.missing, ...diff.changed].map(id => byId.get(id));
+
+        if (changedRules.length === 0 && diff.removed.length === 0) {
+            statusDiv.innerHTML = `<div class="success">✅ Tập luật không thay đổi (${byId.size} luật).</div>`;
+            setTimeout(() => { statusDiv.innerHTML = ''; }, 3000);
+            return;
+        }
+
+        const response = await fetch(`${API_URL}/rules/upload/patch`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ rules: changedRules, delete: diff.removed })
+        });
+        const result = await response.json();
+
+        if (result.success) {
+            fetchRulesFromServer();
+            statusDiv.innerHTML = `<div class="success">✅ ${result.message}</div>`;
+            setTimeout(() => { statusDiv.innerHTML = ''; }, 3000);
+        } else {
+            statusDiv.innerHTML = `<div class="error">❌ Lỗi server: ${result.error}</div>`;
+        }
+    } catch (error) {
+        statusDiv.innerHTML = '<div class="error">❌ Không thể kết nối đến server để lưu!</div>';
+    }
+}
+
 async function saveRulesToServer(rules, statusDiv) {
     try {
         const response = await fetch(`${API_URL}/rules/upload`, {
@@ -94,8 +266,7 @@ async function saveRulesToServer(rules, statusDiv) {
         const result = await response.json();
         
         if (result.success) {
-            allRules = rules;
-            hienThiBangLuat(allRules);
+            fetchRulesFromServer();
             statusDiv.innerHTML = `<div class="success">✅ ${result.message}</div>`;
             setTimeout(() => { statusDiv.innerHTML = ''; }, 3000);
         } else {
@@ -127,25 +298,14 @@ function hienThiBangLuat(rules) {
 
 // ==================== CRUD ACTIONS (SYNC WITH SERVER) ====================
 
+// Lọc phía server; chờ người dùng ngừng gõ 300ms rồi mới tải lại
+let searchTimer = null;
 function searchRules() {
-    const input = document.getElementById('searchBox').value.toLowerCase();
-    const tbody = document.getElementById('ruleTable').getElementsByTagName('tbody')[0];
-    const rows = tbody.getElementsByTagName('tr');
-    
-    for (let row of rows) {
-        const text = row.textContent.toLowerCase();
-        row.style.display = text.includes(input) ? '' : 'none';
-    }
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => fetchRulesFromServer(), 300);
 }
 
 async function themLuatMoi() {
-    // Tìm ID lớn nhất hiện tại để gợi ý (Server sẽ xử lý chính, nhưng client làm cho đẹp)
-    const maxId = allRules.length > 0 
-        ? Math.max(...allRules.map(r => parseInt(r.id) || 0)) 
-        : 0;
-        
-    const newId = (maxId + 1).toString();
-    
     const veTrai = prompt('Nhập vế trái (premise):');
     if (veTrai === null) return; 
     
@@ -155,7 +315,7 @@ async function themLuatMoi() {
     const note = prompt('Nhập ghi chú (Note):') || '';
 
     if (veTrai && vePhai) {
-        const newRule = { id: newId, veTrai, vePhai, note };
+        const newRule = { veTrai, vePhai, note }; // Server cấp ID
         
         try {
             const response = await fetch(`${API_URL}/rules/add`, {
@@ -166,7 +326,8 @@ async function themLuatMoi() {
             
             const result = await response.json();
             if (result.success) {
-                allRules = result.rules;
+                allRules.push(result.rule); // Server trả về luật đã lưu (kèm ID được cấp)
+                ruleCount++;
                 hienThiBangLuat(allRules);
                 alert('✅ Đã thêm luật mới và lưu vào server!');
             } else {
@@ -210,7 +371,7 @@ async function saveRuleEdit(btn) {
         
         const result = await response.json();
         if (result.success) {
-            allRules = result.rules;
+            allRules = allRules.map(r => String(r.id) === String(id) ? result.rule : r);
             hienThiBangLuat(allRules);
         } else {
             alert('❌ Lỗi: ' + result.error);
@@ -236,7 +397,8 @@ async function deleteRule(btn) {
         
         const result = await response.json();
         if (result.success) {
-            allRules = result.rules;
+            allRules = allRules.filter(r => String(r.id) !== String(id));
+            ruleCount--;
             hienThiBangLuat(allRules);
         } else {
             alert('❌ Lỗi: ' + result.error);
@@ -246,12 +408,46 @@ async function deleteRule(btn) {
     }
 }
 
+// ==================== ĐỒ THỊ (SVG + ETag) ====================
+// Kết quả gần nhất của mỗi endpoint; server trả 304 nếu ETag còn khớp => dùng lại, không tải lại
+const graphImageCache = {};
+
+async function fetchGraphImage(endpoint, body) {
+    const cached = graphImageCache[endpoint];
+    const headers = { 'Content-Type': 'application/json' };
+    if (cached) headers['If-None-Match'] = cached.etag;
+    
+    const response = await fetch(`${API_URL}${endpoint}`, {
+        method: 'POST',
+        headers: headers,
+        body: JSON.stringify(body)
+    });
+    if (response.status === 304 && cached) {
+        return cached.result;
+    }
+    const result = await response.json();
+    const etag = response.headers.get('ETag');
+    if (result.success && etag) {
+        graphImageCache[endpoint] = { etag: etag, result: result };
+    }
+    return result;
+}
+
+// Hiển thị kết quả đồ thị: SVG do server dựng (trình duyệt tự vẽ) hoặc ảnh PNG
+function hienThiDoThi(container, result, alt) {
+    if (result.svg) {
+        container.innerHTML = `<div class="graph-svg" title="${alt}" style="width: 100%; overflow: auto;">${result.svg}</div>`;
+    } else {
+        container.innerHTML = `<img src="data:image/png;base64,${result.image}" alt="${alt}" style="max-width: 100%;">`;
+    }
+}
+
 // ==================== GENERATE FPG ====================
 async function generateFPG() {
     const container = document.getElementById('fpgContainer');
     const loading = document.getElementById('fpgLoading');
     
-    if (allRules.length === 0) {
+    if (ruleCount === 0) {
         alert('⚠️ Chưa có luật nào!');
         return;
     }
@@ -265,20 +461,15 @@ async function generateFPG() {
     container.innerHTML = '';
     
     try {
-        const response = await fetch(`${API_URL}/generate_fpg`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                rules: allRules, // Gửi rules hiện tại (hoặc để null server tự load)
-                initial_facts: savedInitialFacts,
-                target_goals: savedGoals,
-                layout_method: 'kamada_kawai'
-            })
+        const result = await fetchGraphImage('/generate_fpg', {
+            initial_facts: savedInitialFacts,
+            target_goals: savedGoals,
+            layout_method: 'kamada_kawai',
+            output: 'svg',
+            prune: document.getElementById('fpgPrune').checked
         });
-        
-        const result = await response.json();
         if (result.success) {
-            container.innerHTML = `<img src="data:image/png;base64,${result.image}" alt="FPG Graph" style="max-width: 100%;">`;
+            hienThiDoThi(container, result, 'FPG Graph');
         } else {
             container.innerHTML = `<p class="error">❌ ${result.error}</p>`;
         }
@@ -294,7 +485,7 @@ async function generateRPG() {
     const container = document.getElementById('rpgContainer');
     const loading = document.getElementById('rpgLoading');
     
-    if (allRules.length === 0) {
+    if (ruleCount === 0) {
         alert('⚠️ Chưa có luật nào!');
         return;
     }
@@ -303,19 +494,14 @@ async function generateRPG() {
     container.innerHTML = '';
     
     try {
-        const response = await fetch(`${API_URL}/generate_rpg`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({
-                rules: allRules,
-                initial_facts: savedInitialFacts,
-                target_goals: savedGoals
-            })
+        const result = await fetchGraphImage('/generate_rpg', {
+            initial_facts: savedInitialFacts,
+            target_goals: savedGoals,
+            output: 'svg',
+            prune: document.getElementById('rpgPrune').checked
         });
-        
-        const result = await response.json();
         if (result.success) {
-            container.innerHTML = `<img src="data:image/png;base64,${result.image}" alt="RPG Graph" style="max-width: 100%;">`;
+            hienThiDoThi(container, result, 'RPG Graph');
         } else {
             container.innerHTML = `<p class="error">❌ ${result.error}</p>`;
         }
@@ -351,9 +537,9 @@ async function suydienChiTiet() {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
-                rules: allRules,
                 initial_facts: initialFacts,
-                goals: goals
+                goals: goals,
+                trace_mode: 'compact'
             })
         });
         
@@ -386,10 +572,29 @@ async function suydienChiTiet() {
     }
 }
 
+// Dựng lại bảng đầy đủ từ bảng dạng delta (trace_mode = 'compact').
+// Dòng có THOA là ảnh chụp đầy đủ; dòng delta: rule_id rời R và vào VET, fact vào THOA.
+function expandForwardProcessTable(processTable) {
+    let THOA = new Set(), TG = [], R = new Set(), VET = [];
+    return processTable.map(row => {
+        if (row.THOA) {
+            THOA = new Set(row.THOA); TG = row.TG; R = new Set(row.R); VET = row.VET.slice();
+            return row;
+        }
+        THOA.add(row.fact);
+        R.delete(row.rule_id);
+        VET.push(row.rule_id);
+        return {
+            step: row.step, rule: row.rule, note: row.note,
+            THOA: [...THOA].sort(), TG: TG, R: [...R].sort(), VET: VET.slice()
+        };
+    });
+}
+
 function displayForwardProcessTable(processTable) {
     const tbody = document.getElementById('process-table-body');
     tbody.innerHTML = '';
-    processTable.forEach(row => {
+    expandForwardProcessTable(processTable).forEach(row => {
         const tr = document.createElement('tr');
         if (row.rule === 'DONE') tr.style.backgroundColor = '#d4edda';
         if (row.rule === 'FAIL') tr.style.backgroundColor = '#f8d7da';
@@ -441,9 +646,9 @@ async function suydienLui() {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
-                rules: allRules,
                 initial_facts: initialFacts,
-                goals: goals
+                goals: goals,
+                trace_mode: 'compact'
             })
         });
         
@@ -482,7 +687,7 @@ async function getBackwardTrace(initialFacts, goals) {
         const response = await fetch(`${API_URL}/backward_inference_trace`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
-            body: JSON.stringify({ rules: allRules, initial_facts: initialFacts, goals: goals })
+            body: JSON.stringify({ initial_facts: initialFacts, goals: goals })
         });
         const result = await response.json();
         if (result.success && result.trace) {
@@ -505,10 +710,30 @@ function displayBackwardTrace(trace) {
     container.innerHTML = html;
 }
 
+// Dựng lại bảng suy diễn lùi từ bảng dạng delta (trace_mode = 'compact').
+// Dòng có current_goals là ảnh chụp đầy đủ; dòng delta: bỏ goal_removed, thêm goals_added.
+function expandBackwardProcessTable(processTable) {
+    let goals = new Set(), GT = [], VET = [];
+    return processTable.map(row => {
+        if (row.current_goals) {
+            goals = new Set(row.current_goals.filter(g => g !== '∅'));
+            GT = row.GT; VET = row.VET.slice();
+            return row;
+        }
+        if (row.goal_removed !== null) goals.delete(row.goal_removed);
+        row.goals_added.forEach(g => goals.add(g));
+        VET.push(row.rule_id);
+        return {
+            step: row.step, rule: row.rule, explanation: row.explanation, note: row.note,
+            current_goals: goals.size ? [...goals].sort() : ['∅'], GT: GT, VET: VET.slice()
+        };
+    });
+}
+
 function displayBackwardProcessTable(processTable) {
     const tbody = document.getElementById('process-table-body-backward');
     tbody.innerHTML = '';
-    processTable.forEach(row => {
+    expandBackwardProcessTable(processTable).forEach(row => {
         const tr = document.createElement('tr');
         if (row.rule === 'DONE') tr.style.backgroundColor = '#d4edda';
         if (row.rule === 'FAIL') tr.style.backgroundColor = '#f8d7da';
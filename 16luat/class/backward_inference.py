@@ -1,3 +1,5 @@
+import heapq
+import re
 from typing import List, Dict, Tuple, Set
 
 SEPARATORS = ['∧', '^', '&', 'AND', 'and', '&&', ' AND ', ' and ', ';', '|']
@@ -10,10 +12,12 @@ def _is_edge_variable(var: str) -> bool:
 def _is_angle_variable(var: str) -> bool:
     return var in ANGLE_VARS or (len(var) == 1 and var.isupper())
 
+# Một lượt regex thay cho 10 lần str.replace; '&&', ' AND ', ' and ' đã được
+# '&', 'AND', 'and' bao trùm nên kết quả giống hệt thay thế tuần tự theo SEPARATORS
+_SEPARATOR_RE = re.compile(r'[∧^&;|]|AND|and')
+
 def _normalize_left(left_expr: str) -> List[str]:
-    expr = str(left_expr)
-    for sep in SEPARATORS:
-        expr = expr.replace(sep, ',')
+    expr = _SEPARATOR_RE.sub(',', str(left_expr))
     parts = [p.strip() for p in expr.split(',') if p.strip()]
     return parts
 
@@ -66,56 +70,196 @@ def _find_optimal_vet(
             }
     return optimal_vet, usage_info
 
-# === Hàm đệ quy: lưu lại chuỗi luật duy nhất đúng ===
-def _backward_chain_get_vet(
-    goals: Set[str], known: Set[str], rules_dict: Dict[str, Dict],
-    vet_full: List[str], used_rule_id: Set[str],
-    max_depth=50
+def _rule_order_key(rule_id: str, rules_dict: Dict[str, Dict]) -> Tuple:
+    # Thứ tự ưu tiên luật: ít tiền đề trước, rồi id số tăng dần (id chữ xếp sau)
+    n = len(rules_dict[rule_id]['premise'])
+    if rule_id.isdigit():
+        return (n, 0, int(rule_id), rule_id)
+    return (n, 1, 0, rule_id)
+
+def _index_by_conclusion(rules_dict: Dict[str, Dict]) -> Dict[str, List[str]]:
+    # Chỉ mục goal -> các luật có kết luận là goal, đã xếp theo thứ tự ưu tiên
+    index: Dict[str, List[str]] = {}
+    for rule_id, rule in rules_dict.items():
+        index.setdefault(rule['conclusion'], []).append(rule_id)
+    for rule_ids in index.values():
+        rule_ids.sort(key=lambda r: _rule_order_key(r, rules_dict))
+    return index
+
+# === Suy diễn lùi có bảng nhớ (tabling), không đệ quy ===
+def _choose_rule(
+    goal: str, known: Set[str], provable: Set[str], rules_dict: Dict[str, Dict],
+    by_conclusion: Dict[str, List[str]], choice: Dict[str, str], failed: Set[str]
 ) -> bool:
-    if goals.issubset(known):
-        return True
-    if max_depth <= 0:
-        return False
-    # Tìm goal tiếp cần chứng minh
-    for g in sorted(goals):
-        if g not in known:
-            fact_to_prove = g
-            break
-    else:
-        return goals.issubset(known) # redundant but safe
-    fact_type = 'angle' if _is_angle_variable(fact_to_prove) else 'edge'
-    applicable_rules = []
-    for rule_id, rule_data in rules_dict.items():
-        if rule_data['conclusion'] == fact_to_prove and rule_id not in used_rule_id:
-            if rule_data['conclusion_type'] == fact_type:
-                applicable_rules.append((rule_id, len(rule_data['premise']), 0))
+    """
+    Chọn luật cho `goal` như bản DFS cũ: luật ưu tiên đầu tiên mà mọi tiền đề
+    đều chứng minh được mà không quay lại một fact đang chứng minh dở (chu trình).
+    Duyệt sâu bằng ngăn xếp tường minh; kết quả ghi vào `choice` (fact -> luật).
+    - fact đã có trong choice được dùng lại (chứng minh của nó không phụ thuộc đường đi)
+    - `failed`: fact thất bại mà không gặp chu trình nào - thất bại với mọi đường đi
+    """
+    # frame: [fact, vị trí luật đang thử, vị trí tiền đề đang xét, có gặp chu trình]
+    stack = [[goal, 0, 0, False]]
+    on_path = {goal}
+    child_ok = None
+    while stack:
+        frame = stack[-1]
+        fact, rule_pos, premise_pos, blocked = frame
+        candidates = by_conclusion.get(fact, ())
+        if child_ok is not None:
+            if child_ok:
+                frame[2] += 1
             else:
-                applicable_rules.append((rule_id, len(rule_data['premise']), 1))
-    if not applicable_rules:
-        return False
-    applicable_rules.sort(
-        key=lambda x: (x[2], x[1], int(x[0]) if x[0].isdigit() else x[0])
-    )
-    for rule_id, _, _ in applicable_rules:
-        rule = rules_dict[rule_id]
-        premise = rule['premise']
-        new_goals = set(goals)
-        if fact_to_prove in new_goals:
-            new_goals.remove(fact_to_prove)
-        for p in premise:
-            if p not in known:
-                new_goals.add(p)
+                frame[1], frame[2] = rule_pos + 1, 0
+            child_ok = None
+            continue
+        if rule_pos >= len(candidates):
+            stack.pop()
+            on_path.discard(fact)
+            if blocked and stack:
+                stack[-1][3] = True
+            elif not blocked:
+                failed.add(fact)
+            child_ok = False
+            continue
+        premise = rules_dict[candidates[rule_pos]]['premise']
+        if premise_pos == len(premise):
+            choice[fact] = candidates[rule_pos]
+            stack.pop()
+            on_path.discard(fact)
+            child_ok = True
+            continue
+        p = premise[premise_pos]
+        if p in known or p in choice:
+            frame[2] += 1
+        elif p in on_path or p not in provable or p in failed:
+            if p in on_path:
+                frame[3] = True
+            frame[1], frame[2] = rule_pos + 1, 0
+        else:
+            stack.append([p, 0, 0, False])
+            on_path.add(p)
+    return goal in choice
+
+def _backward_chain_get_vet(
+    goals: Set[str], known: Set[str], rules_dict: Dict[str, Dict],
+    by_conclusion: Dict[str, List[str]] = None
+) -> Tuple[bool, List[str]]:
+    """
+    Returns:
+        (success, vet_full): vet_full là chuỗi luật theo thứ tự suy diễn lùi
+        (goal trước, tiền đề sau); mỗi fact chỉ được chứng minh một lần.
+
+    Bốn pha, đều dùng vòng lặp/hàng đợi nên không phụ thuộc giới hạn đệ quy:
+    1. Vùng liên quan: từ goals đi ngược qua chỉ mục kết luận, gom các luật
+       có thể góp phần chứng minh (mỗi fact chỉ mở rộng một lần).
+    2. Bảng nhớ: bao đóng tiến kiểu bộ đếm trên toàn bộ vùng đó; fact không
+       nằm trong bao đóng là thất bại, khỏi phải thử.
+    3. Trích chứng minh: luôn xử lý goal nhỏ nhất chưa chứng minh (như bản
+       DFS cũ) với luật ưu tiên đầu tiên có mọi tiền đề chứng minh được mà
+       không tạo chu trình (_choose_rule).
+    4. Xếp chuỗi: sắp xếp topo ngược trên đồ thị chứng minh, đảo lại thì
+       tiền đề luôn đứng trước luật dùng nó (kể cả fact dùng chung).
+    """
+    if by_conclusion is None:
+        by_conclusion = _index_by_conclusion(rules_dict)
+
+    # 1. Vùng liên quan
+    relevant_rules: List[str] = []
+    seen: Set[str] = set()
+    stack = [g for g in goals if g not in known]
+    while stack:
+        fact = stack.pop()
+        if fact in seen:
+            continue
+        seen.add(fact)
+        for rule_id in by_conclusion.get(fact, ()):
+            relevant_rules.append(rule_id)
+            for p in rules_dict[rule_id]['premise']:
+                if p not in known and p not in seen:
+                    stack.append(p)
+
+    # 2. Bao đóng tiến trên vùng liên quan
+    provable: Set[str] = set()
+    missing: Dict[str, int] = {}
+    watchers: Dict[str, List[str]] = {}
+    queue: List[str] = []
+    for rule_id in relevant_rules:
+        pending = {p for p in rules_dict[rule_id]['premise'] if p not in known}
+        missing[rule_id] = len(pending)
+        for p in pending:
+            watchers.setdefault(p, []).append(rule_id)
+        if not pending:
+            queue.append(rule_id)
+    head = 0
+    while head < len(queue):
+        conclusion = rules_dict[queue[head]]['conclusion']
+        head += 1
+        if conclusion in provable or conclusion in known:
+            continue
+        provable.add(conclusion)
+        for rule_id in watchers.pop(conclusion, ()):
+            missing[rule_id] -= 1
+            if missing[rule_id] == 0:
+                queue.append(rule_id)
+
+    if any(g not in known and g not in provable for g in goals):
+        return False, []
+
+    # 3. Chọn luật cho từng fact theo thứ tự goal nhỏ nhất trước (như bản DFS cũ)
+    choice: Dict[str, str] = {}
+    failed: Set[str] = set()
+    needed: List[str] = []
+    frontier = [g for g in goals if g not in known]
+    heapq.heapify(frontier)
+    queued = set(frontier)
+    while frontier:
+        goal = heapq.heappop(frontier)
+        if goal not in choice:
+            # Không có fact nào đang chứng minh dở nên luôn thành công với fact trong bao đóng
+            _choose_rule(goal, known, provable, rules_dict, by_conclusion, choice, failed)
+        needed.append(goal)
+        for p in rules_dict[choice[goal]]['premise']:
+            if p not in known and p not in queued:
+                queued.add(p)
+                heapq.heappush(frontier, p)
+
+    # 4. Xếp chuỗi: một fact chỉ được lấy ra khi mọi luật dùng nó đã nằm trong chuỗi,
+    # nên đảo ngược lại thì tiền đề luôn được suy ra trước luật cần nó.
+    # Giữa các fact sẵn sàng vẫn lấy fact nhỏ nhất - trùng thứ tự bản DFS cũ
+    # khi bản cũ không phải chứng minh lại fact nào.
+    consumers = dict.fromkeys(needed, 0)
+    for fact in needed:
+        for p in set(rules_dict[choice[fact]]['premise']):
+            if p in consumers:
+                consumers[p] += 1
+    ready = [fact for fact in needed if consumers[fact] == 0]
+    heapq.heapify(ready)
+    vet_full: List[str] = []
+    while ready:
+        fact = heapq.heappop(ready)
+        rule_id = choice[fact]
         vet_full.append(rule_id)
-        used_rule_id.add(rule_id)
-        if _backward_chain_get_vet(new_goals, known, rules_dict, vet_full, used_rule_id, max_depth-1):
-            return True
-        vet_full.pop()
-        used_rule_id.remove(rule_id)
-    return False
-
-def backward_inference_detailed(initial_facts: List[str], goals: List[str], rules_list: List[Dict]
+        for p in set(rules_dict[rule_id]['premise']):
+            if p in consumers:
+                consumers[p] -= 1
+                if consumers[p] == 0:
+                    heapq.heappush(ready, p)
+    return True, vet_full
+
+def backward_inference_detailed(initial_facts: List[str], goals: List[str], rules_list: List[Dict],
+    trace_mode: str = 'full', snapshot_every: int = 50, compiled=None
 ) -> Tuple[bool, List[Dict], List[str], List[str], List[Dict], str]:
-    rules_dict = _parse_rules(rules_list)
+    # trace_mode='compact': mỗi bước chỉ ghi phần thay đổi
+    # {step, rule, rule_id, goal_removed, goals_added, explanation, note};
+    # bước 0, dòng DONE/FAIL và mỗi `snapshot_every` bước kèm current_goals/GT/VET đầy đủ
+    # compiled: CompiledRuleBase (rule_base.py) đã parse sẵn; khi có thì bỏ qua rules_list
+    compact = trace_mode == 'compact'
+    if compiled is not None:
+        rules_dict, by_conclusion = compiled.rules_dict, compiled.by_conclusion
+    else:
+        rules_dict = _parse_rules(rules_list)
+        by_conclusion = None
     if not rules_dict:
         return False, [], [], [], [], "Khong co luat nao trong he thong"
     GT: Set[str] = set([x.strip() for x in initial_facts if str(x).strip()])
@@ -129,9 +273,7 @@ def backward_inference_detailed(initial_facts: List[str], goals: List[str], rule
         'explanation': f'Khoi tao: KL = {{{", ".join(sorted(KL))}}}, GT = {{{", ".join(sorted(GT))}}}',
         'note': 'Bat dau qua trinh suy dien lui'
     }]
-    VET_FULL: List[str] = []
-    used_rule_id = set()
-    success = _backward_chain_get_vet(KL.copy(), GT, rules_dict, VET_FULL, used_rule_id)
+    success, VET_FULL = _backward_chain_get_vet(KL, GT, rules_dict, by_conclusion)
     if not success:
         conclusion = f"THAT BAI! Khong the chung minh {KL} tu {GT}"
         process_table.append({
@@ -147,26 +289,38 @@ def backward_inference_detailed(initial_facts: List[str], goals: List[str], rule
     # Build clean table (chỉ các bước thật sự theo chuỗi đúng)
     step = 1
     current_goals = KL.copy()
+    proven: Set[str] = set()  # fact đã chứng minh thì không đưa lại vào tập goal
     for rule_id in VET_FULL:
         rule = rules_dict[rule_id]
         premise = rule['premise']
         fact_to_prove = rule['conclusion']
         fact_type = 'angle' if _is_angle_variable(fact_to_prove) else 'edge'
+        goal_removed = None
         if fact_to_prove in current_goals:
             current_goals.remove(fact_to_prove)
+            goal_removed = fact_to_prove
+        proven.add(fact_to_prove)
+        goals_added = []
         for p in premise:
-            if p not in GT:
+            if p not in GT and p not in proven and p not in current_goals:
                 current_goals.add(p)
+                goals_added.append(p)
         premise_str = ', '.join(premise)
-        process_table.append({
+        row = {
             'step': step,
             'rule': f'r{rule_id}',
-            'current_goals': sorted(current_goals) if current_goals else ['∅'],
-            'GT': sorted(GT),
-            'VET': VET_FULL[:step],
             'explanation': f'Ap dung r{rule_id}: {{{premise_str}}} → {fact_to_prove} (loai: {fact_type})',
             'note': rule['note']
-        })
+        }
+        if compact:
+            row['rule_id'] = rule_id
+            row['goal_removed'] = goal_removed
+            row['goals_added'] = goals_added
+        if not compact or (snapshot_every > 0 and step % snapshot_every == 0):
+            row['current_goals'] = sorted(current_goals) if current_goals else ['∅']
+            row['GT'] = sorted(GT)
+            row['VET'] = VET_FULL[:step]
+        process_table.append(row)
         step += 1
     process_table.append({
         'step': step,
@@ -213,21 +367,25 @@ CAC BUOC TINH TOAN (theo VET toi uu):
         conclusion += f"\nCac luat bi loai bo (khong can thiet): {', '.join(['r' + r for r in removed])}"
     return success, process_table, VET_FULL, VET_OPTIMAL, explanation, conclusion
 
-def backward_inference_with_trace(initial_facts: List[str], goals: List[str], rules_list: List[Dict]) -> Tuple[bool, List[Dict], List[Dict]]:
+def backward_inference_with_trace(initial_facts: List[str], goals: List[str], rules_list: List[Dict],
+    compiled=None) -> Tuple[bool, List[Dict], List[Dict]]:
     # Xây dựng trace chỉ theo chuỗi thành công
-    rules_dict = _parse_rules(rules_list)
+    if compiled is not None:
+        rules_dict, by_conclusion = compiled.rules_dict, compiled.by_conclusion
+    else:
+        rules_dict = _parse_rules(rules_list)
+        by_conclusion = None
     if not rules_dict:
         return False, [], []
     GT: Set[str] = set([x.strip() for x in initial_facts if str(x).strip()])
     KL: Set[str] = set([x.strip() for x in goals if str(x).strip()])
     trace: List[Dict] = [{'set': sorted(KL), 'rule': None, 'action': 'START', 'note': ''}]
     applied_rules: List[Dict]=[]
-    VET_FULL: List[str] = []
-    used_rule_id = set()
-    success = _backward_chain_get_vet(KL.copy(), GT, rules_dict, VET_FULL, used_rule_id)
+    success, VET_FULL = _backward_chain_get_vet(KL, GT, rules_dict, by_conclusion)
     if not success:
         return False, trace, applied_rules
     current_set = KL.copy()
+    proven: Set[str] = set()
     for rule_id in VET_FULL:
         rule = rules_dict[rule_id]
         goal = rule['conclusion']
@@ -235,8 +393,9 @@ def backward_inference_with_trace(initial_facts: List[str], goals: List[str], ru
         rule_note = rule['note']
         if goal in current_set:
             current_set.remove(goal)
+        proven.add(goal)
         for p in premise:
-            if p not in GT:
+            if p not in GT and p not in proven:
                 current_set.add(p)
         trace.append({
             'set': sorted(current_set) if current_set else ['∅'],
@@ -0,0 +1,98 @@
+"""
+benchmark_rpg.py - So sánh cách dựng cạnh RPG: so từng cặp luật (cũ) và chỉ mục sự kiện -> luật (RPG.build_graph)
+
+Sinh tập luật giả lập (mặc định 20.000 luật): mỗi luật có 1-4 tiền đề lấy từ
+kết luận của các luật trước hoặc sự kiện gốc, rồi đo thời gian dựng đồ thị
+theo hai cách trên cùng dữ liệu và kiểm tra hai đồ thị giống hệt nhau
+(kể cả thứ tự cạnh).
+
+Cách cũ là O(n² × số tiền đề): với 20.000 luật có thể mất vài phút.
+Dùng --pairwise-rules để chỉ đo cách cũ trên N luật đầu.
+
+Chạy: python benchmark_rpg.py [--rules 20000] [--pairwise-rules 20000] [--seed 42]
+"""
+import argparse
+import time
+
+import networkx as nx
+import numpy as np
+
+from rpg import RPG
+
+
+def make_synthetic_rules(count, seed=42):
+    """Luật dạng {id, veTrai, vePhai, note} như rules.json; khoảng 10% kết luận bị trùng"""
+    rng = np.random.default_rng(seed)
+    base_facts = [f'g{i}' for i in range(max(10, count // 20))]
+    conclusions = []
+    rules = []
+    for i in range(1, count + 1):
+        pool_size = len(base_facts) + len(conclusions)
+        premises = []
+        for k in rng.integers(0, pool_size, size=rng.integers(1, 5)):
+            premises.append(base_facts[k] if k < len(base_facts) else conclusions[k - len(base_facts)])
+        if conclusions and rng.random() < 0.1:
+            conclusion = conclusions[rng.integers(0, len(conclusions))]
+        else:
+            conclusion = f'f{i}'
+        conclusions.append(conclusion)
+        rules.append({'id': str(i), 'veTrai': ' ∧ '.join(premises), 'vePhai': conclusion, 'note': ''})
+    return rules
+
+
+def build_graph_pairwise(rpg):
+    """Cách dựng cạnh trước đây: so mọi cặp luật (i, j), tìm f trong left của j bằng duyệt list"""
+    graph = nx.DiGraph()
+    for rule in rpg.rules:
+        graph.add_node(rule['id'], node_type='rule',
+                       antecedents=rule['antecedents'], consequent=rule['consequent'])
+    for i, rule_i in enumerate(rpg.rules):
+        for j, rule_j in enumerate(rpg.rules):
+            if i != j and rule_i['consequent'] in rule_j['antecedents']:
+                graph.add_edge(rule_i['id'], rule_j['id'])
+    return graph
+
+
+def load(rules):
+    rpg = RPG()
+    rpg.load_from_data(rules)
+    return rpg
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', type=int, default=20_000)
+    parser.add_argument('--pairwise-rules', type=int, default=None,
+                        help='số luật dùng để đo cách cũ (mặc định: bằng --rules)')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rules = make_synthetic_rules(args.rules, args.seed)
+    rpg = load(rules)
+    _, t_new = timed(rpg.build_graph)
+    print(f"📊 Tập luật giả lập: {len(rules)} luật, "
+          f"{rpg.graph.number_of_edges()} cạnh RPG")
+    print(f"  chỉ mục   : {t_new:8.3f}s ({len(rules)} luật)")
+
+    pairwise_count = min(args.pairwise_rules or args.rules, args.rules)
+    subset = rpg if pairwise_count == args.rules else load(rules[:pairwise_count])
+    if subset is not rpg:
+        _, t_new = timed(subset.build_graph)
+        print(f"  chỉ mục   : {t_new:8.3f}s ({pairwise_count} luật)")
+    old_graph, t_old = timed(build_graph_pairwise, subset)
+    print(f"  từng cặp  : {t_old:8.3f}s ({pairwise_count} luật)")
+    print(f"  Tăng tốc   : x{t_old / t_new:.1f}")
+
+    same = (list(old_graph.nodes(data=True)) == list(subset.graph.nodes(data=True))
+            and list(old_graph.edges()) == list(subset.graph.edges()))
+    print(f"  Kết quả giống nhau: {'✅' if same else '❌'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -8,6 +8,11 @@ import base64
 from collections import defaultdict
 import numpy as np
 
+from layout_engine import KAMADA_KAWAI_MAX_NODES, layered_layout, node_levels
+
+# Cac cach bo tri compute_layout() ho tro
+LAYOUT_METHODS = ('improved_hierarchical', 'spring', 'kamada_kawai', 'circular', 'shell')
+
 
 class FPG:
     def __init__(self):
@@ -17,6 +22,7 @@ class FPG:
         self.conclusions = set()
         self.initial_facts = set()
         self.target_goals = set()
+        self.outside = set()  # Tien de nam ngoai phan lien quan GT -> KL (do thi rut gon), ve mo
         
     def add_rule(self, rule_id, antecedents, consequent):
         self.rules.append({'id': rule_id, 'antecedents': antecedents, 'consequent': consequent})
@@ -53,9 +59,59 @@ class FPG:
                 if ant in self.graph.nodes and consequent in self.graph.nodes:
                     self.graph.add_edge(ant, consequent, rule=rule_label)
 
-    def visualize_to_base64(self, figsize=(26, 18), layout_method='improved_hierarchical'):
+    def subgraph(self, rule_indices, cone):
+        """
+        FPG moi chi gom cac luat rule_indices (xem graph_cone). Luat giu du tien de:
+        tien de ngoai cone (khong suy ra duoc tu GT) nam trong sub.outside va duoc ve mo,
+        de luat a ∧ x -> g khong bi hieu nham thanh a -> g
+        """
+        sub = FPG()
+        for index in rule_indices:
+            rule = self.rules[index]
+            sub.add_rule(rule['id'], rule['antecedents'], rule['consequent'])
+            sub.outside.update(ant for ant in rule['antecedents'] if ant not in cone)
+        sub.build_graph()
+        return sub
+
+    def compute_layout(self, layout_method='improved_hierarchical'):
+        """Vi tri cac node {node: (x, y)}; chi phu thuoc tap luat, khong phu thuoc GT/KL"""
+        if layout_method == 'spring':
+            pos = self._get_spring_layout()
+        elif layout_method == 'kamada_kawai':
+            pos = self._get_kamada_kawai_layout()
+        elif layout_method == 'circular':
+            pos = self._get_circular_layout()
+        elif layout_method == 'shell':
+            pos = self._get_shell_layout()
+        else:  # improved_hierarchical (mac dinh)
+            pos = self._get_improved_hierarchical_layout()
+        return {node: (float(x), float(y)) for node, (x, y) in pos.items()}
+
+    def _edge_groups(self):
+        # Nhom edges theo (source, target) -> [rule labels]
+        edge_groups = defaultdict(list)
+        for (source, target, data) in self.graph.edges(data=True):
+            edge_groups[(source, target)].append(data.get('rule', ''))
+        return edge_groups
+
+    def to_graph_data(self, pos):
+        """
+        Du lieu de client tu ve FPG (thay cho anh PNG):
+        nodes: id, x, y, GT (f in GT), KL (f in KL), outside (tien de ngoai phan lien quan);
+        edges: source, target, rules (cac canh song song)
+        """
+        nodes = [{'id': node, 'label': node, 'x': round(pos[node][0], 2), 'y': round(pos[node][1], 2),
+                  'GT': node in self.initial_facts, 'KL': node in self.target_goals,
+                  'outside': node in self.outside}
+                 for node in self.graph.nodes()]
+        edges = [{'source': source, 'target': target, 'rules': rule_labels}
+                 for (source, target), rule_labels in self._edge_groups().items()]
+        return {'kind': 'fpg', 'radius': 1.2, 'nodes': nodes, 'edges': edges}
+
+    def visualize_to_base64(self, figsize=(26, 18), layout_method='improved_hierarchical', pos=None):
         """
         Ve FPG: GIU NGUYEN KICH THUOC ANH, VONG TRON TO, DAY NODES RA CANH
+        pos: layout da tinh san (compute_layout), None => tinh lai
         """
         fig = plt.figure(figsize=figsize, facecolor='white')
         ax = fig.add_subplot(111)
@@ -73,23 +129,11 @@ class FPG:
             return image_base64
 
         # CHON LAYOUT METHOD
-        if layout_method == 'spring':
-            pos = self._get_spring_layout()
-        elif layout_method == 'kamada_kawai':
-            pos = self._get_kamada_kawai_layout()
-        elif layout_method == 'circular':
-            pos = self._get_circular_layout()
-        elif layout_method == 'shell':
-            pos = self._get_shell_layout()
-        else:  # improved_hierarchical (mac dinh)
-            pos = self._get_improved_hierarchical_layout()
+        if pos is None:
+            pos = self.compute_layout(layout_method)
         
         # Nhom edges theo (source, target)
-        edge_groups = defaultdict(list)
-        for (source, target, data) in self.graph.edges(data=True):
-            edge_key = (source, target)
-            rule_label = data.get('rule', '')
-            edge_groups[edge_key].append(rule_label)
+        edge_groups = self._edge_groups()
         
         # Ve edges voi OFFSET de tach nhau
         for (source, target), rule_labels in edge_groups.items():
@@ -124,8 +168,11 @@ class FPG:
                 end_y = y2 + perp_y * offset
                 
                 # ========== VE DUONG THANG ==========
+                # Canh tu tien de ngoai phan lien quan: net dut, mau nhat
+                outside_edge = source in self.outside
                 line = ax.plot([start_x, end_x], [start_y, end_y],
-                              color='dimgray', linewidth=2.0, alpha=0.65, 
+                              color='silver' if outside_edge else 'dimgray', linewidth=2.0, alpha=0.65,
+                              linestyle='--' if outside_edge else '-',
                               solid_capstyle='round', zorder=1)[0]
                 
                 # ========== VE MUI TEN (HUONG TU FACT -> GOAL) ==========
@@ -192,6 +239,10 @@ class FPG:
                                          edgecolor='black', linewidth=3.5,
                                          hatch='///', zorder=6)
                 ax.add_patch(hatch_circle)
+            elif node in self.outside:
+                circle = plt.Circle((x, y), radius, facecolor='white',
+                                   edgecolor='silver', linewidth=3.5, linestyle='--', zorder=5)
+                ax.add_patch(circle)
             else:
                 circle = plt.Circle((x, y), radius, facecolor='white',
                                    edgecolor='black', linewidth=3.5, zorder=5)
@@ -199,7 +250,7 @@ class FPG:
             
             # Label node (GIU NGUYEN FONT SIZE)
             ax.text(x, y, node, ha='center', va='center',
-                   fontsize=14, fontweight='bold', color='black', zorder=7)
+                   fontsize=14, fontweight='bold', color='gray' if node in self.outside else 'black', zorder=7)
         
         # ========== LEGEND ==========
         legend_elements = [
@@ -208,6 +259,10 @@ class FPG:
             mpatches.Circle((0, 0), 0.35, facecolor='white', edgecolor='black',
                            hatch='///', linewidth=2.5, label='Goal (f in KL)')
         ]
+        if self.outside:
+            legend_elements.append(
+                mpatches.Circle((0, 0), 0.35, facecolor='white', edgecolor='silver', linestyle='--',
+                               linewidth=2.5, label='Tien de khong suy ra duoc tu GT'))
         
         ax.legend(handles=legend_elements, loc='lower right',
                  fontsize=13, framealpha=0.98, edgecolor='black',
@@ -240,64 +295,10 @@ class FPG:
     def _get_improved_hierarchical_layout(self):
         """
         Layout hierarchical DAY MANH NODES RA CANH, TRANH TRUNG TAM
+        Tang theo thu tu topo (mot luot), thu tu trong tang theo barycenter - xem layout_engine
         """
-        levels = {}
-        
-        # Tinh level cho moi node
-        pure_facts = self.facts - self.conclusions
-        for fact in pure_facts:
-            levels[fact] = 0
-        
-        # Tinh level cho nodes khac (BFS-like)
-        for iteration in range(100):
-            changed = False
-            for rule in self.rules:
-                consequent = rule['consequent']
-                ant_levels = [levels[ant] for ant in rule['antecedents'] if ant in levels]
-                
-                if ant_levels:
-                    new_level = max(ant_levels) + 1
-                    if consequent not in levels or levels[consequent] < new_level:
-                        levels[consequent] = new_level
-                        changed = True
-            
-            if not changed:
-                break
-        
-        # Nhom nodes theo level
-        level_groups = defaultdict(list)
-        for node, level in levels.items():
-            level_groups[level].append(node)
-        
-        max_level = max(levels.values()) if levels else 0
-        
-        # Tao positions - DAY RA CANH, TANG SCALE
-        pos = {}
-        
-        # TANG SCALE DE TRAI RA
-        horizontal_scale = 28.0  # Tang manh
-        vertical_scale = 22.0    # Tang manh
-        
-        for level in sorted(level_groups.keys()):
-            nodes = sorted(level_groups[level])
-            num_nodes = len(nodes)
-            
-            # Vi tri X: trai deu theo level (theo chieu ngang)
-            x = level * horizontal_scale
-            
-            # Vi tri Y: DAY MANH RA TREN/DUOI
-            if num_nodes == 1:
-                y_positions = [0]
-            else:
-                # TANG SPAN RAT LON de day nodes ra tren/duoi
-                y_span = num_nodes * vertical_scale * 1.6  # HE SO CAO
-                y_positions = np.linspace(-y_span/2, y_span/2, num_nodes)
-            
-            for i, node in enumerate(nodes):
-                pos[node] = (x, y_positions[i])
-        
-        # Optimize positions de giam crossing
-        pos = self._optimize_crossings(pos, level_groups)
+        pos = layered_layout(self.graph.nodes(), self.graph.edges(),
+                             horizontal_scale=28.0, vertical_scale=22.0)
         
         # DAY MANH RA CANH BANG CACH SCALE VA PUSH
         pos = self._push_to_edges(pos, push_factor=1.8)
@@ -333,42 +334,6 @@ class FPG:
         
         return pushed_pos
     
-    def _optimize_crossings(self, pos, level_groups):
-        """
-        Heuristic de giam edge crossings
-        """
-        for level in sorted(level_groups.keys())[1:]:
-            nodes = level_groups[level]
-            
-            # Tinh barycenter cho moi node
-            barycenters = {}
-            for node in nodes:
-                predecessors = list(self.graph.predecessors(node))
-                if predecessors:
-                    avg_y = np.mean([pos[pred][1] for pred in predecessors if pred in pos])
-                    barycenters[node] = avg_y
-                else:
-                    barycenters[node] = pos[node][1]
-            
-            # Sap xep nodes theo barycenter
-            sorted_nodes = sorted(nodes, key=lambda n: barycenters[n])
-            
-            # Cap nhat lai y-positions
-            num_nodes = len(sorted_nodes)
-            vertical_scale = 22.0
-            y_span = num_nodes * vertical_scale * 1.6
-            
-            if num_nodes == 1:
-                y_positions = [0]
-            else:
-                y_positions = np.linspace(-y_span/2, y_span/2, num_nodes)
-            
-            for i, node in enumerate(sorted_nodes):
-                x_pos = pos[node][0]
-                pos[node] = (x_pos, y_positions[i])
-        
-        return pos
-    
     def _get_spring_layout(self):
         """Spring layout DAY RA CANH"""
         pos = nx.spring_layout(
@@ -381,7 +346,9 @@ class FPG:
         return pos
     
     def _get_kamada_kawai_layout(self):
-        """Kamada-Kawai layout DAY RA CANH"""
+        """Kamada-Kawai layout DAY RA CANH (do thi lon: dung layout phan tang)"""
+        if self.graph.number_of_nodes() > KAMADA_KAWAI_MAX_NODES:
+            return self._get_improved_hierarchical_layout()
         try:
             pos = nx.kamada_kawai_layout(
                 self.graph,
@@ -401,25 +368,7 @@ class FPG:
     
     def _get_shell_layout(self):
         """Shell layout DAY RA CANH"""
-        levels = {}
-        pure_facts = self.facts - self.conclusions
-        for fact in pure_facts:
-            levels[fact] = 0
-        
-        for iteration in range(100):
-            changed = False
-            for rule in self.rules:
-                consequent = rule['consequent']
-                ant_levels = [levels[ant] for ant in rule['antecedents'] if ant in levels]
-                
-                if ant_levels:
-                    new_level = max(ant_levels) + 1
-                    if consequent not in levels or levels[consequent] < new_level:
-                        levels[consequent] = new_level
-                        changed = True
-            
-            if not changed:
-                break
+        levels = node_levels(list(self.graph.nodes()), self.graph.edges())
         
         level_groups = defaultdict(list)
         for node, level in levels.items():
@@ -0,0 +1,66 @@
+# graph_cone.py
+# Phần đồ thị liên quan tới truy vấn: sự kiện đi tới được từ GT và đi tới được KL
+
+from collections import defaultdict, deque
+from typing import Dict, Iterable, List, Set, Tuple
+
+Adjacency = Tuple[Dict[str, List[int]], Dict[str, List[int]]]
+
+
+def build_adjacency(rules: List[Dict]) -> Adjacency:
+    """
+    Chỉ mục dựng một lần cho mỗi tập luật (rules dạng FPG.rules / RPG.rules):
+    - users_of: sự kiện -> [chỉ số luật có sự kiện đó trong left]
+    - producers_of: sự kiện -> [chỉ số luật kết luận sự kiện đó]
+    """
+    users_of = defaultdict(list)
+    producers_of = defaultdict(list)
+    for index, rule in enumerate(rules):
+        for fact in dict.fromkeys(rule['antecedents']):
+            users_of[fact].append(index)
+        producers_of[rule['consequent']].append(index)
+    return dict(users_of), dict(producers_of)
+
+
+def relevant_cone(rules: List[Dict], adjacency: Adjacency, initial_facts: Iterable[str],
+                  target_goals: Iterable[str]) -> Tuple[List[int], Set[str]]:
+    """
+    Hai lượt BFS trên chỉ mục:
+    - tiến từ GT: f -> kết luận của các luật có f trong left
+    - lùi từ KL: q -> left của các luật kết luận q
+    cone = (sự kiện đi tới được từ GT) ∩ (sự kiện đi tới được KL).
+
+    Returns:
+        (rule_indices, cone): các luật nằm trên một đường GT -> KL (có tiền đề trong cone và
+        kết luận trong cone), theo thứ tự luật gốc; cone là tập sự kiện
+    """
+    users_of, producers_of = adjacency
+
+    forward = set(initial_facts)
+    queue = deque(forward)
+    while queue:
+        fact = queue.popleft()
+        for index in users_of.get(fact, ()):
+            consequent = rules[index]['consequent']
+            if consequent not in forward:
+                forward.add(consequent)
+                queue.append(consequent)
+
+    backward = set(target_goals)
+    queue = deque(backward)
+    while queue:
+        fact = queue.popleft()
+        for index in producers_of.get(fact, ()):
+            for antecedent in rules[index]['antecedents']:
+                if antecedent not in backward:
+                    backward.add(antecedent)
+                    queue.append(antecedent)
+
+    cone = forward & backward
+    rule_indices = sorted({
+        index
+        for fact in cone
+        for index in users_of.get(fact, ())
+        if rules[index]['consequent'] in cone
+    })
+    return rule_indices, cone
@@ -0,0 +1,125 @@
+# graph_svg.py
+# Vẽ FPG/RPG thành SVG gọn từ to_graph_data() - không dùng matplotlib, trình duyệt tự rasterize
+
+from typing import Dict, List
+from xml.sax.saxutils import escape
+
+# Chú thích theo loại đồ thị: (cờ trên node, mẫu gạch, nhãn)
+LEGENDS = {
+    'fpg': [('GT', 'hatch-h', 'Fact (f ∈ GT)'), ('KL', 'hatch-d', 'Goal (f ∈ KL)')],
+    'rpg': [('R_GT', 'hatch-h', 'Luật r ∈ R_GT (left ⊆ GT)'), ('R_KL', 'hatch-v', 'Luật r ∈ R_KL (q ⊆ KL)')],
+}
+# Tiền đề nằm ngoài phần liên quan GT -> KL (FPG rút gọn): node và cạnh vẽ mờ, nét đứt
+OUTSIDE_LABEL = 'Tiền đề không suy ra được từ GT'
+TITLES = {
+    'fpg': 'Bieu do FPG (Forward Production Graph)',
+    'rpg': 'Đồ thị liên hệ trước giữa các luật RPG (Rules Precedence Graph)',
+}
+
+
+def _fmt(value: float) -> str:
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+
+def _hatch(node: Dict, kind: str):
+    for flag, pattern, _ in LEGENDS[kind]:
+        if node.get(flag):
+            return pattern
+    return None
+
+
+def render_svg(data: Dict) -> str:
+    """SVG của đồ thị; tọa độ giữ nguyên đơn vị layout (trục y lật lại), kích thước theo viewBox"""
+    kind, r = data['kind'], data['radius']
+    nodes = data['nodes']
+    stroke = _fmt(r * 0.1)
+    if not nodes:
+        return ('<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 400 60">'
+                '<text x="200" y="35" text-anchor="middle" fill="red" font-size="14">'
+                f'Chua co du lieu {kind.upper()}.</text></svg>')
+
+    pos = {n['id']: (n['x'], -n['y']) for n in nodes}
+    outside = {n['id'] for n in nodes if n.get('outside')}
+    margin = r * 3
+    xs = [x for x, _ in pos.values()]
+    ys = [y for _, y in pos.values()]
+    min_x, min_y = min(xs) - margin, min(ys) - margin * 2  # chừa chỗ cho tiêu đề
+    width, height = max(xs) - min(xs) + 2 * margin, max(ys) - min(ys) + 3 * margin
+    step = _fmt(r / 3)
+
+    out: List[str] = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="{_fmt(min_x)} {_fmt(min_y)} {_fmt(width)} {_fmt(height)}"'
+        f' font-family="sans-serif" font-weight="bold">',
+        '<defs>',
+        f'<marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="{_fmt(r * 1.2)}"'
+        f' markerHeight="{_fmt(r * 1.2)}" markerUnits="userSpaceOnUse" orient="auto">'
+        '<path d="M0,0 L10,5 L0,10 z"/></marker>',
+        f'<pattern id="hatch-h" patternUnits="userSpaceOnUse" width="{step}" height="{step}">'
+        f'<path d="M0,0 H{step}" stroke="black" stroke-width="{stroke}"/></pattern>',
+        f'<pattern id="hatch-v" patternUnits="userSpaceOnUse" width="{step}" height="{step}">'
+        f'<path d="M0,0 V{step}" stroke="black" stroke-width="{stroke}"/></pattern>',
+        f'<pattern id="hatch-d" patternUnits="userSpaceOnUse" width="{step}" height="{step}">'
+        f'<path d="M0,{step} L{step},0" stroke="black" stroke-width="{stroke}"/></pattern>',
+        '</defs>',
+        f'<text x="{_fmt(min_x + width / 2)}" y="{_fmt(min_y + margin)}" text-anchor="middle"'
+        f' font-size="{_fmt(r * 1.2)}">{escape(TITLES[kind])}</text>',
+    ]
+
+    # Cạnh: đoạn thẳng giữa hai mép node, mũi tên ở đích; FPG tách các cạnh song song và ghi nhãn luật
+    for edge in data['edges']:
+        (x1, y1), (x2, y2) = pos[edge['source']], pos[edge['target']]
+        dx, dy = x2 - x1, y2 - y1
+        length = (dx * dx + dy * dy) ** 0.5
+        if length <= 2 * r:
+            continue
+        ux, uy = dx / length, dy / length
+        labels = edge.get('rules') or [None]
+        if edge['source'] in outside:
+            line_style = f'stroke="silver" stroke-dasharray="{_fmt(r * 0.3)}"'
+        else:
+            line_style = 'stroke="dimgray"'
+        for i, label in enumerate(labels):
+            offset = (i - (len(labels) - 1) / 2) * r * 0.5
+            ox, oy = -uy * offset, ux * offset
+            sx, sy = x1 + ux * r + ox, y1 + uy * r + oy
+            ex, ey = x2 - ux * r + ox, y2 - uy * r + oy
+            out.append(f'<line x1="{_fmt(sx)}" y1="{_fmt(sy)}" x2="{_fmt(ex)}" y2="{_fmt(ey)}"'
+                       f' {line_style} stroke-width="{stroke}" marker-end="url(#arrow)"/>')
+            if label:
+                lx, ly = (sx + ex) / 2 - uy * r * 0.5, (sy + ey) / 2 + ux * r * 0.5
+                font = r * 0.7
+                w, h = len(label) * font * 0.65 + font * 0.6, font * 1.4
+                out.append(f'<rect x="{_fmt(lx - w / 2)}" y="{_fmt(ly - h / 2)}" width="{_fmt(w)}" height="{_fmt(h)}"'
+                           f' rx="{_fmt(h / 3)}" fill="gold" stroke="darkorange" stroke-width="{stroke}"/>'
+                           f'<text x="{_fmt(lx)}" y="{_fmt(ly)}" text-anchor="middle" dominant-baseline="central"'
+                           f' font-size="{_fmt(font)}">{escape(label)}</text>')
+
+    for node in nodes:
+        x, y = pos[node['id']]
+        circle = f'cx="{_fmt(x)}" cy="{_fmt(y)}" r="{_fmt(r)}"'
+        is_outside = node['id'] in outside
+        border = f'stroke="silver" stroke-dasharray="{_fmt(r * 0.3)}"' if is_outside else 'stroke="black"'
+        out.append(f'<circle {circle} fill="white" {border} stroke-width="{_fmt(r * 0.2)}"/>')
+        pattern = _hatch(node, kind)
+        if pattern:
+            out.append(f'<circle {circle} fill="url(#{pattern})" fill-opacity="0.6"/>')
+        label = str(node['label'])
+        font = min(r * 0.8, r * 2.6 / max(len(label), 1) * 1.1)
+        fill = ' fill="gray"' if is_outside else ''
+        out.append(f'<text x="{_fmt(x)}" y="{_fmt(y)}" text-anchor="middle" dominant-baseline="central"'
+                   f' font-size="{_fmt(font)}"{fill}>{escape(label)}</text>')
+
+    # Chú thích ở góc dưới bên phải
+    entries = [(f'fill="url(#{pattern})" stroke="black"', text) for _, pattern, text in LEGENDS[kind]]
+    if outside:
+        entries.append((f'fill="white" stroke="silver" stroke-dasharray="{_fmt(r * 0.15)}"', OUTSIDE_LABEL))
+    legend_x = min_x + width - margin * 4
+    legend_y = min_y + height - margin * 0.4 - len(entries) * r * 1.5
+    for i, (style, text) in enumerate(entries):
+        cy = legend_y + i * r * 1.5
+        out.append(f'<circle cx="{_fmt(legend_x)}" cy="{_fmt(cy)}" r="{_fmt(r * 0.5)}" {style}'
+                   f' stroke-width="{stroke}"/>'
+                   f'<text x="{_fmt(legend_x + r)}" y="{_fmt(cy)}" dominant-baseline="central"'
+                   f' font-size="{_fmt(r * 0.6)}" font-weight="normal">{escape(text)}</text>')
+    out.append('</svg>')
+    return ''.join(out)
@@ -1,7 +1,10 @@
 # inference.py
 # Forward chaining với VET đầy đủ và VET tối ưu
 
-from typing import List, Dict, Tuple, Set
+import heapq
+import re
+import time
+from typing import List, Dict, Tuple, Set, Optional
 
 SEPARATORS = ['∧', '^', '&', 'AND', 'and', '&&', ' AND ', ' and ', ';', '|']
 
@@ -14,10 +17,12 @@ def _is_edge_variable(var: str) -> bool:
 def _is_angle_variable(var: str) -> bool:
     return var in ANGLE_VARS or (len(var) == 1 and var.isupper())
 
+# Một lượt regex thay cho 10 lần str.replace; '&&', ' AND ', ' and ' đã được
+# '&', 'AND', 'and' bao trùm nên kết quả giống hệt thay thế tuần tự theo SEPARATORS
+_SEPARATOR_RE = re.compile(r'[∧^&;|]|AND|and')
+
 def _normalize_left(left_expr: str) -> List[str]:
-    expr = str(left_expr)
-    for sep in SEPARATORS:
-        expr = expr.replace(sep, ',')
+    expr = _SEPARATOR_RE.sub(',', str(left_expr))
     parts = [p.strip() for p in expr.split(',') if p.strip()]
     return parts
 
@@ -49,6 +54,61 @@ def _parse_rules(rules_list: List[Dict]) -> Dict[str, Dict]:
     
     return rules_dict
 
+def _rule_order_key(rule_id: str, rules_dict: Dict[str, Dict]) -> Tuple:
+    """
+    Thứ tự chọn luật: ít tiền đề trước, rồi id số tăng dần.
+    Id không phải số xếp sau id số (so sánh chuỗi) để khóa luôn so sánh được.
+    """
+    n = len(rules_dict[rule_id]['premise'])
+    if rule_id.isdigit():
+        return (n, 0, int(rule_id), rule_id)
+    return (n, 1, 0, rule_id)
+
+def _build_agenda(rules_dict: Dict[str, Dict], facts: Set[str]) -> Tuple[Dict[str, int], Dict[str, List[str]], List[Tuple]]:
+    """
+    Agenda kiểu đếm (Rete rút gọn) cho suy diễn tiến
+
+    Returns:
+        missing: rule_id -> số tiền đề (khác nhau) chưa thuộc facts
+        watchers: fact -> các luật đang chờ fact đó
+        ready: heap (khóa thứ tự, rule_id) của các luật đã đủ tiền đề
+    """
+    missing: Dict[str, int] = {}
+    watchers: Dict[str, List[str]] = {}
+    ready: List[Tuple] = []
+    for rule_id, rule in rules_dict.items():
+        count = 0
+        for p in set(rule['premise']):
+            if p not in facts:
+                watchers.setdefault(p, []).append(rule_id)
+                count += 1
+        missing[rule_id] = count
+        if count == 0:
+            ready.append((_rule_order_key(rule_id, rules_dict), rule_id))
+    heapq.heapify(ready)
+    return missing, watchers, ready
+
+def _add_fact(fact: str, rules_dict: Dict[str, Dict], missing: Dict[str, int],
+              watchers: Dict[str, List[str]], ready: List[Tuple]) -> None:
+    """Fact mới chỉ giảm bộ đếm của các luật theo dõi nó; luật về 0 được đưa vào agenda"""
+    for rule_id in watchers.pop(fact, ()):
+        missing[rule_id] -= 1
+        if missing[rule_id] == 0:
+            heapq.heappush(ready, (_rule_order_key(rule_id, rules_dict), rule_id))
+
+def _snapshot_row(step, rule: str, THOA: Set[str], TG: Set[str], R: Set[str],
+                  VET: List[str], note: str) -> Dict:
+    """Dòng bảng quá trình đầy đủ (ảnh chụp toàn bộ trạng thái)"""
+    return {
+        'step': step,
+        'rule': rule,
+        'THOA': sorted(THOA),
+        'TG': sorted(TG),
+        'R': sorted(R),
+        'VET': VET.copy(),
+        'note': note
+    }
+
 def _find_optimal_vet_forward(full_vet: List[str], rules_dict: Dict[str, Dict], 
                              initial_facts: Set[str], goals: Set[str]) -> Tuple[List[str], Dict]:
     """
@@ -59,13 +119,13 @@ def _find_optimal_vet_forward(full_vet: List[str], rules_dict: Dict[str, Dict],
     optimal_vet = []
     usage_info = {}
     
-    # Duyệt ngược VET
+    # Duyệt ngược VET (append rồi đảo ngược một lần thay vì insert(0) mỗi bước)
     for rule_id in reversed(full_vet):
         rule = rules_dict[rule_id]
         conclusion = rule['conclusion']
         
         if conclusion in needed_facts:
-            optimal_vet.insert(0, rule_id)
+            optimal_vet.append(rule_id)
             needed_facts.remove(conclusion)
             
             for p in rule['premise']:
@@ -78,14 +138,34 @@ def _find_optimal_vet_forward(full_vet: List[str], rules_dict: Dict[str, Dict],
                 'note': rule['note']
             }
     
+    optimal_vet.reverse()
     return optimal_vet, usage_info
 
 def forward_inference_detailed(initial_facts: List[str],
                                goals: List[str],
-                               rules_list: List[Dict]) -> Tuple[bool, List[Dict], List[str], List[str], List[Dict], str]:
+                               rules_list: List[Dict],
+                               max_steps: Optional[int] = None,
+                               time_limit: Optional[float] = None,
+                               trace_mode: str = 'full',
+                               snapshot_every: int = 50,
+                               compiled=None) -> Tuple[bool, List[Dict], List[str], List[str], List[Dict], str]:
     """
     Forward chaining với VET đầy đủ và VET tối ưu
     
+    Suy diễn chạy đến khi đạt goals hoặc điểm bất động (không còn luật áp dụng
+    được). Mỗi luật áp dụng tối đa một lần nên số bước không vượt quá số luật.
+    
+    Args:
+        max_steps: Ngân sách số bước (None => không giới hạn)
+        time_limit: Ngân sách thời gian tính bằng giây (None => không giới hạn)
+        trace_mode: 'full' - mỗi bước là ảnh chụp THOA/TG/R/VET đầy đủ
+                    'compact' - mỗi bước chỉ ghi phần thay đổi
+                    {step, rule, rule_id, fact, note}: luật rule_id rời R và vào
+                    VET, fact được thêm vào THOA. Bước 0, dòng DONE/FAIL và mỗi
+                    `snapshot_every` bước có thêm ảnh chụp đầy đủ.
+        snapshot_every: Chu kỳ ảnh chụp trong chế độ compact (<= 0 => chỉ đầu/cuối)
+        compiled: CompiledRuleBase (rule_base.py) đã parse sẵn; khi có thì bỏ qua rules_list
+    
     Returns:
         success: bool
         process_table: Bảng quá trình
@@ -94,7 +174,7 @@ def forward_inference_detailed(initial_facts: List[str],
         explanation: Giải thích
         conclusion: Kết luận cuối cùng
     """
-    rules_dict = _parse_rules(rules_list)
+    rules_dict = compiled.rules_dict if compiled is not None else _parse_rules(rules_list)
     if not rules_dict:
         return False, [], [], [], [], "Khong co luat nao"
     
@@ -102,80 +182,69 @@ def forward_inference_detailed(initial_facts: List[str],
     TG: Set[str] = set([x.strip() for x in goals if str(x).strip()])
     
     R = set(rules_dict.keys())
+    missing, watchers, ready = _build_agenda(rules_dict, THOA)
     VET_FULL: List[str] = []
     process_table: List[Dict] = []
     
-    process_table.append({
-        'step': 0,
-        'rule': '-',
-        'THOA': sorted(THOA),
-        'TG': sorted(TG),
-        'R': sorted(R),
-        'VET': [],
-        'note': 'Khoi tao'
-    })
+    compact = trace_mode == 'compact'
+    
+    process_table.append(_snapshot_row(0, '-', THOA, TG, R, VET_FULL, 'Khoi tao'))
     
     step = 1
-    MAX_STEPS = 100
+    deadline = time.monotonic() + time_limit if time_limit is not None else None
     
-    while step <= MAX_STEPS:
+    while True:
         if TG.issubset(THOA):
-            process_table.append({
-                'step': step,
-                'rule': 'DONE',
-                'THOA': sorted(THOA),
-                'TG': sorted(TG),
-                'R': sorted(R),
-                'VET': VET_FULL.copy(),
-                'note': 'THANH CONG!'
-            })
+            process_table.append(_snapshot_row(step, 'DONE', THOA, TG, R, VET_FULL, 'THANH CONG!'))
             break
         
+        budget_note = None
+        if max_steps is not None and step > max_steps:
+            budget_note = f"DUNG! Vuot ngan sach {max_steps} buoc"
+        elif deadline is not None and time.monotonic() > deadline:
+            budget_note = f"DUNG! Vuot ngan sach thoi gian {time_limit}s"
+        if budget_note:
+            process_table.append(_snapshot_row(step, 'FAIL', THOA, TG, R, VET_FULL, budget_note))
+            return False, process_table, VET_FULL, [], [], budget_note
+        
+        # Luật đủ tiền đề nhưng kết luận đã có trong THOA không bao giờ áp dụng
+        # được nữa (THOA chỉ tăng) nên bỏ khỏi agenda, nhưng vẫn nằm trong R
         applied_rule = None
-        for rule_id in sorted(R, key=lambda x: (len(rules_dict[x]['premise']), int(x) if x.isdigit() else x)):
-            premise_set = set(rules_dict[rule_id]['premise'])
-            if premise_set.issubset(THOA):
-                conclusion = rules_dict[rule_id]['conclusion']
-                if conclusion not in THOA:
-                    applied_rule = rule_id
-                    break
+        while ready:
+            _, rule_id = heapq.heappop(ready)
+            if rules_dict[rule_id]['conclusion'] not in THOA:
+                applied_rule = rule_id
+                break
         
         if applied_rule is None:
             conclusion = "THAT BAI! Khong tim thay luat ap dung duoc"
-            process_table.append({
-                'step': step,
-                'rule': 'FAIL',
-                'THOA': sorted(THOA),
-                'TG': sorted(TG),
-                'R': sorted(R),
-                'VET': VET_FULL.copy(),
-                'note': conclusion
-            })
+            process_table.append(_snapshot_row(step, 'FAIL', THOA, TG, R, VET_FULL, conclusion))
             return False, process_table, VET_FULL, [], [], conclusion
         
         conclusion = rules_dict[applied_rule]['conclusion']
         rule_note = rules_dict[applied_rule]['note']
         THOA.add(conclusion)
+        _add_fact(conclusion, rules_dict, missing, watchers, ready)
         R.discard(applied_rule)
         VET_FULL.append(applied_rule)
         
-        process_table.append({
-            'step': step,
-            'rule': f'r{applied_rule}',
-            'THOA': sorted(THOA),
-            'TG': sorted(TG),
-            'R': sorted(R),
-            'VET': VET_FULL.copy(),
-            'note': rule_note
-        })
+        if not compact:
+            process_table.append(_snapshot_row(step, f'r{applied_rule}', THOA, TG, R, VET_FULL, rule_note))
+        else:
+            row = {
+                'step': step,
+                'rule': f'r{applied_rule}',
+                'rule_id': applied_rule,
+                'fact': conclusion,
+                'note': rule_note
+            }
+            if snapshot_every > 0 and step % snapshot_every == 0:
+                row.update(_snapshot_row(step, row['rule'], THOA, TG, R, VET_FULL, rule_note))
+            process_table.append(row)
         
         step += 1
     
-    success = TG.issubset(THOA)
-    
-    if not success:
-        conclusion = f"THAT BAI! Khong the dat duoc {TG} tu {initial_facts}"
-        return False, process_table, VET_FULL, [], [], conclusion
+    success = True
     
     # Tìm VET tối ưu
     VET_OPTIMAL, usage_info = _find_optimal_vet_forward(VET_FULL, rules_dict, set(initial_facts), TG)
@@ -0,0 +1,123 @@
+# layout_engine.py
+# Layout phân tầng cho đồ thị lớn (10k+ node): gán tầng theo thứ tự topo một lượt,
+# sắp thứ tự trong tầng theo barycenter bằng mảng NumPy
+
+import heapq
+from collections import deque
+from typing import Dict, Hashable, Iterable, List, Tuple
+
+import numpy as np
+
+# Trên ngưỡng này Kamada-Kawai (bộ nhớ O(n²), thời gian ~O(n³)) được thay bằng layered_layout
+KAMADA_KAWAI_MAX_NODES = 500
+
+
+def _index_edges(nodes: List[Hashable], edges: Iterable[Tuple]) -> Tuple[np.ndarray, np.ndarray]:
+    """Cạnh dạng mảng chỉ số (src, dst): bỏ cạnh trùng (đa đồ thị) và khuyên"""
+    index = {node: i for i, node in enumerate(nodes)}
+    pairs = {(index[u], index[v]) for u, v in edges if u != v}
+    if not pairs:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    src, dst = np.array(sorted(pairs), dtype=np.int64).T
+    return src, dst
+
+
+def longest_path_levels(n: int, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """
+    Tầng của mỗi node = đường đi dài nhất từ các node không có cạnh vào (thuật toán Kahn, một lượt).
+    Gặp chu trình (hàng đợi rỗng nhưng còn node): lấy node còn lại có ít cạnh vào chưa xét nhất
+    (hòa thì chỉ số nhỏ nhất), coi các cạnh vào còn lại của nó là cạnh ngược và bỏ qua.
+    Node đó được tìm bằng heap (indegree, chỉ số) cập nhật lười nên cả thuật toán là O((V + E) log V).
+    """
+    indegree = np.bincount(dst, minlength=n).tolist()
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(src, minlength=n)))).tolist()
+    targets = dst[np.argsort(src, kind='stable')].tolist()
+    level = [0] * n
+    done = [False] * n
+
+    queue = deque(u for u in range(n) if indegree[u] == 0)
+    candidates = [(d, u) for u, d in enumerate(indegree) if d > 0]
+    heapq.heapify(candidates)
+    processed = 0
+    while processed < n:
+        if not queue:
+            # Cắt chu trình: bỏ các mục cũ trong heap (node đã xong hoặc indegree đã giảm)
+            while True:
+                d, u = heapq.heappop(candidates)
+                if not done[u] and d == indegree[u]:
+                    break
+            queue.append(u)
+        u = queue.popleft()
+        if done[u]:
+            continue
+        done[u] = True
+        processed += 1
+        next_level = level[u] + 1
+        for v in targets[offsets[u]:offsets[u + 1]]:
+            if done[v]:
+                continue  # Cạnh ngược của chu trình đã bị cắt
+            if level[v] < next_level:
+                level[v] = next_level
+            indegree[v] -= 1
+            if indegree[v] == 0:
+                queue.append(v)
+            else:
+                heapq.heappush(candidates, (indegree[v], v))
+    return np.array(level, dtype=np.int64)
+
+
+def node_levels(nodes: List[Hashable], edges: Iterable[Tuple]) -> Dict[Hashable, int]:
+    """{node: tầng} theo longest_path_levels"""
+    src, dst = _index_edges(nodes, edges)
+    levels = longest_path_levels(len(nodes), src, dst)
+    return dict(zip(nodes, levels.tolist()))
+
+
+def _spread(count: int, vertical_scale: float) -> np.ndarray:
+    # Vị trí y của `count` node trong một tầng, trải đều quanh 0 (như layout phân tầng cũ)
+    if count == 1:
+        return np.zeros(1)
+    span = count * vertical_scale * 1.6
+    return np.linspace(-span / 2, span / 2, count)
+
+
+def layered_layout(nodes: Iterable[Hashable], edges: Iterable[Tuple], horizontal_scale: float = 28.0,
+                   vertical_scale: float = 22.0) -> Dict[Hashable, Tuple[float, float]]:
+    """
+    Layout phân tầng: x = tầng * horizontal_scale; trong mỗi tầng node được trải đều theo y.
+    Thứ tự trong tầng: ban đầu theo tên node, sau đó từ tầng 1 trở đi xếp lại (sắp xếp ổn định)
+    theo barycenter = trung bình y của các node đứng trước; node không có cạnh vào giữ y cũ.
+    Chi phí O(V log V + E) - không có phép tính nào theo cặp node.
+    """
+    nodes = sorted(nodes, key=str)
+    n = len(nodes)
+    if n == 0:
+        return {}
+    src, dst = _index_edges(nodes, edges)
+    level = longest_path_levels(n, src, dst)
+
+    # Nhóm node theo tầng (tầng liên tục 0..max, trong tầng giữ thứ tự tên), nhóm cạnh theo tầng của node đích
+    by_level = np.argsort(level, kind='stable')
+    level_bounds = np.concatenate(([0], np.cumsum(np.bincount(level))))
+    edge_order = np.argsort(level[dst], kind='stable')
+    src, dst = src[edge_order], dst[edge_order]
+    edge_bounds = np.searchsorted(level[dst], np.arange(len(level_bounds)))
+
+    tiers = [by_level[level_bounds[lv]:level_bounds[lv + 1]] for lv in range(len(level_bounds) - 1)]
+    y = np.zeros(n)
+    for members in tiers:
+        y[members] = _spread(len(members), vertical_scale)
+    local = np.zeros(n, dtype=np.int64)
+    for lv, members in enumerate(tiers[1:], start=1):
+        # Barycenter của các node trong tầng (các tầng trước đã có y cuối cùng)
+        e_src, e_dst = src[edge_bounds[lv]:edge_bounds[lv + 1]], dst[edge_bounds[lv]:edge_bounds[lv + 1]]
+        local[members] = np.arange(len(members))
+        sums = np.bincount(local[e_dst], weights=y[e_src], minlength=len(members))
+        counts = np.bincount(local[e_dst], minlength=len(members))
+        barycenter = np.where(counts > 0, sums / np.maximum(counts, 1), y[members])
+        ordered = members[np.argsort(barycenter, kind='stable')]
+        y[ordered] = _spread(len(members), vertical_scale)
+
+    x = level * horizontal_scale
+    return {node: (float(x[i]), float(y[i])) for i, node in enumerate(nodes)}
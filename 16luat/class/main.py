@@ -1,15 +1,24 @@
 # main.py
 import os
 import json
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-from fpg import FPG
-from rpg import RPG
 from inference import forward_inference_detailed
 from backward_inference import backward_inference_detailed, backward_inference_with_trace
+from rule_base import rule_base_from_payload, rule_base_from_store, advance_store_rule_base
+from rule_store import JournaledRuleStore, id_problems, normalize_id
+from rule_import import import_rules, validate_rule
+from render_cache import RenderCache, render_key
+from graph_svg import render_svg
+from sqlite_store import SQLiteRuleStore
+from fpg import LAYOUT_METHODS
 
 app = Flask(__name__)
-CORS(app)
+# Cho phép JS đọc header phân trang của GET /rules và ETag của ảnh đồ thị
+CORS(app, expose_headers=['X-Total-Count', 'X-Next-Cursor', 'ETag'])
+
+# Kích thước trang tối đa của GET /rules
+MAX_PAGE_SIZE = 1000
 
 # === CẤU HÌNH DỮ LIỆU ===
 DATA_FOLDER = 'data'
@@ -23,60 +32,218 @@ def ensure_data_exists():
         with open(DATA_FILE, 'w', encoding='utf-8') as f:
             json.dump([], f)
 
-def load_rules_from_file():
-    """Đọc luật từ file JSON"""
-    ensure_data_exists()
-    try:
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return []
+DB_FILE = os.path.join(DATA_FOLDER, 'rules.db')
+# Kho luật: 'json' (mặc định) hoặc 'sqlite'
+RULE_STORE = os.environ.get('RULE_STORE', 'json').lower()
+
+# Cache ảnh FPG/RPG: RENDER_CACHE_SIZE ảnh trong bộ nhớ; đặt RENDER_CACHE_DIR để lưu thêm trên đĩa
+GRAPH_FIGSIZE = (26, 18)
+render_cache = RenderCache(max_entries=int(os.environ.get('RENDER_CACHE_SIZE', '32')),
+                           disk_dir=os.environ.get('RENDER_CACHE_DIR') or None)
+
+def get_rule_base(data, goals=None):
+    """
+    Tập luật đã biên dịch: từ 'rules' client gửi lên, không có thì từ kho luật.
+    goals: chỉ nạp tập luật liên quan (khi kho hỗ trợ, VD: SQLite) - dùng cho suy diễn lùi
+    """
+    if data.get('rules'):
+        return rule_base_from_payload(data['rules'])
+    return rule_base_from_store(rule_store, goals)
 
-def save_rules_to_file(rules):
-    """Lưu luật vào file JSON"""
-    ensure_data_exists()
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(rules, f, ensure_ascii=False, indent=4)
+ensure_data_exists()
+if RULE_STORE == 'sqlite':
+    # Kho SQLite: data/rules.db; lần đầu chạy được nạp từ data/rules.json
+    rule_store = SQLiteRuleStore(DB_FILE, DATA_FILE)
+else:
+    # Kho JSON: data/rules.json (snapshot) + data/rules.json.journal (nhật ký thao tác)
+    rule_store = JournaledRuleStore(DATA_FILE)
 
 # === API QUẢN LÝ DATA ===
 
 @app.route('/rules', methods=['GET'])
 def get_rules():
-    """Lấy danh sách luật hiện có"""
-    rules = load_rules_from_file()
-    return jsonify(rules)
+    """
+    Lấy danh sách luật hiện có.
+
+    Query (tùy chọn):
+        limit: số luật mỗi trang (1..MAX_PAGE_SIZE); không có tham số nào => trả về tất cả như trước
+        cursor: giá trị X-Next-Cursor của trang trước
+        q_premise, q_conclusion: chuỗi con của tiền đề / kết luận (không phân biệt hoa thường)
+        id_min, id_max: khoảng ID số
+    Header trả về: X-Total-Count (số luật khớp bộ lọc), X-Next-Cursor (khi còn trang sau)
+    """
+    args = request.args
+    try:
+        limit = int(args['limit']) if args.get('limit') else None
+        cursor = int(args['cursor']) if args.get('cursor') else None
+        id_min = int(args['id_min']) if args.get('id_min') else None
+        id_max = int(args['id_max']) if args.get('id_max') else None
+    except ValueError:
+        return jsonify({'error': 'limit/cursor/id_min/id_max phải là số nguyên'}), 400
+    filters = {
+        'q_premise': args.get('q_premise') or None,
+        'q_conclusion': args.get('q_conclusion') or None,
+        'id_min': id_min,
+        'id_max': id_max,
+    }
+
+    if limit is None and cursor is None and not any(v is not None for v in filters.values()):
+        rules = rule_store.all()
+        response = jsonify(rules)
+        response.headers['X-Total-Count'] = str(len(rules))
+        return response
+
+    if limit is None:
+        limit = MAX_PAGE_SIZE
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        return jsonify({'error': f'limit phải trong khoảng 1..{MAX_PAGE_SIZE}'}), 400
+
+    rules, next_cursor, total = rule_store.page(limit, cursor, **filters)
+    response = jsonify(rules)
+    response.headers['X-Total-Count'] = str(total)
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = str(next_cursor)
+    return response
+
+@app.route('/rules/export', methods=['GET'])
+def export_rules():
+    """Xuất toàn bộ luật ra file JSON (cùng định dạng rules.json)"""
+    body = json.dumps(rule_store.all(), ensure_ascii=False, indent=4)
+    return Response(body, mimetype='application/json',
+                    headers={'Content-Disposition': 'attachment; filename=rules.json'})
 
 @app.route('/rules/upload', methods=['POST'])
 def upload_rules():
-    """Nhận danh sách luật từ file Excel (đã parse ở client) và lưu đè"""
+    """
+    Nhận danh sách luật từ file Excel (đã parse ở client) và lưu đè.
+    Kho luật khóa theo ID nên file có luật thiếu ID hoặc ID trùng bị từ chối (400),
+    thay vì lặng lẽ chỉ giữ luật cuối cùng của mỗi ID.
+    """
     try:
         new_rules = request.json.get('rules', [])
-        save_rules_to_file(new_rules)
-        return jsonify({'success': True, 'message': f'Đã lưu {len(new_rules)} luật vào hệ thống.'})
+        blank_rows, duplicate_ids = id_problems(new_rules)
+        if blank_rows or duplicate_ids:
+            problems = []
+            if blank_rows:
+                problems.append(f'{len(blank_rows)} luật thiếu ID (luật thứ {", ".join(map(str, blank_rows[:20]))})')
+            if duplicate_ids:
+                problems.append(f'ID bị trùng: {", ".join(duplicate_ids[:20])}')
+            return jsonify({'success': False, 'error': 'Không lưu tập luật: ' + '; '.join(problems),
+                            'blank_rows': blank_rows, 'duplicate_ids': duplicate_ids}), 400
+        rule_store.replace_all(new_rules)
+        return jsonify({'success': True, 'message': f'Đã lưu {len(rule_store)} luật vào hệ thống.'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/rules/upload/diff', methods=['POST'])
+def upload_rules_diff():
+    """
+    Bước 1 của upload tăng dần: client gửi {hashes: {id: rule_hash}} của toàn bộ file.
+    Trả về các ID server chưa có (missing), có nhưng khác nội dung (changed)
+    và có nhưng không còn trong file (removed).
+    """
+    client_hashes = (request.json or {}).get('hashes')
+    if not isinstance(client_hashes, dict):
+        return jsonify({'error': 'Thiếu hashes {id: hash}'}), 400
+    server_hashes = rule_store.hashes()
+    missing, changed = [], []
+    client_ids = set()  # kho khóa theo ID đã normalize_id
+    for rule_id, digest in client_hashes.items():
+        key = normalize_id(rule_id)
+        client_ids.add(key)
+        if key not in server_hashes:
+            missing.append(rule_id)
+        elif server_hashes[key] != digest:
+            changed.append(rule_id)
+    removed = [rule_id for rule_id in server_hashes if rule_id not in client_ids]
+    return jsonify({'missing': missing, 'changed': changed, 'removed': removed, 'version': rule_store.version})
+
+def _patch_errors(upserts, deletes):
+    """
+    Lỗi của một đợt /rules/upload/patch (danh sách rỗng nếu hợp lệ): mỗi luật phải có ID
+    không rỗng, không có khoảng trắng đầu/cuối (kho khóa theo ID nguyên văn, engine theo ID
+    đã strip), không trùng trong đợt, và đủ vế trái/vế phải như rule_import.validate_rule.
+    """
+    if not isinstance(upserts, list) or not isinstance(deletes, list):
+        return [{'error': "'rules' và 'delete' phải là danh sách"}]
+    errors = []
+    seen = set()
+    for position, rule in enumerate(upserts, start=1):
+        if not isinstance(rule, dict):
+            errors.append({'index': position, 'error': 'Luật phải là object'})
+            continue
+        raw_id = str(rule.get('id', ''))
+        row = {'id': raw_id.strip(), 'veTrai': str(rule.get('veTrai', '')).strip(),
+               'vePhai': str(rule.get('vePhai', '')).strip()}
+        error = validate_rule(row)
+        if error is None and raw_id != row['id']:
+            error = 'ID có khoảng trắng ở đầu/cuối'
+        if error is None and row['id'] in seen:
+            error = 'ID bị trùng trong đợt cập nhật'
+        seen.add(row['id'])
+        if error:
+            errors.append({'index': position, 'id': raw_id, 'error': error})
+    return errors
+
+@app.route('/rules/upload/patch', methods=['POST'])
+def upload_rules_patch():
+    """
+    Bước 2: client chỉ gửi các luật missing/changed ('rules') và ID cần xóa ('delete').
+    Luật sửa giữ nguyên vị trí, luật mới nối vào cuối; tập luật đã biên dịch được cập nhật tăng dần.
+    Đợt có luật không hợp lệ bị từ chối cả đợt (400, kèm danh sách lỗi).
+    """
+    try:
+        data = request.json or {}
+        upserts = data.get('rules', [])
+        deletes = data.get('delete', [])
+        errors = _patch_errors(upserts, deletes)
+        if errors:
+            summary = '; '.join(f"{e.get('id') or '#' + str(e.get('index', ''))}: {e['error']}" for e in errors[:10])
+            return jsonify({'success': False, 'error': f'{len(errors)} luật không hợp lệ ({summary})',
+                            'errors': errors}), 400
+        old_version = rule_store.version
+        applied = rule_store.apply_patch(upserts, deletes)
+        if applied:
+            advance_store_rule_base(rule_store, old_version, upserts, deletes)
+        # apply_patch đếm mọi luật ghi đè cộng các luật thực sự bị xóa (ID không tồn tại không tính)
+        deleted = applied - len(upserts)
+        return jsonify({'success': True, 'version': rule_store.version, 'total': len(rule_store),
+                        'updated': len(upserts), 'deleted': deleted,
+                        'message': f'Đã cập nhật {len(upserts)} luật, xóa {deleted} luật '
+                                   f'({len(rule_store)} luật trong hệ thống).'})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/rules/import', methods=['POST'])
+def import_rules_file():
+    """
+    Nhập luật từ file .xlsx/.csv gốc (multipart, trường 'file'); server đọc từng dòng
+    và ghi vào kho theo lô, nên trình duyệt không phải parse workbook lớn.
+    Form: mode = 'replace' (mặc định, như /rules/upload) | 'merge' (chỉ thêm/ghi đè)
+    Trả về NDJSON: mỗi dòng một sự kiện error/progress/done/fatal (xem rule_import.import_rules)
+    """
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'error': 'Thiếu file (trường "file")'}), 400
+    mode = request.form.get('mode', 'replace')
+    if mode not in ('replace', 'merge'):
+        return jsonify({'error': 'mode phải là "replace" hoặc "merge"'}), 400
+
+    def events():
+        for event in import_rules(rule_store, upload.stream, upload.filename, replace=(mode == 'replace')):
+            yield json.dumps(event, ensure_ascii=False) + '\n'
+    return Response(stream_with_context(events()), mimetype='application/x-ndjson')
+
 @app.route('/rules/add', methods=['POST'])
 def add_rule():
-    """Thêm một luật mới"""
+    """Thêm một luật mới (nếu trùng ID thì server cấp ID mới)"""
     try:
         rule = request.json.get('rule')
         if not rule:
             return jsonify({'error': 'Thiếu dữ liệu luật'}), 400
         
-        rules = load_rules_from_file()
-        # Kiểm tra ID trùng
-        if any(r['id'] == rule['id'] for r in rules):
-             # Nếu trùng ID thì tự tăng ID lên
-            try:
-                max_id = max([int(r['id']) for r in rules if str(r['id']).isdigit()] or [0])
-                rule['id'] = str(max_id + 1)
-            except:
-                rule['id'] = str(len(rules) + 1)
-
-        rules.append(rule)
-        save_rules_to_file(rules)
-        return jsonify({'success': True, 'rules': rules})
+        rule = rule_store.add(rule)
+        return jsonify({'success': True, 'rule': rule, 'version': rule_store.version})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -88,17 +255,9 @@ def update_rule():
         if not updated_rule:
             return jsonify({'error': 'Thiếu dữ liệu'}), 400
         
-        rules = load_rules_from_file()
-        found = False
-        for i, r in enumerate(rules):
-            if r['id'] == updated_rule['id']:
-                rules[i] = updated_rule
-                found = True
-                break
-        
-        if found:
-            save_rules_to_file(rules)
-            return jsonify({'success': True, 'rules': rules})
+        if rule_store.update(updated_rule):
+            updated_rule = dict(updated_rule, id=normalize_id(updated_rule.get('id', '')))
+            return jsonify({'success': True, 'rule': updated_rule, 'version': rule_store.version})
         else:
             return jsonify({'success': False, 'error': 'Không tìm thấy ID luật'}), 404
     except Exception as e:
@@ -109,12 +268,8 @@ def delete_rule():
     """Xóa luật"""
     try:
         rule_id = request.json.get('id')
-        rules = load_rules_from_file()
-        new_rules = [r for r in rules if r['id'] != rule_id]
-        
-        if len(new_rules) < len(rules):
-            save_rules_to_file(new_rules)
-            return jsonify({'success': True, 'rules': new_rules})
+        if rule_store.delete(rule_id):
+            return jsonify({'success': True, 'id': rule_id, 'version': rule_store.version})
         else:
             return jsonify({'success': False, 'error': 'Không tìm thấy ID để xóa'}), 404
     except Exception as e:
@@ -123,25 +278,78 @@ def delete_rule():
 # === CÁC API CŨ (LOGIC SUY DIỄN) GIỮ NGUYÊN ===
 # (FPG, RPG, Inference endpoints...)
 
+GRAPH_OUTPUTS = ('png', 'json', 'svg')
+
+def graph_response(kind, rule_base, initial_facts, target_goals, layout_method, output, prune=False):
+    """
+    Đồ thị FPG/RPG theo định dạng output:
+    - 'png': ảnh matplotlib (base64) qua render_cache
+    - 'json': nodes/edges/tọa độ + phân loại GT/KL (R_GT/R_KL) để client tự vẽ
+    - 'svg': SVG gọn dựng từ dữ liệu JSON (không dùng matplotlib)
+    Layout lấy từ rule_base.layout() nên được cache riêng, dùng chung cho cả ba định dạng.
+    prune: chỉ vẽ phần liên quan GT -> KL (rule_base.pruned), cần có cả GT và KL; với FPG,
+    tiền đề không suy ra được từ GT của các luật được giữ vẫn được vẽ nhưng mờ, nét đứt.
+    Khóa (loại đồ thị, nội dung tập luật, GT, KL, layout, figsize, output, prune) cũng là ETag:
+    client gửi If-None-Match trùng thì nhận 304, không cần tải lại.
+    """
+    prune = bool(prune and initial_facts and target_goals)
+    figsize = GRAPH_FIGSIZE if output == 'png' else None
+    key = render_key(kind, rule_base.digest(), sorted(set(initial_facts or [])), sorted(set(target_goals or [])),
+                     layout_method, figsize, output, prune)
+    if request.if_none_match.contains(key):
+        response = app.response_class(status=304)
+    else:
+        def view_and_layout():
+            if prune:
+                return rule_base.pruned(kind, initial_facts, target_goals, layout_method)
+            if kind == 'fpg':
+                view = rule_base.fpg(initial_facts, target_goals)
+            else:
+                view = rule_base.rpg(initial_facts, target_goals)
+            return view, rule_base.layout(kind, layout_method)
+
+        if output == 'png':
+            def render():
+                view, pos = view_and_layout()
+                if kind == 'fpg':
+                    return view.visualize_to_base64(figsize=GRAPH_FIGSIZE, layout_method=layout_method, pos=pos)
+                return view.visualize_to_base64(figsize=GRAPH_FIGSIZE, pos=pos)
+            image_base64, cached = render_cache.get_or_render(key, render)
+            response = jsonify({'success': True, 'image': image_base64, 'cached': cached})
+        else:
+            view, pos = view_and_layout()
+            graph_data = view.to_graph_data(pos)
+            if output == 'json':
+                response = jsonify({'success': True, 'graph': graph_data})
+            else:
+                response = jsonify({'success': True, 'svg': render_svg(graph_data)})
+    response.set_etag(key)
+    response.cache_control.no_cache = True
+    return response
+
 @app.route('/generate_fpg', methods=['POST'])
 def generate_fpg():
     try:
         # Nếu client gửi rules thì dùng, không thì load từ file
-        data = request.json.get('rules') or load_rules_from_file()
+        rule_base = get_rule_base(request.json)
         initial_facts = request.json.get('initial_facts', [])
         target_goals = request.json.get('target_goals', [])
         layout_method = request.json.get('layout_method', 'kamada_kawai')
+        output = request.json.get('output', 'png')
         
-        if not data:
+        if not len(rule_base):
             return jsonify({'error': 'Không có dữ liệu luật'}), 400
+        if output not in GRAPH_OUTPUTS:
+            return jsonify({'error': 'output phải là "png", "json" hoặc "svg"'}), 400
+        # layout_method là một phần khóa cache (layout, ảnh, ETag): chỉ nhận các cách bố trí có thật
+        if layout_method not in LAYOUT_METHODS:
+            return jsonify({'error': f'layout_method phải là một trong: {", ".join(LAYOUT_METHODS)}'}), 400
+        try:
+            prune = read_prune(request.json)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        fpg = FPG()
-        fpg.load_from_data(data)
-        fpg.set_initial_and_target(initial_facts, target_goals)
-        fpg.build_graph()
-        
-        image_base64 = fpg.visualize_to_base64(layout_method=layout_method)
-        return jsonify({'success': True, 'image': image_base64})
+        return graph_response('fpg', rule_base, initial_facts, target_goals, layout_method, output, prune=prune)
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -150,41 +358,72 @@ def generate_fpg():
 @app.route('/generate_rpg', methods=['POST'])
 def generate_rpg():
     try:
-        data = request.json.get('rules') or load_rules_from_file()
+        rule_base = get_rule_base(request.json)
         initial_facts = request.json.get('initial_facts', [])
         target_goals = request.json.get('target_goals', [])
+        output = request.json.get('output', 'png')
         
-        if not data:
+        if not len(rule_base):
             return jsonify({'error': 'Không có dữ liệu luật'}), 400
+        if output not in GRAPH_OUTPUTS:
+            return jsonify({'error': 'output phải là "png", "json" hoặc "svg"'}), 400
+        try:
+            prune = read_prune(request.json)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        rpg = RPG()
-        rpg.load_from_data(data)
-        rpg.set_initial_and_target(initial_facts, target_goals)
-        rpg.build_graph()
-        
-        image_base64 = rpg.visualize_to_base64()
-        return jsonify({'success': True, 'image': image_base64})
+        # RPG luôn dùng Kamada-Kawai
+        return graph_response('rpg', rule_base, initial_facts, target_goals, 'kamada_kawai', output, prune=prune)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def read_prune(data):
+    """Cờ 'prune' của /generate_fpg, /generate_rpg: chỉ nhận true/false (JSON boolean)"""
+    prune = data.get('prune', False)
+    if not isinstance(prune, bool):
+        raise ValueError('prune phải là true hoặc false')
+    return prune
+
+def read_trace_options(data):
+    """Đọc trace_mode ('full' | 'compact') và snapshot_every từ body request"""
+    trace_mode = data.get('trace_mode', 'full')
+    if trace_mode not in ('full', 'compact'):
+        raise ValueError('trace_mode phải là "full" hoặc "compact"')
+    snapshot_every = int(data.get('snapshot_every', 50))
+    return trace_mode, snapshot_every
+
 @app.route('/forward_inference_advanced', methods=['POST'])
 def forward_inference_advanced():
     try:
         data = request.json
-        rules = data.get('rules') or load_rules_from_file()
+        rule_base = get_rule_base(data)
         initial_facts = data.get('initial_facts', [])
         goals = data.get('goals', [])
+        # Ngân sách tùy chọn cho từng request: số bước và/hoặc thời gian (giây)
+        max_steps = data.get('max_steps')
+        time_limit = data.get('time_limit')
         
-        if not rules: return jsonify({'error': 'Chưa có luật trong hệ thống'}), 400
+        if not len(rule_base): return jsonify({'error': 'Chưa có luật trong hệ thống'}), 400
+        try:
+            max_steps = int(max_steps) if max_steps is not None else None
+            time_limit = float(time_limit) if time_limit is not None else None
+        except (TypeError, ValueError):
+            return jsonify({'error': 'max_steps/time_limit không hợp lệ'}), 400
+        try:
+            trace_mode, snapshot_every = read_trace_options(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
         
         success, process_table, full_vet, optimal_vet, explanation, conclusion = \
-            forward_inference_detailed(initial_facts, goals, rules)
+            forward_inference_detailed(initial_facts, goals, rule_base.rules_list, max_steps, time_limit,
+                                       trace_mode, snapshot_every, compiled=rule_base)
         
         return jsonify({
             'success': success, 'process_table': process_table,
             'full_vet': full_vet, 'optimal_vet': optimal_vet,
             'explanation': explanation, 'conclusion': conclusion,
-            'initial_facts': initial_facts, 'goals': goals
+            'initial_facts': initial_facts, 'goals': goals,
+            'trace_mode': trace_mode
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -193,20 +432,26 @@ def forward_inference_advanced():
 def backward_inference_advanced():
     try:
         data = request.json
-        rules = data.get('rules') or load_rules_from_file()
         initial_facts = data.get('initial_facts', [])
         goals = data.get('goals', [])
+        rule_base = get_rule_base(data, goals)
         
-        if not rules: return jsonify({'error': 'Chưa có luật trong hệ thống'}), 400
+        if not len(rule_base): return jsonify({'error': 'Chưa có luật trong hệ thống'}), 400
+        try:
+            trace_mode, snapshot_every = read_trace_options(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
         
         success, process_table, full_vet, optimal_vet, explanation, conclusion = \
-            backward_inference_detailed(initial_facts, goals, rules)
+            backward_inference_detailed(initial_facts, goals, rule_base.rules_list, trace_mode, snapshot_every,
+                                        compiled=rule_base)
         
         return jsonify({
             'success': success, 'process_table': process_table,
             'full_vet': full_vet, 'optimal_vet': optimal_vet,
             'explanation': explanation, 'conclusion': conclusion,
-            'initial_facts': initial_facts, 'goals': goals
+            'initial_facts': initial_facts, 'goals': goals,
+            'trace_mode': trace_mode
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -215,14 +460,14 @@ def backward_inference_advanced():
 def backward_inference_trace():
     try:
         data = request.json
-        rules = data.get('rules') or load_rules_from_file()
         initial_facts = data.get('initial_facts', [])
         goals = data.get('goals', [])
+        rule_base = get_rule_base(data, goals)
         
-        if not rules: return jsonify({'error': 'Chưa có luật'}), 400
+        if not len(rule_base): return jsonify({'error': 'Chưa có luật'}), 400
         
         success, trace, applied_rules = \
-            backward_inference_with_trace(initial_facts, goals, rules)
+            backward_inference_with_trace(initial_facts, goals, rule_base.rules_list, compiled=rule_base)
         
         return jsonify({
             'success': success, 'trace': trace,
@@ -233,10 +478,10 @@ def backward_inference_trace():
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'ok', 'storage': 'enabled (data/rules.json)'})
+    storage = DB_FILE if RULE_STORE == 'sqlite' else DATA_FILE
+    return jsonify({'status': 'ok', 'storage': f'enabled ({storage})', 'rules': len(rule_store)})
 
 if __name__ == '__main__':
-    ensure_data_exists()
     print("=" * 70)
     print("🚀 Flask Server chạy tại: http://localhost:5000")
     print("📂 Dữ liệu được lưu tại: /data/rules.json")
@@ -0,0 +1,111 @@
+# render_cache.py
+# Cache ảnh PNG của FPG/RPG: LRU trong bộ nhớ + (tùy chọn) thư mục trên đĩa
+
+import base64
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+
+def render_key(*parts) -> str:
+    """Khóa cache (đồng thời là ETag): SHA-1 của JSON chuẩn hóa các thành phần"""
+    canonical = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+class RenderCache:
+    """
+    Ảnh đã vẽ (base64) theo khóa render_key(...):
+    - Tầng bộ nhớ: OrderedDict LRU, tối đa `max_entries` ảnh
+    - Tầng đĩa (khi có disk_dir): file <khóa>.png, giữ lại qua các lần khởi động;
+      tối đa `max_disk_entries` file, file lâu không dùng nhất bị xóa trước
+
+    Vẽ ngoài khóa: hai request cùng lúc có thể vẽ trùng nhưng kết quả như nhau.
+    """
+
+    def __init__(self, max_entries: int = 32, disk_dir: Optional[str] = None, max_disk_entries: int = 256):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get_or_render(self, key: str, render: Callable[[], str]) -> Tuple[str, bool]:
+        """
+        Returns:
+            (image_base64, hit): hit=False nếu vừa phải gọi render()
+        """
+        image = self.get(key)
+        if image is not None:
+            return image, True
+        image = render()
+        self.put(key, image)
+        return image, False
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+                return image
+        image = self._read_disk(key)
+        if image is not None:
+            self._remember(key, image)
+        return image
+
+    def put(self, key: str, image: str):
+        self._remember(key, image)
+        self._write_disk(key, image)
+
+    def _remember(self, key: str, image: str):
+        with self._lock:
+            self._entries[key] = image
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    # === TẦNG ĐĨA ===
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key + '.png')
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        if not self.disk_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # Đánh dấu vừa dùng (xóa theo mtime cũ nhất)
+        except OSError:
+            return None
+        return base64.b64encode(data).decode()
+
+    def _write_disk(self, key: str, image: str):
+        if not self.disk_dir:
+            return
+        path = self._path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(base64.b64decode(image))
+            os.replace(tmp_path, path)
+            self._prune_disk()
+        except OSError:
+            pass  # Tầng đĩa chỉ là cache: lỗi ghi không làm hỏng request
+
+    def _prune_disk(self):
+        files = [entry for entry in os.scandir(self.disk_dir) if entry.name.endswith('.png')]
+        if len(files) <= self.max_disk_entries:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - self.max_disk_entries]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
@@ -8,6 +8,8 @@ import base64
 from collections import defaultdict
 import numpy as np
 
+from layout_engine import KAMADA_KAWAI_MAX_NODES, layered_layout
+
 class RPG:
     def __init__(self):
         self.graph = nx.DiGraph()
@@ -65,27 +67,73 @@ class RPG:
             )
         
         # Tao edges dua tren quan he tien de (Precedence)
+        # Chi muc: su kien f -> cac luat j co f trong left (theo thu tu luat, moi luat mot lan)
+        # => chi duyet cac cap (ri, rj) thuc su noi nhau, chi phi ~ so canh thay vi n^2
+        users_of = self._antecedent_index()
         for i, rule_i in enumerate(self.rules):
             consequent_i = rule_i['consequent'] # f cua rule i
             rule_id_i = rule_i['id']
             
-            for j, rule_j in enumerate(self.rules):
-                if i == j:
-                    continue
-                    
-                antecedents_j = rule_j['antecedents'] # left cua rule j
-                rule_id_j = rule_j['id']
-                
-                # Neu f thuoc left cua rule j -> Tao cung (ri, rj)
-                if consequent_i in antecedents_j:
-                    self.graph.add_edge(rule_id_i, rule_id_j)
+            # Moi luat j co f thuoc left -> Tao cung (ri, rj)
+            for j in users_of.get(consequent_i, ()):
+                if i != j:
+                    self.graph.add_edge(rule_id_i, self.rules[j]['id'])
     
-    def visualize_to_base64(self, figsize=(26, 18)):
+    def _antecedent_index(self):
+        """Chi muc su kien -> [chi so luat co su kien do trong left], tang dan"""
+        users_of = defaultdict(list)
+        for j, rule in enumerate(self.rules):
+            for fact in dict.fromkeys(rule['antecedents']):
+                users_of[fact].append(j)
+        return users_of
+    
+    def subgraph(self, rule_indices, cone):
+        """
+        RPG moi chi gom cac luat rule_indices (luat nam tren duong GT -> KL, xem graph_cone);
+        giu nguyen left cua luat de phan loai R_GT dung
+        """
+        sub = RPG()
+        for index in rule_indices:
+            rule = self.rules[index]
+            sub.add_rule(rule['id'], rule['antecedents'], rule['consequent'])
+        sub.build_graph()
+        return sub
+
+    def compute_layout(self):
+        """Vi tri cac luat {rule_id: (x, y)}; chi phu thuoc tap luat, khong phu thuoc GT/KL"""
+        pos = self._get_kamada_kawai_layout()
+        return {node: (float(x), float(y)) for node, (x, y) in pos.items()}
+
+    def _classify(self, node):
+        """(is_R_GT, is_R_KL) cua mot luat theo GT/KL hien tai"""
+        node_data = self.graph.nodes[node]
+        antecedents = node_data.get('antecedents', [])
+        consequent = node_data.get('consequent', '')
+        # R_GT = {r : left -> q | left subset GT}; R_KL = {r : left -> q | q subset KL}
+        is_R_GT = bool(antecedents) and set(antecedents).issubset(self.initial_facts)
+        is_R_KL = consequent in self.target_goals
+        return is_R_GT, is_R_KL
+
+    def to_graph_data(self, pos):
+        """
+        Du lieu de client tu ve RPG (thay cho anh PNG):
+        nodes: id, x, y, R_GT, R_KL; edges: source, target (r_i -> r_j)
+        """
+        nodes = []
+        for node in self.graph.nodes():
+            is_R_GT, is_R_KL = self._classify(node)
+            nodes.append({'id': node, 'label': f"r{node}", 'x': round(pos[node][0], 2),
+                          'y': round(pos[node][1], 2), 'R_GT': is_R_GT, 'R_KL': is_R_KL})
+        edges = [{'source': source, 'target': target} for source, target in self.graph.edges()]
+        return {'kind': 'rpg', 'radius': 1.8, 'nodes': nodes, 'edges': edges}
+
+    def visualize_to_base64(self, figsize=(26, 18), pos=None):
         """
         Ve RPG theo ly thuyet:
         - Nodes: Luat
         - R_GT: Tap luat thoa man ngay tu dau (left la tap con cua GT)
         - R_KL: Tap luat thoa man ket luan (right la tap con cua KL)
+        pos: layout da tinh san (compute_layout), None => tinh lai
         """
         fig = plt.figure(figsize=figsize, facecolor='white')
         ax = fig.add_subplot(111)
@@ -103,7 +151,8 @@ class RPG:
             return image_base64
         
         # SU DUNG KAMADA-KAWAI LAYOUT nhu yeu cau
-        pos = self._get_kamada_kawai_layout()
+        if pos is None:
+            pos = self.compute_layout()
         
         # ========== VE EDGES ==========
         for (source, target) in self.graph.edges():
@@ -142,20 +191,8 @@ class RPG:
         for node in self.graph.nodes():
             x, y = pos[node]
             
-            node_data = self.graph.nodes[node]
-            antecedents = node_data.get('antecedents', [])
-            consequent = node_data.get('consequent', '')
-            
-            # LOGIC MOI: Dinh nghia R_GT theo tap hop
-            # R_GT = {r : left -> q | left subset GT}
-            # Tat ca cac tien de cua luat phai nam trong GT
-            is_R_GT = False
-            if antecedents:
-                is_R_GT = set(antecedents).issubset(self.initial_facts)
-            
-            # LOGIC MOI: Dinh nghia R_KL
-            # R_KL = {r : left -> q | q subset KL}
-            is_R_KL = consequent in self.target_goals
+            # LOGIC MOI: R_GT (tat ca tien de nam trong GT), R_KL (ket luan nam trong KL)
+            is_R_GT, is_R_KL = self._classify(node)
             
             radius = 1.8
             
@@ -231,7 +268,10 @@ class RPG:
         return image_base64
     
     def _get_kamada_kawai_layout(self):
-        """GIU NGUYEN LAYOUT CU"""
+        """GIU NGUYEN LAYOUT CU (do thi lon: dung layout phan tang, xem layout_engine)"""
+        if self.graph.number_of_nodes() > KAMADA_KAWAI_MAX_NODES:
+            pos = layered_layout(self.graph.nodes(), self.graph.edges())
+            return self._push_to_edges_rpg(pos, push_factor=1.5)
         try:
             pos = nx.kamada_kawai_layout(
                 self.graph,
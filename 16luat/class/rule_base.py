@@ -0,0 +1,239 @@
+# rule_base.py
+# Tập luật đã biên dịch, dùng chung giữa các request
+
+import copy
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from fpg import FPG, LAYOUT_METHODS
+from rpg import RPG
+from inference import _parse_rules
+from backward_inference import _index_by_conclusion, _rule_order_key
+from graph_cone import build_adjacency, relevant_cone
+
+# Số tập luật khác nhau giữ trong bộ nhớ (file + các payload client gửi lên)
+MAX_CACHED_RULE_BASES = 8
+# Số tập luật con theo goals (SQLite, suy diễn lùi) - cache riêng để không đẩy tập luật đầy đủ ra ngoài
+MAX_CACHED_GOAL_SUBSETS = 32
+# Số đồ thị rút gọn (prune) theo GT/KL giữ lại cho mỗi tập luật
+MAX_PRUNED_VIEWS = 16
+
+
+class CompiledRuleBase:
+    """
+    Tập luật đã parse một lần:
+    - rules_list: danh sách luật gốc (như trong rules.json)
+    - rules_dict: rule_id -> {premise, conclusion, conclusion_type, note}
+    - by_conclusion: kết luận -> [rule_id] theo thứ tự ưu tiên (suy diễn lùi)
+    - FPG/RPG: đồ thị được dựng lần đầu khi cần, sau đó dùng lại
+    - layout(kind, method): vị trí node của FPG/RPG, tính một lần cho mỗi cách bố trí
+      (không phụ thuộc GT/KL nên dùng chung cho mọi request và mọi định dạng ảnh)
+    - pruned(kind, GT, KL, method): đồ thị chỉ gồm phần liên quan GT -> KL cùng layout riêng
+
+    Đối tượng coi như bất biến; khi luật đổi thì khóa nội dung đổi và một
+    CompiledRuleBase mới được tạo (biên dịch lại, hoặc derive() từ bản cũ).
+    """
+
+    def __init__(self, rules_list: List[Dict], key: str, rules_dict: Optional[Dict[str, Dict]] = None,
+                 by_conclusion: Optional[Dict[str, List[str]]] = None):
+        self.key = key
+        self.rules_list = rules_list
+        self.rules_dict = rules_dict if rules_dict is not None else _parse_rules(rules_list)
+        self.by_conclusion = by_conclusion if by_conclusion is not None else _index_by_conclusion(self.rules_dict)
+        self._fpg: Optional[FPG] = None
+        self._rpg: Optional[RPG] = None
+        self._digest: Optional[str] = None
+        self._layouts: Dict[Tuple[str, str], Dict] = {}
+        self._adjacency = None
+        self._pruned: "OrderedDict[Tuple, Tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rules_list)
+
+    def digest(self) -> str:
+        """SHA-1 nội dung tập luật: giống nhau giữa các lần khởi động/phiên bản kho nếu luật không đổi"""
+        with self._lock:
+            if self._digest is None:
+                canonical = json.dumps(self.rules_list, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+                self._digest = hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+            return self._digest
+
+    def derive(self, rules_list: List[Dict], key: str, upserts: List[Dict], deletes: List) -> 'CompiledRuleBase':
+        """
+        Tập luật mới sau một đợt sửa nhỏ: chỉ parse các luật trong `upserts` và chỉ
+        sắp xếp lại by_conclusion của những kết luận bị ảnh hưởng.
+        rules_list: danh sách luật đầy đủ SAU khi sửa. Đồ thị FPG/RPG được dựng lại khi cần.
+        """
+        rules_dict = dict(self.rules_dict)
+        touched = set()
+        changed_ids = [str(rule_id).strip() for rule_id in deletes]
+        changed_ids += [str(rule.get('id', '')).strip() for rule in upserts]
+        for rule_id in changed_ids:
+            old = rules_dict.pop(rule_id, None)
+            if old is not None:
+                touched.add(old['conclusion'])
+        for rule in upserts:
+            for rule_id, parsed in _parse_rules([rule]).items():
+                rules_dict[rule_id] = parsed
+                touched.add(parsed['conclusion'])
+
+        by_conclusion = dict(self.by_conclusion)
+        changed = set(changed_ids)
+        for conclusion in touched:
+            rule_ids = [r for r in by_conclusion.get(conclusion, ()) if r not in changed]
+            rule_ids += [r for r in changed if r in rules_dict and rules_dict[r]['conclusion'] == conclusion]
+            if rule_ids:
+                by_conclusion[conclusion] = sorted(rule_ids, key=lambda r: _rule_order_key(r, rules_dict))
+            else:
+                by_conclusion.pop(conclusion, None)
+        return CompiledRuleBase(rules_list, key, rules_dict, by_conclusion)
+
+    def layout(self, kind: str, layout_method: str = 'kamada_kawai') -> Dict:
+        """Layout đã cache của đồ thị 'fpg' hoặc 'rpg' (RPG luôn dùng Kamada-Kawai)"""
+        if layout_method not in LAYOUT_METHODS:
+            raise ValueError(f'layout_method không hợp lệ: {layout_method!r}')
+        key = (kind, layout_method)
+        with self._lock:
+            pos = self._layouts.get(key)
+        if pos is None:
+            # Tính ngoài khóa (có thể mất vài giây); tính trùng cũng cho cùng kết quả
+            if kind == 'fpg':
+                pos = self.fpg([], []).compute_layout(layout_method)
+            else:
+                pos = self.rpg([], []).compute_layout()
+            with self._lock:
+                self._layouts[key] = pos
+        return pos
+
+    def pruned(self, kind: str, initial_facts, target_goals, layout_method: str = 'kamada_kawai'):
+        """
+        Đồ thị 'fpg'/'rpg' rút gọn về phần liên quan truy vấn (graph_cone.relevant_cone) và layout
+        của riêng phần đó. Chỉ mục sự kiện -> luật dựng một lần cho tập luật; mỗi (GT, KL, layout)
+        chỉ rút gọn và bố trí một lần (LRU MAX_PRUNED_VIEWS).
+
+        Returns:
+            (view, pos): view đã gắn GT/KL của request
+        """
+        if layout_method not in LAYOUT_METHODS:
+            raise ValueError(f'layout_method không hợp lệ: {layout_method!r}')
+        key = (kind, layout_method, frozenset(initial_facts or ()), frozenset(target_goals or ()))
+        with self._lock:
+            entry = self._pruned.get(key)
+            if entry is not None:
+                self._pruned.move_to_end(key)
+        if entry is None:
+            base = self.fpg([], []) if kind == 'fpg' else self.rpg([], [])
+            with self._lock:
+                if self._adjacency is None:
+                    # FPG.rules và RPG.rules parse giống hệt nhau nên dùng chung một chỉ mục
+                    self._adjacency = build_adjacency(base.rules)
+            rule_indices, cone = relevant_cone(base.rules, self._adjacency, key[2], key[3])
+            graph = base.subgraph(rule_indices, cone)
+            pos = graph.compute_layout(layout_method) if kind == 'fpg' else graph.compute_layout()
+            entry = (graph, pos)
+            with self._lock:
+                self._pruned[key] = entry
+                while len(self._pruned) > MAX_PRUNED_VIEWS:
+                    self._pruned.popitem(last=False)
+        graph, pos = entry
+        view = copy.copy(graph)
+        view.set_initial_and_target(initial_facts, target_goals)
+        return view, pos
+
+    def fpg(self, initial_facts, target_goals) -> FPG:
+        """FPG cho một request: đồ thị dùng chung, chỉ GT/KL là riêng"""
+        with self._lock:
+            if self._fpg is None:
+                graph = FPG()
+                graph.load_from_data(self.rules_list)
+                graph.build_graph()
+                self._fpg = graph
+        view = copy.copy(self._fpg)
+        view.set_initial_and_target(initial_facts, target_goals)
+        return view
+
+    def rpg(self, initial_facts, target_goals) -> RPG:
+        """RPG cho một request: đồ thị dùng chung, chỉ GT/KL là riêng"""
+        with self._lock:
+            if self._rpg is None:
+                graph = RPG()
+                graph.load_from_data(self.rules_list)
+                graph.build_graph()
+                self._rpg = graph
+        view = copy.copy(self._rpg)
+        view.set_initial_and_target(initial_facts, target_goals)
+        return view
+
+
+_cache: "OrderedDict[str, CompiledRuleBase]" = OrderedDict()
+_subset_cache: "OrderedDict[str, CompiledRuleBase]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _put(rule_base: CompiledRuleBase, cache=_cache, max_entries: int = MAX_CACHED_RULE_BASES):
+    with _cache_lock:
+        cache[rule_base.key] = rule_base
+        cache.move_to_end(rule_base.key)
+        while len(cache) > max_entries:
+            cache.popitem(last=False)
+
+
+def _get_or_compile(key: str, load_rules, cache=_cache, max_entries: int = MAX_CACHED_RULE_BASES) -> CompiledRuleBase:
+    with _cache_lock:
+        rule_base = cache.get(key)
+        if rule_base is not None:
+            cache.move_to_end(key)
+            return rule_base
+    # Biên dịch ngoài khóa; hai request cùng lúc có thể biên dịch trùng nhưng kết quả như nhau
+    rule_base = CompiledRuleBase(load_rules(), key)
+    _put(rule_base, cache, max_entries)
+    return rule_base
+
+
+def rule_base_from_payload(rules: List[Dict]) -> CompiledRuleBase:
+    """Tập luật do client gửi lên, khóa theo SHA-1 của JSON chuẩn hóa"""
+    canonical = json.dumps(rules, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    key = 'payload:' + hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+    return _get_or_compile(key, lambda: rules)
+
+
+def rule_base_from_store(store, goals: Optional[List[str]] = None) -> CompiledRuleBase:
+    """
+    Tập luật từ kho luật (JournaledRuleStore / SQLiteRuleStore), khóa theo phiên bản của kho.
+    Nếu có goals và kho hỗ trợ relevant_rules (SQLite) thì chỉ nạp tập luật liên quan tới goals;
+    các tập con này nằm trong cache riêng (MAX_CACHED_GOAL_SUBSETS).
+    """
+    key = f'store:{store.token}:{store.version}'
+    if goals and hasattr(store, 'relevant_rules'):
+        goals = sorted(set(goals))
+        digest = hashlib.sha1(json.dumps(goals, ensure_ascii=False).encode('utf-8')).hexdigest()
+        subset = _get_or_compile(f'{key}:goals:{digest}', lambda: store.relevant_rules(goals),
+                                 _subset_cache, MAX_CACHED_GOAL_SUBSETS)
+        # Không luật nào liên quan: dùng cả tập để engine không báo nhầm "không có luật"
+        if len(subset):
+            return subset
+    return _get_or_compile(key, store.all)
+
+
+def advance_store_rule_base(store, old_version: int, upserts: List[Dict], deletes: List) -> Optional[CompiledRuleBase]:
+    """
+    Sau store.apply_patch: nếu tập luật của phiên bản `old_version` còn trong cache thì
+    derive() ra bản mới thay vì biên dịch lại toàn bộ ở request suy diễn kế tiếp.
+    Trả về None (để biên dịch lười như thường) nếu không có bản cũ hoặc kho đã bị
+    sửa thêm bởi request khác trong lúc đó.
+    """
+    with _cache_lock:
+        previous = _cache.get(f'store:{store.token}:{old_version}')
+    new_version = store.version
+    if previous is None or new_version != old_version + 1:
+        return None
+    rules_list = store.all()
+    if store.version != new_version:
+        return None
+    rule_base = previous.derive(rules_list, f'store:{store.token}:{new_version}', upserts, deletes)
+    _put(rule_base)
+    return rule_base
@@ -0,0 +1,166 @@
+# rule_import.py
+# Nhập luật từ file .xlsx/.csv ở server: đọc từng dòng, kiểm tra, ghi vào kho theo lô
+
+import csv
+import io
+import json
+import tempfile
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from openpyxl import load_workbook
+
+from inference import _normalize_left
+
+# Số dòng hợp lệ giữa hai sự kiện progress
+IMPORT_BATCH_SIZE = 500
+# Số lỗi theo dòng được báo chi tiết; vượt quá chỉ đếm
+MAX_REPORTED_ERRORS = 200
+
+# Tên cột chấp nhận (giống cách app.js đọc file Excel) -> trường của luật
+COLUMN_ALIASES = {
+    'id': 'id',
+    've trai': 'veTrai', 'vetrai': 'veTrai',
+    've phai': 'vePhai', 'vephai': 'vePhai',
+    'note': 'note',
+}
+
+
+class ImportFormatError(ValueError):
+    """File không đọc được hoặc thiếu cột bắt buộc (lỗi cả file, kho luật giữ nguyên)"""
+
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)  # ô số của Excel: 12.0 -> '12'
+    return str(value).strip()
+
+
+def _column_map(header) -> Dict[int, str]:
+    columns = {}
+    for index, name in enumerate(header):
+        field = COLUMN_ALIASES.get(_cell_text(name).casefold())
+        if field and field not in columns.values():
+            columns[index] = field
+    missing = {'id', 'veTrai', 'vePhai'} - set(columns.values())
+    if missing:
+        raise ImportFormatError(f'Thiếu cột: {", ".join(sorted(missing))} (cần ID, Ve Trai, Ve Phai, Note)')
+    return columns
+
+
+def _iter_xlsx(stream) -> Iterator[Tuple]:
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFormatError(f'Không đọc được file Excel: {e}')
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    except (IndexError, KeyError, ValueError, OSError) as e:
+        raise ImportFormatError(f'File Excel bị lỗi: {e}')
+    finally:
+        workbook.close()
+
+
+def _iter_csv(stream) -> Iterator[List[str]]:
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportFormatError(f'Không đọc được file CSV: {e}')
+    finally:
+        text.detach()
+
+
+def iter_rule_rows(stream, filename: str) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """
+    Đọc lần lượt các dòng luật (số dòng trong file, {id, veTrai, vePhai, note}).
+    Dòng đầu là tiêu đề; dòng trống bị bỏ qua. Chỉ giữ một dòng trong bộ nhớ:
+    .xlsx đọc bằng openpyxl read_only, .csv bằng csv.reader.
+    """
+    name = (filename or '').lower()
+    if name.endswith('.xlsx') or name.endswith('.xlsm'):
+        rows = _iter_xlsx(stream)
+    elif name.endswith('.csv'):
+        rows = _iter_csv(stream)
+    else:
+        raise ImportFormatError('Chỉ hỗ trợ file .xlsx hoặc .csv')
+
+    header = next(rows, None)
+    if header is None:
+        raise ImportFormatError('File không có dữ liệu')
+    columns = _column_map(header)
+    for row_number, values in enumerate(rows, start=2):
+        if not any(_cell_text(v) for v in values):
+            continue
+        row = {'id': '', 'veTrai': '', 'vePhai': '', 'note': ''}
+        for index, field in columns.items():
+            if index < len(values):
+                row[field] = _cell_text(values[index])
+        yield row_number, row
+
+
+def validate_rule(row: Dict[str, str]) -> Optional[str]:
+    """Lý do dòng không hợp lệ, hoặc None (cùng điều kiện mà các engine dùng để bỏ qua luật)"""
+    if not row['id']:
+        return 'Thiếu ID'
+    if not row['vePhai']:
+        return 'Thiếu vế phải (kết luận)'
+    if not _normalize_left(row['veTrai']):
+        return 'Thiếu vế trái (tiền đề)'
+    return None
+
+
+def _spooled_rows(spool) -> Iterator[Dict]:
+    spool.seek(0)
+    for line in spool:
+        yield json.loads(line)
+
+
+def import_rules(store, stream, filename: str, replace: bool = True,
+                 batch_size: int = IMPORT_BATCH_SIZE) -> Iterator[Dict]:
+    """
+    Nhập luật vào kho, trả về dần các sự kiện tiến độ:
+        {'type': 'error', 'row', 'id', 'error'}          - dòng không hợp lệ (bị bỏ qua)
+        {'type': 'progress', 'rows', 'valid', 'errors'}  - sau mỗi `batch_size` dòng hợp lệ
+        {'type': 'done', 'rows', 'written', 'errors', 'deleted', 'total', 'version'}
+        {'type': 'fatal', 'error', 'rows', 'written': 0} - lỗi cả file, dừng; kho giữ nguyên
+
+    Các dòng hợp lệ được ghi tạm ra file (spool) trong lúc đọc; chỉ khi đọc hết file
+    mới áp dụng cả đợt bằng MỘT lần store.apply_patch (một lần fsync / một transaction,
+    một phiên bản kho). File lỗi giữa chừng vì thế không để lại tập luật nửa cũ nửa mới.
+    replace=True: giống /rules/upload, luật không có trong file bị xóa trong cùng đợt đó.
+    ID trùng trong file: giữ dòng đầu, các dòng sau báo lỗi.
+    Bộ nhớ: một dòng + tập ID đã gặp; store.apply_patch cũng đọc spool từng dòng
+    (kho JSON ghi thẳng ra journal, kho SQLite ghi từng dòng trong một transaction).
+    """
+    rows = valid = errors = 0
+    seen_ids: Dict[str, int] = {}
+    with tempfile.TemporaryFile('w+', encoding='utf-8') as spool:
+        try:
+            for row_number, row in iter_rule_rows(stream, filename):
+                rows += 1
+                error = validate_rule(row)
+                if error is None and row['id'] in seen_ids:
+                    error = f'ID bị trùng với dòng {seen_ids[row["id"]]}'
+                if error:
+                    errors += 1
+                    if errors <= MAX_REPORTED_ERRORS:
+                        yield {'type': 'error', 'row': row_number, 'id': row['id'], 'error': error}
+                    continue
+                seen_ids[row['id']] = row_number
+                spool.write(json.dumps(row, ensure_ascii=False) + '\n')
+                valid += 1
+                if valid % batch_size == 0:
+                    yield {'type': 'progress', 'rows': rows, 'valid': valid, 'errors': errors}
+        except ImportFormatError as e:
+            yield {'type': 'fatal', 'error': f'{e} - chưa ghi luật nào, tập luật giữ nguyên',
+                   'rows': rows, 'written': 0}
+            return
+
+        deletes = []
+        if replace and seen_ids:
+            deletes = [rule_id for rule_id in store.hashes() if rule_id not in seen_ids]
+        applied = store.apply_patch(_spooled_rows(spool), deletes)
+    yield {'type': 'done', 'rows': rows, 'written': valid, 'errors': errors, 'deleted': applied - valid,
+           'total': len(store), 'version': store.version}
@@ -0,0 +1,385 @@
+# rule_store.py
+# Lưu trữ luật: snapshot rules.json + nhật ký thao tác chỉ ghi nối (append-only)
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from inference import _normalize_left
+
+
+def rule_hash(rule: Dict) -> str:
+    """
+    Băm nội dung một luật để so sánh khi upload tăng dần.
+    SHA-1 của JSON.stringify([id, veTrai, vePhai, note]) - app.js tính y hệt bằng crypto.subtle.
+    """
+    fields = [str(rule.get('id', '')), str(rule.get('veTrai', '')), str(rule.get('vePhai', '')),
+              str(rule.get('note', rule.get('Note', '')))]
+    canonical = json.dumps(fields, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()
+
+
+def normalize_id(rule_id) -> str:
+    """Khóa của luật trong kho: ID dạng chuỗi, bỏ khoảng trắng đầu/cuối (như các engine)"""
+    return str(rule_id).strip()
+
+
+def id_problems(rules: List[Dict]) -> Tuple[List[int], List[str]]:
+    """
+    Kiểm tra ID của một danh sách luật trước khi lưu đè (kho luật khóa theo ID):
+    Returns:
+        (blank_rows, duplicate_ids): vị trí (từ 1) các luật thiếu ID, các ID xuất hiện nhiều lần
+    """
+    blank_rows: List[int] = []
+    counts: Dict[str, int] = {}
+    for position, rule in enumerate(rules, start=1):
+        rule_id = normalize_id(rule.get('id', ''))
+        if not rule_id:
+            blank_rows.append(position)
+        else:
+            counts[rule_id] = counts.get(rule_id, 0) + 1
+    return blank_rows, [rule_id for rule_id, count in counts.items() if count > 1]
+
+
+def _id_in_range(rule_id, id_min: Optional[int], id_max: Optional[int]) -> bool:
+    rule_id = str(rule_id).strip()
+    if not rule_id.isdigit():
+        return False
+    value = int(rule_id)
+    return (id_min is None or value >= id_min) and (id_max is None or value <= id_max)
+
+
+def make_rule_filter(q_premise: Optional[str] = None, q_conclusion: Optional[str] = None,
+                     id_min: Optional[int] = None, id_max: Optional[int] = None) -> Optional[Callable[[Dict], bool]]:
+    """
+    Bộ lọc luật dùng chung cho phân trang GET /rules (không phân biệt hoa thường):
+    - q_premise: có ít nhất một tiền đề chứa chuỗi con này
+    - q_conclusion: kết luận chứa chuỗi con này
+    - id_min/id_max: ID số nằm trong khoảng (ID không phải số bị loại khi lọc theo khoảng)
+    Trả về None nếu không có điều kiện nào.
+    """
+    q_premise = q_premise.casefold() if q_premise else None
+    q_conclusion = q_conclusion.casefold() if q_conclusion else None
+    if not (q_premise or q_conclusion) and id_min is None and id_max is None:
+        return None
+
+    def match(rule: Dict) -> bool:
+        if (id_min is not None or id_max is not None) and not _id_in_range(rule.get('id', ''), id_min, id_max):
+            return False
+        if q_conclusion and q_conclusion not in str(rule.get('vePhai', '')).strip().casefold():
+            return False
+        if q_premise and not any(q_premise in p.casefold() for p in _normalize_left(rule.get('veTrai', ''))):
+            return False
+        return True
+    return match
+
+
+# Dòng đánh dấu đầu/cuối một đợt apply_patch trong journal
+_BATCH_MARKERS = ('begin', 'commit')
+
+
+def _journal_line(op: Dict) -> bytes:
+    return (json.dumps(op, ensure_ascii=False) + '\n').encode('utf-8')
+
+
+class JournaledRuleStore:
+    """
+    Kho luật cho các API CRUD:
+    - Trạng thái hiện tại nằm trong bộ nhớ: OrderedDict id -> luật (giữ thứ tự luật)
+    - Mỗi thao tác thêm/sửa/xóa chỉ ghi nối MỘT dòng JSON vào journal rồi fsync,
+      nên chi phí không phụ thuộc số luật và không mất dữ liệu khi tiến trình chết
+    - Sau `compact_every` thao tác, toàn bộ luật được ghi ra snapshot (file tạm +
+      os.replace, không bao giờ để lại file ghi dở) và journal được làm rỗng
+    - Khi khởi động: đọc snapshot rồi phát lại journal. Dòng cuối ghi dở (tiến
+      trình chết giữa chừng) bị bỏ qua; đợt apply_patch chưa có dòng commit bị
+      bỏ cả đợt. Các thao tác đều lũy đẳng nên phát lại journal trên snapshot
+      đã compact vẫn cho đúng kết quả.
+
+    Mọi thao tác ghi đi qua một khóa nên không có cập nhật nào bị mất.
+    `version` tăng sau mỗi thay đổi (dùng làm khóa cache cho tập luật đã biên dịch).
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: Optional[str] = None, compact_every: int = 1000):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or snapshot_path + '.journal'
+        self.compact_every = compact_every
+        self.token = uuid.uuid4().hex  # Phân biệt các phiên bản store giữa các lần khởi động
+        self.version = 0
+        self._lock = threading.Lock()
+        self._rules: "OrderedDict[str, Dict]" = OrderedDict()
+        self._seq: Dict[str, int] = {}  # id -> số thứ tự tăng dần (con trỏ phân trang)
+        self._seq_order: List[int] = []  # các seq hiện có, tăng dần (cùng thứ tự với _rules)
+        self._id_by_seq: Dict[int, str] = {}
+        self._hashes: Dict[str, str] = {}  # id -> rule_hash (upload tăng dần)
+        self._next_seq = 1
+        self._max_numeric_id = 0
+        self._journal_ops = 0
+        self._load()
+
+    # === ĐỌC ===
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            return list(self._rules.values())
+
+    def get(self, rule_id) -> Optional[Dict]:
+        return self._rules.get(normalize_id(rule_id))
+
+    def __contains__(self, rule_id) -> bool:
+        return normalize_id(rule_id) in self._rules
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+    def next_id(self) -> str:
+        """ID số kế tiếp (lớn hơn mọi ID số đã từng có)"""
+        return str(self._max_numeric_id + 1)
+
+    def hashes(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._hashes)
+
+    def page(self, limit: int, cursor: Optional[int] = None, **filters) -> Tuple[List[Dict], Optional[int], int]:
+        """
+        Phân trang theo con trỏ (keyset): trả về các luật có seq > cursor.
+        filters: tham số của make_rule_filter
+
+        Returns:
+            (rules, next_cursor, total): next_cursor là None khi đã hết; total là số luật khớp bộ lọc
+        """
+        match = make_rule_filter(**filters)
+        with self._lock:
+            order = self._seq_order
+            start = bisect_right(order, cursor) if cursor is not None else 0
+            if match is None:
+                # Không lọc: cắt thẳng danh sách seq, chi phí O(trang)
+                total = len(order)
+                seqs = order[start:start + limit + 1]
+                page = [self._rules[self._id_by_seq[seq]] for seq in seqs[:limit]]
+                return page, (seqs[limit - 1] if len(seqs) > limit else None), total
+
+            # Có lọc: total phải đếm trên toàn bộ luật (như COUNT(*) của kho SQLite),
+            # còn trang bắt đầu ngay sau con trỏ
+            total = sum(1 for rule in self._rules.values() if match(rule))
+            page: List[Dict] = []
+            next_cursor = None
+            last_position = start
+            for position in range(start, len(order)):
+                rule = self._rules[self._id_by_seq[order[position]]]
+                if not match(rule):
+                    continue
+                if len(page) == limit:
+                    next_cursor = order[last_position]
+                    break
+                page.append(rule)
+                last_position = position
+        return page, next_cursor, total
+
+    # === GHI ===
+
+    def add(self, rule: Dict) -> Dict:
+        """Thêm luật; nếu thiếu ID hoặc ID đã tồn tại thì cấp ID số mới"""
+        with self._lock:
+            rule_id = normalize_id(rule.get('id', ''))
+            if not rule_id or rule_id in self._rules:
+                rule_id = self.next_id()
+            if rule.get('id') != rule_id:
+                rule = dict(rule, id=rule_id)
+            self._write({'op': 'put', 'rule': rule})
+            return rule
+
+    def update(self, rule: Dict) -> bool:
+        """Cập nhật luật theo ID; trả về False nếu không có luật đó"""
+        with self._lock:
+            rule_id = normalize_id(rule.get('id', ''))
+            if rule_id not in self._rules:
+                return False
+            if rule.get('id') != rule_id:
+                rule = dict(rule, id=rule_id)
+            self._write({'op': 'put', 'rule': rule})
+            return True
+
+    def delete(self, rule_id) -> bool:
+        with self._lock:
+            rule_id = normalize_id(rule_id)
+            if rule_id not in self._rules:
+                return False
+            self._write({'op': 'delete', 'id': rule_id})
+            return True
+
+    def apply_patch(self, upserts: Iterable[Dict], deletes: List) -> int:
+        """
+        Áp dụng một đợt upload tăng dần: thêm/ghi đè `upserts`, xóa các ID trong `deletes`.
+        Cả đợt là MỘT giao dịch trong journal: dòng begin, các thao tác, dòng commit,
+        rồi MỘT lần fsync. Thao tác được ghi thẳng ra file khi đọc từ `upserts` và chỉ
+        áp dụng vào bộ nhớ sau commit (đọc lại từ journal), nên không giữ cả đợt
+        trong bộ nhớ. Đợt chưa có commit (lỗi giữa chừng, tiến trình chết) bị bỏ cả đợt.
+        Trả về số thao tác đã áp dụng.
+        """
+        with self._lock:
+            deletes = [normalize_id(rule_id) for rule_id in deletes if normalize_id(rule_id) in self._rules]
+            count = 0
+            with open(self.journal_path, 'ab') as f:
+                start = f.tell()
+                try:
+                    f.write(_journal_line({'op': 'begin'}))
+                    for rule in upserts:
+                        f.write(_journal_line({'op': 'put', 'rule': rule}))
+                        count += 1
+                    for rule_id in deletes:
+                        f.write(_journal_line({'op': 'delete', 'id': rule_id}))
+                        count += 1
+                    if count:
+                        f.write(_journal_line({'op': 'commit'}))
+                except BaseException:
+                    f.truncate(start)
+                    raise
+                if not count:
+                    f.truncate(start)
+                    return 0
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.journal_path, 'rb') as f:
+                f.seek(start)
+                for line in f:
+                    op = json.loads(line)
+                    if op['op'] not in _BATCH_MARKERS:
+                        self._apply(op)
+            self.version += 1
+            self._journal_ops += count
+            if self._journal_ops >= self.compact_every:
+                self._compact_locked()
+            return count
+
+    def replace_all(self, rules: List[Dict]):
+        """Thay toàn bộ tập luật (upload): ghi thẳng snapshot mới"""
+        with self._lock:
+            self._rules.clear()
+            self._seq.clear()
+            self._seq_order.clear()
+            self._id_by_seq.clear()
+            self._hashes.clear()
+            for rule in rules:
+                self._apply({'op': 'put', 'rule': rule})
+            self._compact_locked()
+            self.version += 1
+
+    def compact(self):
+        with self._lock:
+            self._compact_locked()
+
+    # === NỘI BỘ ===
+
+    def _apply(self, op: Dict):
+        if op['op'] == 'put':
+            rule = op['rule']
+            rule_id = normalize_id(rule.get('id', ''))
+            self._rules[rule_id] = rule  # Sửa luật cũ giữ nguyên vị trí trong OrderedDict
+            if rule_id not in self._seq:
+                self._seq[rule_id] = self._next_seq
+                self._seq_order.append(self._next_seq)  # seq luôn tăng nên danh sách vẫn có thứ tự
+                self._id_by_seq[self._next_seq] = rule_id
+                self._next_seq += 1
+            self._hashes[rule_id] = rule_hash(rule)
+            if rule_id.isdigit():
+                self._max_numeric_id = max(self._max_numeric_id, int(rule_id))
+        elif op['op'] == 'max_id':
+            self._max_numeric_id = max(self._max_numeric_id, op['value'])
+        elif op['op'] == 'delete':
+            rule_id = normalize_id(op['id'])
+            self._rules.pop(rule_id, None)
+            seq = self._seq.pop(rule_id, None)
+            if seq is not None:
+                del self._seq_order[bisect_left(self._seq_order, seq)]
+                del self._id_by_seq[seq]
+            self._hashes.pop(rule_id, None)
+
+    def _write(self, *ops: Dict):
+        lines = ''.join(json.dumps(op, ensure_ascii=False) + '\n' for op in ops)
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        for op in ops:
+            self._apply(op)
+        self.version += 1
+        self._journal_ops += len(ops)
+        if self._journal_ops >= self.compact_every:
+            self._compact_locked()
+
+    def _compact_locked(self):
+        tmp_path = self.snapshot_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(list(self._rules.values()), f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        # Snapshot đã chứa mọi thao tác; journal chỉ còn ID số lớn nhất từng có (snapshot
+        # không lưu được ID của luật đã xóa), để next_id không cấp lại ID đó sau khi khởi động lại
+        with open(self.journal_path, 'w', encoding='utf-8') as f:
+            if self._max_numeric_id:
+                f.write(json.dumps({'op': 'max_id', 'value': self._max_numeric_id}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._journal_ops = 0
+
+    def _committed_end(self) -> int:
+        """
+        Vị trí (byte) cuối phần journal đã commit: dừng ở dòng ghi dở đầu tiên
+        (tiến trình chết giữa chừng); đợt begin..commit chưa có commit không được tính.
+        """
+        end = position = 0
+        in_batch = False
+        with open(self.journal_path, 'rb') as f:
+            for line in f:
+                position += len(line)
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    break
+                if op['op'] == 'begin':
+                    in_batch = True
+                elif op['op'] == 'commit':
+                    in_batch = False
+                    end = position
+                elif not in_batch:
+                    end = position
+        return end
+
+    def _load(self):
+        folder = os.path.dirname(self.snapshot_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        try:
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                rules = json.load(f)
+        except (OSError, ValueError):
+            rules = []
+        for rule in rules:
+            self._apply({'op': 'put', 'rule': rule})
+
+        needs_compact = not os.path.exists(self.snapshot_path)
+        journal_size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        if journal_size:
+            end = self._committed_end()
+            needs_compact = needs_compact or end < journal_size
+            with open(self.journal_path, 'rb') as f:
+                position = 0
+                for line in f:
+                    position += len(line)
+                    if position > end:
+                        break
+                    op = json.loads(line)
+                    if op['op'] not in _BATCH_MARKERS:
+                        self._apply(op)
+                        # Journal chỉ có dòng max_id (vừa compact xong) thì không cần compact lại
+                        needs_compact = needs_compact or op['op'] != 'max_id'
+
+        # Gộp journal cũ vào snapshot ngay, để dòng ghi dở (nếu có) không dính vào thao tác mới
+        if needs_compact:
+            self._compact_locked()
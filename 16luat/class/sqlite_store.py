@@ -0,0 +1,288 @@
+# sqlite_store.py
+# Kho luật SQLite (chỉ dùng sqlite3 của thư viện chuẩn), chọn bằng RULE_STORE=sqlite
+
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from inference import _normalize_left
+from rule_store import normalize_id, rule_hash
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rules (
+    seq        INTEGER PRIMARY KEY AUTOINCREMENT,  -- thứ tự luật như trong rules.json
+    id         TEXT NOT NULL UNIQUE,
+    conclusion TEXT NOT NULL,
+    body       TEXT NOT NULL,                      -- luật gốc dạng JSON
+    hash       TEXT                                -- rule_hash(body), tính lúc ghi (upload tăng dần)
+);
+CREATE INDEX IF NOT EXISTS idx_rules_conclusion ON rules(conclusion);
+
+CREATE TABLE IF NOT EXISTS premises (
+    fact     TEXT NOT NULL,
+    rule_seq INTEGER NOT NULL REFERENCES rules(seq) ON DELETE CASCADE,
+    PRIMARY KEY (fact, rule_seq)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_premises_rule ON premises(rule_seq);
+
+CREATE TABLE IF NOT EXISTS store_meta (
+    key   TEXT PRIMARY KEY,
+    value INTEGER NOT NULL                         -- max_numeric_id: ID số lớn nhất từng có (next_id)
+);
+"""
+
+
+class SQLiteRuleStore:
+    """
+    Cùng giao diện với JournaledRuleStore (all/get/add/update/delete/replace_all,
+    version, token) để main.py dùng thay thế trực tiếp.
+
+    Tiền đề và kết luận được chuẩn hóa vào bảng có chỉ mục, nên "luật kết luận X"
+    (rules_concluding) và "luật dùng fact Y" (rules_using) là tra chỉ mục, và
+    relevant_rules(goals) lấy đúng tập luật có thể góp phần chứng minh goals
+    bằng một truy vấn đệ quy (WITH RECURSIVE).
+
+    rules.json vẫn là định dạng nhập/xuất: CSDL rỗng lúc khởi động sẽ được
+    nạp từ json_path nếu file đó tồn tại.
+    """
+
+    def __init__(self, db_path: str, json_path: Optional[str] = None):
+        self.db_path = db_path
+        self.token = uuid.uuid4().hex
+        self.version = 0
+        self._lock = threading.Lock()
+        folder = os.path.dirname(db_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        # So khớp chuỗi con không phân biệt hoa thường cho cả ký tự Unicode (LIKE chỉ hỗ trợ ASCII),
+        # giống hệt make_rule_filter của kho JSON
+        self._conn.create_function('contains_ci', 2, lambda text, q: q in (text or '').casefold(),
+                                   deterministic=True)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA foreign_keys=ON')
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        if json_path and len(self) == 0 and os.path.exists(json_path):
+            self.import_json(json_path)
+
+    def _migrate(self):
+        # CSDL tạo trước khi có store_meta: lấy ID số lớn nhất hiện có làm mốc
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO store_meta (key, value) "
+                "SELECT 'max_numeric_id', COALESCE(MAX(CAST(id AS INTEGER)), 0) FROM rules "
+                "WHERE id NOT GLOB '*[^0-9]*' AND id != ''")
+        # CSDL tạo trước khi có cột hash: thêm cột và tính hash cho các luật sẵn có
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(rules)')}
+        if 'hash' in columns:
+            return
+        with self._conn:
+            self._conn.execute('ALTER TABLE rules ADD COLUMN hash TEXT')
+            rows = self._conn.execute('SELECT seq, body FROM rules').fetchall()
+            self._conn.executemany('UPDATE rules SET hash = ? WHERE seq = ?',
+                                   [(rule_hash(json.loads(body)), seq) for seq, body in rows])
+
+    # === ĐỌC ===
+
+    def _query_bodies(self, sql: str, params: Iterable = ()) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(sql, tuple(params)).fetchall()
+        return [json.loads(body) for (body,) in rows]
+
+    def all(self) -> List[Dict]:
+        return self._query_bodies('SELECT body FROM rules ORDER BY seq')
+
+    def get(self, rule_id) -> Optional[Dict]:
+        rows = self._query_bodies('SELECT body FROM rules WHERE id = ?', (normalize_id(rule_id),))
+        return rows[0] if rows else None
+
+    def __contains__(self, rule_id) -> bool:
+        return self.get(rule_id) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM rules').fetchone()[0]
+
+    def next_id(self) -> str:
+        """ID số kế tiếp (lớn hơn mọi ID số đã từng có, kể cả luật đã xóa - như JournaledRuleStore)"""
+        with self._lock:
+            return self._next_id_locked()
+
+    def _next_id_locked(self) -> str:
+        row = self._conn.execute("SELECT value FROM store_meta WHERE key = 'max_numeric_id'").fetchone()
+        return str((row[0] if row else 0) + 1)
+
+    def hashes(self) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._conn.execute('SELECT id, hash FROM rules').fetchall())
+
+    def page(self, limit: int, cursor: Optional[int] = None, q_premise: Optional[str] = None,
+             q_conclusion: Optional[str] = None, id_min: Optional[int] = None,
+             id_max: Optional[int] = None) -> Tuple[List[Dict], Optional[int], int]:
+        """Phân trang theo con trỏ seq (keyset), cùng ngữ nghĩa với JournaledRuleStore.page"""
+        where, params = [], []
+        if q_conclusion:
+            where.append('contains_ci(conclusion, ?)')
+            params.append(q_conclusion.casefold())
+        if q_premise:
+            where.append('EXISTS (SELECT 1 FROM premises p WHERE p.rule_seq = rules.seq AND contains_ci(p.fact, ?))')
+            params.append(q_premise.casefold())
+        if id_min is not None or id_max is not None:
+            where.append("TRIM(id) != '' AND TRIM(id) NOT GLOB '*[^0-9]*'")
+        if id_min is not None:
+            where.append('CAST(TRIM(id) AS INTEGER) >= ?')
+            params.append(id_min)
+        if id_max is not None:
+            where.append('CAST(TRIM(id) AS INTEGER) <= ?')
+            params.append(id_max)
+        condition = ' AND '.join(where) or '1'
+
+        with self._lock:
+            total = self._conn.execute(f'SELECT COUNT(*) FROM rules WHERE {condition}', params).fetchone()[0]
+            rows = self._conn.execute(
+                f'SELECT seq, body FROM rules WHERE {condition} AND seq > ? ORDER BY seq LIMIT ?',
+                params + [cursor or 0, limit + 1]).fetchall()
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [json.loads(body) for _, body in rows[:limit]], next_cursor, total
+
+    def rules_concluding(self, fact: str) -> List[Dict]:
+        """Các luật có kết luận là fact (tra chỉ mục idx_rules_conclusion)"""
+        return self._query_bodies('SELECT body FROM rules WHERE conclusion = ? ORDER BY seq', (fact,))
+
+    def rules_using(self, fact: str) -> List[Dict]:
+        """Các luật có fact trong vế trái (tra khóa chính của bảng premises)"""
+        return self._query_bodies(
+            'SELECT r.body FROM premises p JOIN rules r ON r.seq = p.rule_seq '
+            'WHERE p.fact = ? ORDER BY r.seq', (fact,))
+
+    def relevant_rules(self, goals: List[str]) -> List[Dict]:
+        """
+        Tập luật liên quan tới goals: đi ngược từ goals qua kết luận -> tiền đề.
+        UNION (không phải UNION ALL) loại fact trùng nên truy vấn dừng cả khi luật có chu trình.
+        """
+        goals = [str(g).strip() for g in goals if str(g).strip()]
+        if not goals:
+            return []
+        seeds = ', '.join('(?)' for _ in goals)
+        sql = f"""
+            WITH RECURSIVE need(fact) AS (
+                VALUES {seeds}
+                UNION
+                SELECT p.fact FROM need
+                JOIN rules r ON r.conclusion = need.fact
+                JOIN premises p ON p.rule_seq = r.seq
+            )
+            SELECT body FROM rules WHERE conclusion IN (SELECT fact FROM need) ORDER BY seq
+        """
+        return self._query_bodies(sql, goals)
+
+    # === GHI ===
+
+    def _insert(self, rule: Dict):
+        cur = self._conn.execute(
+            'INSERT INTO rules (id, conclusion, body, hash) VALUES (?, ?, ?, ?)',
+            (normalize_id(rule.get('id', '')), str(rule.get('vePhai', '')).strip(), json.dumps(rule, ensure_ascii=False),
+             rule_hash(rule)))
+        self._insert_premises(cur.lastrowid, rule)
+        self._note_id(rule)
+
+    def _rewrite(self, seq: int, rule: Dict):
+        self._conn.execute('UPDATE rules SET conclusion = ?, body = ?, hash = ? WHERE seq = ?',
+                           (str(rule.get('vePhai', '')).strip(), json.dumps(rule, ensure_ascii=False),
+                            rule_hash(rule), seq))
+        self._conn.execute('DELETE FROM premises WHERE rule_seq = ?', (seq,))
+        self._insert_premises(seq, rule)
+
+    def _note_id(self, rule: Dict):
+        # Ghi nhận ID số lớn nhất từng có; không giảm khi xóa luật
+        rule_id = normalize_id(rule.get('id', ''))
+        if rule_id.isdigit():
+            self._conn.execute(
+                "INSERT INTO store_meta (key, value) VALUES ('max_numeric_id', ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)", (int(rule_id),))
+
+    def _insert_premises(self, seq: int, rule: Dict):
+        premises = set(_normalize_left(rule.get('veTrai', '')))
+        self._conn.executemany('INSERT INTO premises (fact, rule_seq) VALUES (?, ?)',
+                               [(fact, seq) for fact in premises])
+
+    def add(self, rule: Dict) -> Dict:
+        """Thêm luật; nếu thiếu ID hoặc ID đã tồn tại thì cấp ID số mới"""
+        with self._lock, self._conn:
+            rule_id = normalize_id(rule.get('id', ''))
+            exists = self._conn.execute('SELECT 1 FROM rules WHERE id = ?', (rule_id,)).fetchone()
+            if not rule_id or exists:
+                rule_id = self._next_id_locked()
+            if rule.get('id') != rule_id:
+                rule = dict(rule, id=rule_id)
+            self._insert(rule)
+            self.version += 1
+        return rule
+
+    def update(self, rule: Dict) -> bool:
+        """Cập nhật luật theo ID (giữ nguyên vị trí); False nếu không có luật đó"""
+        with self._lock, self._conn:
+            rule_id = normalize_id(rule.get('id', ''))
+            row = self._conn.execute('SELECT seq FROM rules WHERE id = ?', (rule_id,)).fetchone()
+            if row is None:
+                return False
+            if rule.get('id') != rule_id:
+                rule = dict(rule, id=rule_id)
+            self._rewrite(row[0], rule)
+            self.version += 1
+        return True
+
+    def delete(self, rule_id) -> bool:
+        with self._lock, self._conn:
+            cur = self._conn.execute('DELETE FROM rules WHERE id = ?', (normalize_id(rule_id),))
+            if cur.rowcount == 0:
+                return False
+            self.version += 1
+        return True
+
+    def apply_patch(self, upserts: Iterable[Dict], deletes: List) -> int:
+        """Thêm/ghi đè `upserts`, xóa `deletes` trong một transaction; trả về số thao tác đã áp dụng"""
+        applied = 0
+        with self._lock, self._conn:
+            for rule in upserts:
+                row = self._conn.execute('SELECT seq FROM rules WHERE id = ?', (normalize_id(rule.get('id', '')),)).fetchone()
+                if row is not None:
+                    self._rewrite(row[0], rule)
+                else:
+                    self._insert(rule)
+                applied += 1
+            for rule_id in deletes:
+                applied += self._conn.execute('DELETE FROM rules WHERE id = ?', (normalize_id(rule_id),)).rowcount
+            if applied:
+                self.version += 1
+        return applied
+
+    def replace_all(self, rules: List[Dict]):
+        """Thay toàn bộ tập luật trong một transaction (ID trùng: luật sau ghi đè luật trước, giữ vị trí)"""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM premises')
+            self._conn.execute('DELETE FROM rules')
+            for rule in rules:
+                row = self._conn.execute('SELECT seq FROM rules WHERE id = ?', (normalize_id(rule.get('id', '')),)).fetchone()
+                if row is not None:
+                    self._rewrite(row[0], rule)
+                else:
+                    self._insert(rule)
+            self.version += 1
+
+    # === NHẬP/XUẤT JSON ===
+
+    def import_json(self, path: str):
+        with open(path, 'r', encoding='utf-8') as f:
+            self.replace_all(json.load(f))
+
+    def export_json(self, path: str):
+        """Ghi toàn bộ luật ra file JSON (file tạm + os.replace)"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.all(), f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, path)
@@ -0,0 +1,163 @@
+# So sánh bộ suy diễn lùi có bảng nhớ với bản DFS đệ quy trước đây
+import random
+
+from backward_inference import _backward_chain_get_vet, _parse_rules, backward_inference_detailed
+
+
+def _old_backward_chain(goals, known, rules_dict, vet_full, used_rule_id, reopened, proven=frozenset(),
+                        max_depth=50):
+    """
+    Bản DFS cũ (giữ nguyên cách chọn luật); thêm `proven` để phát hiện một fact đã
+    chứng minh bị đưa lại vào tập goal - trường hợp bản cũ phải chứng minh lại
+    bằng luật khác nên cho kết quả khác (hoặc thất bại).
+    """
+    if goals.issubset(known):
+        return True
+    if max_depth <= 0:
+        return False
+    fact_to_prove = min(g for g in goals if g not in known)
+    applicable_rules = [(rule_id, len(rule['premise']))
+                        for rule_id, rule in rules_dict.items()
+                        if rule['conclusion'] == fact_to_prove and rule_id not in used_rule_id]
+    applicable_rules.sort(key=lambda x: (x[1], int(x[0])))
+    for rule_id, _ in applicable_rules:
+        new_goals = set(goals)
+        new_goals.discard(fact_to_prove)
+        for p in rules_dict[rule_id]['premise']:
+            if p not in known:
+                if p in proven:
+                    reopened.append(p)
+                new_goals.add(p)
+        vet_full.append(rule_id)
+        used_rule_id.add(rule_id)
+        if _old_backward_chain(new_goals, known, rules_dict, vet_full, used_rule_id, reopened,
+                               proven | {fact_to_prove}, max_depth - 1):
+            return True
+        vet_full.pop()
+        used_rule_id.remove(rule_id)
+    return False
+
+
+def _old_vet(goals, known, rules_dict):
+    vet, reopened = [], []
+    success = _old_backward_chain(set(goals), set(known), rules_dict, vet, set(), reopened)
+    return success, vet, bool(reopened)
+
+
+def _random_acyclic_rules(rng, fact_count=14, rule_count=22):
+    # Tiền đề của luật kết luận f{i} chỉ lấy từ f{j}, j > i: không có chu trình
+    rules = []
+    for rule_id in range(1, rule_count + 1):
+        i = rng.randrange(fact_count - 1)
+        premise = rng.sample(range(i + 1, fact_count), min(rng.randint(1, 3), fact_count - i - 1))
+        rules.append({'id': str(rule_id), 'veTrai': ' ∧ '.join(f'f{j}' for j in premise), 'vePhai': f'f{i}'})
+    return rules
+
+
+def _is_proof(vet, goals, known, rules_dict):
+    # Mọi luật trong VET phải áp dụng được theo một thứ tự nào đó (không có chu trình)
+    facts, pending = set(known), list(vet)
+    while pending:
+        ready = [r for r in pending if set(rules_dict[r]['premise']) <= facts]
+        if not ready:
+            return False
+        for rule_id in ready:
+            facts.add(rules_dict[rule_id]['conclusion'])
+            pending.remove(rule_id)
+    return set(goals) <= facts
+
+
+def test_higher_priority_rule_proven_later():
+    rules = [
+        {'id': '1', 'veTrai': 'X', 'vePhai': 'G'},
+        {'id': '2', 'veTrai': 'a', 'vePhai': 'G'},
+        {'id': '3', 'veTrai': 'a', 'vePhai': 'Y'},
+        {'id': '4', 'veTrai': 'Y', 'vePhai': 'X'},
+    ]
+    rules_dict = _parse_rules(rules)
+    assert _backward_chain_get_vet({'G'}, {'a'}, rules_dict) == (True, ['1', '4', '3'])
+    assert _old_vet({'G'}, {'a'}, rules_dict)[:2] == (True, ['1', '4', '3'])
+    success, _, vet_full, _, _, _ = backward_inference_detailed(['a'], ['G'], rules)
+    assert success and vet_full == ['1', '4', '3']
+
+
+def test_matches_old_chainer_on_acyclic_bases():
+    rng = random.Random(2024)
+    compared = 0
+    for _ in range(3000):
+        rules_dict = _parse_rules(_random_acyclic_rules(rng))
+        known = {f'f{j}' for j in range(9, 14) if rng.random() < 0.6}
+        goals = {f'f{rng.randrange(6)}' for _ in range(rng.randint(1, 2))}
+        old_success, old_vet, reopened = _old_vet(goals, known, rules_dict)
+        success, vet = _backward_chain_get_vet(goals, known, rules_dict)
+        if not reopened:
+            assert (success, vet) == (old_success, old_vet)
+            compared += 1
+        elif old_success:
+            # Bản cũ thành công bằng cách chứng minh lại: bản mới cũng phải thành công
+            assert success
+    assert compared > 1000
+
+
+def test_cyclic_rules_give_acyclic_proof():
+    rng = random.Random(7)
+    for _ in range(2000):
+        rules = []
+        for rule_id in range(1, 19):
+            premise = rng.sample(range(12), rng.randint(1, 2))
+            rules.append({'id': str(rule_id), 'veTrai': ' ∧ '.join(f'f{j}' for j in premise),
+                          'vePhai': f'f{rng.randrange(12)}'})
+        rules_dict = _parse_rules(rules)
+        known = {f'f{j}' for j in range(12) if rng.random() < 0.25}
+        goals = {f'f{rng.randrange(12)}'}
+        success, vet = _backward_chain_get_vet(goals, known, rules_dict)
+        if success:
+            assert _is_proof(vet, goals, known, rules_dict)
+        old_success, _, _ = _old_vet(goals, known, rules_dict)
+        if old_success:
+            assert success
+
+
+def _assert_replays(vet_optimal, known, goals, rules_dict):
+    # Áp dụng VET tối ưu theo đúng thứ tự: mỗi tiền đề phải đã biết trước bước đó
+    facts = set(known)
+    for rule_id in vet_optimal:
+        assert set(rules_dict[rule_id]['premise']) <= facts, (rule_id, vet_optimal)
+        facts.add(rules_dict[rule_id]['conclusion'])
+    assert set(goals) <= facts
+
+
+def test_shared_premise_derived_before_use():
+    rules = [
+        {'id': '2', 'veTrai': 'g', 'vePhai': 'h'},
+        {'id': '11', 'veTrai': 'b ∧ g ∧ h', 'vePhai': 'd'},
+        {'id': '12', 'veTrai': 'e', 'vePhai': 'g'},
+    ]
+    success, _, _, vet_optimal, _, _ = backward_inference_detailed(['e', 'b'], ['d'], rules)
+    assert success and vet_optimal == ['12', '2', '11']
+    _assert_replays(vet_optimal, {'e', 'b'}, {'d'}, _parse_rules(rules))
+
+
+def test_optimal_vet_replays_from_gt():
+    rng = random.Random(11)
+    checked = 0
+    for _ in range(2400):
+        cyclic = rng.random() < 0.5
+        rules = _random_acyclic_rules(rng)
+        if cyclic:
+            for rule in rules[::3]:
+                rule['vePhai'] = f'f{rng.randrange(14)}'
+        rules_dict = _parse_rules(rules)
+        known = {f'f{j}' for j in range(9, 14) if rng.random() < 0.6}
+        goals = [f'f{rng.randrange(6)}' for _ in range(rng.randint(1, 2))]
+        success, _, _, vet_optimal, _, _ = backward_inference_detailed(sorted(known), goals, rules)
+        if success:
+            _assert_replays(vet_optimal, known, goals, rules_dict)
+            checked += 1
+    assert checked > 500
+
+
+def test_long_chain_without_recursion_limit():
+    rules = [{'id': str(i), 'veTrai': f'f{i - 1}', 'vePhai': f'f{i}'} for i in range(1, 5001)]
+    success, vet = _backward_chain_get_vet({'f5000'}, {'f0'}, _parse_rules(rules))
+    assert success and len(vet) == 5000
@@ -0,0 +1,73 @@
+# So sánh suy diễn tiến dùng agenda kiểu đếm với vòng lặp quét toàn bộ luật trước đây
+import random
+
+from inference import _parse_rules, forward_inference_detailed
+
+
+def _old_forward_chain(initial_facts, goals, rules_dict):
+    """
+    Vòng lặp cũ: mỗi bước sắp xếp lại các luật còn lại và áp dụng luật đầu tiên có đủ
+    tiền đề và kết luận chưa thuộc THOA (bỏ giới hạn MAX_STEPS=100 như bản hiện tại).
+    Trả về (success, VET, các dòng bảng quá trình).
+    """
+    THOA, TG, R = set(initial_facts), set(goals), set(rules_dict)
+    VET, rows = [], [{'step': 0, 'rule': '-', 'THOA': sorted(THOA), 'TG': sorted(TG), 'R': sorted(R), 'VET': []}]
+    step = 1
+    while True:
+        if TG.issubset(THOA):
+            rows.append({'step': step, 'rule': 'DONE', 'THOA': sorted(THOA), 'TG': sorted(TG), 'R': sorted(R),
+                         'VET': VET.copy()})
+            return True, VET, rows
+        applied = None
+        for rule_id in sorted(R, key=lambda x: (len(rules_dict[x]['premise']), int(x))):
+            rule = rules_dict[rule_id]
+            if set(rule['premise']).issubset(THOA) and rule['conclusion'] not in THOA:
+                applied = rule_id
+                break
+        if applied is None:
+            rows.append({'step': step, 'rule': 'FAIL', 'THOA': sorted(THOA), 'TG': sorted(TG), 'R': sorted(R),
+                         'VET': VET.copy()})
+            return False, VET, rows
+        THOA.add(rules_dict[applied]['conclusion'])
+        R.discard(applied)
+        VET.append(applied)
+        rows.append({'step': step, 'rule': f'r{applied}', 'THOA': sorted(THOA), 'TG': sorted(TG), 'R': sorted(R),
+                     'VET': VET.copy()})
+        step += 1
+
+
+def _random_rules(rng, fact_count=15, rule_count=30):
+    rules = []
+    for rule_id in range(1, rule_count + 1):
+        premise = rng.sample(range(fact_count), rng.randint(1, 3))
+        rules.append({'id': str(rule_id), 'veTrai': ' ∧ '.join(f'f{j}' for j in premise),
+                      'vePhai': f'f{rng.randrange(fact_count)}'})
+    return rules
+
+
+def test_matches_old_forward_chain():
+    rng = random.Random(11)
+    successes = 0
+    for _ in range(1500):
+        rules = _random_rules(rng)
+        rules_dict = _parse_rules(rules)
+        initial_facts = [f'f{j}' for j in rng.sample(range(15), rng.randint(1, 4))]
+        goals = [f'f{rng.randrange(15)}']
+        old_success, old_vet, old_rows = _old_forward_chain(initial_facts, goals, rules_dict)
+        success, process_table, full_vet, _, _, _ = forward_inference_detailed(initial_facts, goals, rules)
+        assert (success, full_vet) == (old_success, old_vet)
+        keys = ('step', 'rule', 'THOA', 'TG', 'R', 'VET')
+        assert [{k: row[k] for k in keys} for row in process_table] == old_rows
+        successes += success
+    assert 100 < successes < 1400
+
+
+def test_compact_trace_has_same_vet():
+    rng = random.Random(3)
+    for _ in range(300):
+        rules = _random_rules(rng)
+        initial_facts = [f'f{j}' for j in rng.sample(range(15), 3)]
+        goals = [f'f{rng.randrange(15)}']
+        full = forward_inference_detailed(initial_facts, goals, rules)
+        compact = forward_inference_detailed(initial_facts, goals, rules, trace_mode='compact')
+        assert full[0] == compact[0] and full[2:4] == compact[2:4]
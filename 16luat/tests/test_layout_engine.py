@@ -0,0 +1,67 @@
+# Tầng của layout phân tầng phải giống cách gán tầng lặp 100 lượt trước đây (trên DAG)
+import random
+
+import numpy as np
+
+from fpg import FPG
+from layout_engine import layered_layout, longest_path_levels, node_levels
+
+
+def _old_levels(fpg):
+    """Cách gán tầng cũ của FPG._get_improved_hierarchical_layout"""
+    levels = {fact: 0 for fact in fpg.facts - fpg.conclusions}
+    for _ in range(100):
+        changed = False
+        for rule in fpg.rules:
+            ant_levels = [levels[ant] for ant in rule['antecedents'] if ant in levels]
+            if ant_levels:
+                new_level = max(ant_levels) + 1
+                if levels.get(rule['consequent'], -1) < new_level:
+                    levels[rule['consequent']] = new_level
+                    changed = True
+        if not changed:
+            break
+    return levels
+
+
+def _random_dag_fpg(rng, fact_count=40, rule_count=60):
+    # Tiền đề của luật kết luận f{i} chỉ lấy từ f{j}, j < i
+    rules = []
+    for rule_id in range(1, rule_count + 1):
+        i = rng.randrange(1, fact_count)
+        premise = rng.sample(range(i), min(i, rng.randint(1, 3)))
+        rules.append({'id': str(rule_id), 'veTrai': ' ∧ '.join(f'f{j}' for j in premise), 'vePhai': f'f{i}'})
+    fpg = FPG()
+    fpg.load_from_data(rules)
+    fpg.build_graph()
+    return fpg
+
+
+def test_levels_match_old_assignment_on_dags():
+    rng = random.Random(24)
+    for _ in range(300):
+        fpg = _random_dag_fpg(rng)
+        assert node_levels(list(fpg.graph.nodes()), fpg.graph.edges()) == _old_levels(fpg)
+
+
+def test_layered_layout_places_every_node_left_to_right():
+    rng = random.Random(5)
+    for _ in range(100):
+        fpg = _random_dag_fpg(rng)
+        pos = layered_layout(fpg.graph.nodes(), fpg.graph.edges())
+        assert set(pos) == set(fpg.graph.nodes())
+        assert all(pos[u][0] < pos[v][0] for u, v in fpg.graph.edges())
+        # Không có hai node trùng vị trí
+        assert len(set(pos.values())) == len(pos)
+
+
+def test_cycles_are_broken():
+    rng = random.Random(9)
+    for _ in range(200):
+        n = 30
+        edges = [(rng.randrange(n), rng.randrange(n)) for _ in range(60)]
+        src, dst = (np.array(side, dtype=np.int64) for side in zip(*[(u, v) for u, v in edges if u != v]))
+        levels = longest_path_levels(n, src, dst)
+        assert len(levels) == n and levels.min() >= 0
+        pos = layered_layout(range(n), edges)
+        assert set(pos) == set(range(n))
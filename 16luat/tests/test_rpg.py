@@ -0,0 +1,27 @@
+# Cạnh RPG dựng bằng chỉ mục sự kiện -> luật phải giống hệt cách so từng cặp luật trước đây
+import random
+
+from benchmark_rpg import build_graph_pairwise, load, make_synthetic_rules
+
+
+def _assert_same_graph(rules):
+    rpg = load(rules)
+    rpg.build_graph()
+    reference = build_graph_pairwise(rpg)
+    assert list(rpg.graph.nodes(data=True)) == list(reference.nodes(data=True))
+    assert list(rpg.graph.edges()) == list(reference.edges())
+
+
+def test_synthetic_base_matches_pairwise():
+    _assert_same_graph(make_synthetic_rules(1500, seed=5))
+
+
+def test_random_bases_match_pairwise():
+    # Tiền đề lặp lại, luật tự trỏ về chính nó và kết luận trùng nhau
+    rng = random.Random(21)
+    for _ in range(200):
+        rules = []
+        for rule_id in range(1, 41):
+            premise = [f'f{rng.randrange(12)}' for _ in range(rng.randint(1, 4))]
+            rules.append({'id': str(rule_id), 'veTrai': ' ∧ '.join(premise), 'vePhai': f'f{rng.randrange(12)}'})
+        _assert_same_graph(rules)
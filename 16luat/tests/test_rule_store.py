@@ -0,0 +1,70 @@
+# Journal của JournaledRuleStore: đợt apply_patch là một giao dịch begin..commit
+from rule_store import JournaledRuleStore
+from sqlite_store import SQLiteRuleStore
+
+
+def _rule(rule_id):
+    return {'id': str(rule_id), 'veTrai': 'a', 'vePhai': f'b{rule_id}', 'note': ''}
+
+
+def test_patch_streams_and_survives_reload(tmp_path):
+    path = str(tmp_path / 'rules.json')
+    store = JournaledRuleStore(path, compact_every=10 ** 9)
+    store.add(_rule(1))
+    applied = store.apply_patch((_rule(i) for i in range(2, 1002)), ['1', 'missing'])
+    assert applied == 1001 and len(store) == 1000 and '1' not in store
+    assert [r['id'] for r in JournaledRuleStore(path).all()] == [str(i) for i in range(2, 1002)]
+
+
+def test_failed_patch_leaves_store_unchanged(tmp_path):
+    path = str(tmp_path / 'rules.json')
+    store = JournaledRuleStore(path, compact_every=10 ** 9)
+    store.add(_rule(1))
+    version = store.version
+
+    def broken():
+        yield _rule(2)
+        raise RuntimeError('file hỏng giữa chừng')
+    try:
+        store.apply_patch(broken(), ['1'])
+    except RuntimeError:
+        pass
+    assert store.version == version and store.all() == [_rule(1)]
+    store.add(_rule(3))
+    assert [r['id'] for r in JournaledRuleStore(path).all()] == ['1', '3']
+
+
+def test_uncommitted_batch_dropped_on_replay(tmp_path):
+    path = str(tmp_path / 'rules.json')
+    store = JournaledRuleStore(path, compact_every=10 ** 9)
+    store.add(_rule(1))
+    # Tiến trình chết sau khi ghi một phần đợt: chưa có dòng commit
+    with open(store.journal_path, 'ab') as f:
+        f.write(b'{"op": "begin"}\n{"op": "delete", "id": "1"}\n{"op": "put", "rule": {"id": "2", "veT')
+    assert JournaledRuleStore(path).all() == [_rule(1)]
+
+
+def test_ids_normalized_on_every_lookup(tmp_path):
+    stores = [JournaledRuleStore(str(tmp_path / 'rules.json')), SQLiteRuleStore(str(tmp_path / 'rules.db'))]
+    for store in stores:
+        assert store.add({'id': ' 8 ', 'veTrai': 'a', 'vePhai': 'b'})['id'] == '8'
+        assert store.update({'id': ' 8 ', 'veTrai': 'a', 'vePhai': 'c'})
+        assert store.get(' 8 ')['vePhai'] == 'c' and ' 8' in store
+        assert store.delete(' 8 ') and len(store) == 0
+
+
+def test_next_id_never_reuses_deleted_ids(tmp_path):
+    def open_stores():
+        return [JournaledRuleStore(str(tmp_path / 'rules.json'), compact_every=3),
+                SQLiteRuleStore(str(tmp_path / 'rules.db'))]
+    for store in open_stores():
+        for _ in range(5):
+            store.add({'id': '', 'veTrai': 'a', 'vePhai': 'b'})
+        store.delete('5')
+        store.delete('4')
+        assert store.next_id() == '6'
+    # Sau khi khởi động lại (kho JSON đã compact) vẫn không cấp lại 4, 5
+    assert [store.next_id() for store in open_stores()] == ['6', '6']
+    for store in open_stores():
+        store.replace_all([{'id': '1', 'veTrai': 'a', 'vePhai': 'b'}])
+        assert store.next_id() == '6'
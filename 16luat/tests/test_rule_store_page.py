@@ -0,0 +1,37 @@
+# Phân trang keyset của JournaledRuleStore so với duyệt tuần tự toàn bộ luật
+import random
+
+from rule_store import JournaledRuleStore, make_rule_filter
+
+
+def _scan_page(store, limit, cursor, **filters):
+    match = make_rule_filter(**filters)
+    rules = [(store._seq[r['id']], r) for r in store.all() if match is None or match(r)]
+    after = [(seq, r) for seq, r in rules if cursor is None or seq > cursor]
+    next_cursor = after[limit - 1][0] if len(after) > limit else None
+    return [r for _, r in after[:limit]], next_cursor, len(rules)
+
+
+def test_page_matches_full_scan_after_edits(tmp_path):
+    rng = random.Random(5)
+    store = JournaledRuleStore(str(tmp_path / 'rules.json'), compact_every=50)
+    for i in range(1, 301):
+        store.add({'id': str(i), 'veTrai': f'a{i % 7}', 'vePhai': f'b{i % 5}'})
+    for i in rng.sample(range(1, 301), 120):
+        store.delete(str(i))
+    store.update({'id': '7', 'veTrai': 'a1', 'vePhai': 'b9'})
+    for _ in range(30):
+        store.add({'id': '', 'veTrai': 'a3', 'vePhai': 'b2'})
+    store = JournaledRuleStore(store.snapshot_path)  # cả đường phát lại journal
+
+    for filters in ({}, {'q_conclusion': 'b2'}, {'q_premise': 'A1', 'id_max': 200}):
+        for limit in (1, 7, 500):
+            cursor, seen = None, []
+            while True:
+                page, next_cursor, total = store.page(limit, cursor, **filters)
+                assert (page, next_cursor, total) == _scan_page(store, limit, cursor, **filters)
+                seen += page
+                if next_cursor is None:
+                    break
+                cursor = next_cursor
+            assert len(seen) == total
@@ -1,23 +1,26 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context
 from flask_cors import CORS
-import pandas as pd
 import os
-import re  # <--- [MỚI] Import thư viện regex
-from collections import Counter
+import logging
+import threading
+import time
 from inference import forward_inference_detailed_rasff
+from rule_set import RuleSet
+from rule_snapshot import load_snapshot, save_snapshot
+from rasff_loader import CASCADING_FIELDS, read_rules_from_file
+from trace_log import InferenceTrace
 
 app = Flask(__name__)
 CORS(app)
+logger = logging.getLogger('rasff')
 
 # === CẤU HÌNH ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 EXCEL_FILE = 'RASFF_Final_Complete.xlsx'
 FILE_PATH = os.path.join(BASE_DIR, EXCEL_FILE)
-
-CASCADING_FIELDS = ['NOT_COUNTRY', 'TYPE', 'PROD_CAT', 'PRODUCT', 'HAZARDS_CAT', 'HAZARDS']
-
-global_rules = []
-global_initial_values = {}
+SNAPSHOT_DIR = os.path.join(BASE_DIR, 'cache')  # Snapshot nhị phân của tập luật đã parse
+# Chu kỳ (giây) kiểm tra file luật thay đổi để tự nạp lại; 0 = tắt
+WATCH_INTERVAL = float(os.environ.get('RASFF_WATCH_INTERVAL', '0'))
 
 VN_TO_EN_COUNTRY_MAP = {
     'Việt Nam': 'Vietnam', 'Trung Quốc': 'China', 'Ấn Độ': 'India', 'Thái Lan': 'Thailand',
@@ -39,59 +42,19 @@ VN_TO_EN_COUNTRY_MAP = {
     'Úc': 'Australia', 'New Zealand': 'New Zealand'
 }
 
-def parse_ve_trai(ve_trai_str):
-    data = {}
-    if not isinstance(ve_trai_str, str) or not ve_trai_str:
-        return data
-    parts = ve_trai_str.split(',')
-    for part in parts:
-        if '=' in part:
-            key, val = part.split('=', 1)
-            key = key.strip().upper()
-            val = val.strip()
-            if key and val:  
-                data[key] = val
-    return data
-
-def find_action_column(columns):
-    if 'ACTION_TAKEN' in columns: return 'ACTION_TAKEN'
-    if 'ACTION' in columns: return 'ACTION'
-    for col in columns:
-        c_upper = str(col).upper()
-        if "ACTION" in c_upper or "TAKEN" in c_upper or "BIEN_PHAP" in c_upper or "XU_LY" in c_upper:
-            return col
-    return None
+def chuan_hoa_quoc_gia(name):
+    if not name: return None
+    name = str(name).strip()
+    if name in VN_TO_EN_COUNTRY_MAP: return VN_TO_EN_COUNTRY_MAP[name]
+    return VN_TO_EN_COUNTRY_MAP.get(name.title(), name)
 
-# === [MỚI] HÀM TÍNH TOÁN RISK TỪ NOTE ===
-def calculate_risk_from_note(note_text):
-    """
-    Phân tích cột Note để tính chỉ số % rủi ro nếu cột RISK bị thiếu.
-    """
-    if not isinstance(note_text, str):
-        return 0 # Mặc định
-
-    # 1. Ưu tiên tìm mẫu "(x/5)" (Ví dụ: (3/5) -> 60%)
-    match = re.search(r'\((\d+)/5\)', note_text)
-    if match:
-        score = int(match.group(1))
-        # Quy đổi: (Điểm / 5) * 100
-        return int((score / 5) * 100)
-
-    # 2. Nếu không có số sao, tìm theo từ khóa ngữ nghĩa
-    text_lower = note_text.lower()
-    if 'serious' in text_lower or 'nghiêm trọng' in text_lower or 'cao' in text_lower:
-        return 85
-    elif 'decision not yet taken' in text_lower or 'chưa quyết định' in text_lower or 'undecided' in text_lower:
-        return 50
-    elif 'thấp' in text_lower or 'low' in text_lower:
-        return 20
-    
-    return 0 # Không xác định
+# Tập luật đang phục vụ: chỉ được THAY bằng một phép gán, không sửa tại chỗ
+global_ruleset = RuleSet.empty(CASCADING_FIELDS, chuan_hoa_quoc_gia)
 
-def load_data_startup():
-    global global_rules, global_initial_values
-    print(f"\n⏳ [STARTUP] Đang đọc file dữ liệu...")
-    
+_reload_lock = threading.Lock()
+reload_status = {'running': False, 'last_error': None, 'last_reload': None}
+
+def resolve_data_path():
     actual_path = FILE_PATH
     if not os.path.exists(actual_path):
         csv_path = actual_path.replace('.xlsx', '.csv')
@@ -100,107 +63,96 @@ def load_data_startup():
         elif os.path.exists(extra_csv_path): actual_path = extra_csv_path
         else:
              print(f"❌ LỖI: Không tìm thấy file dữ liệu {EXCEL_FILE}.")
-             return
+             return None
+    return actual_path
 
-    try:
-        if actual_path.endswith('.csv'):
-            try:
-                df = pd.read_csv(actual_path, encoding='utf-8-sig')
-            except:
-                df = pd.read_csv(actual_path, encoding='latin-1')
-        else:
-            df = pd.read_excel(actual_path, engine='openpyxl')
-        
-        action_col_original = find_action_column(df.columns)
-        df.columns = [str(c).strip().upper() for c in df.columns]
-        df = df.fillna('')
-        
-        action_col_upper = str(action_col_original).strip().upper() if action_col_original else None
-        
-        if action_col_upper:
-            print(f"✅ Đã map cột Action: '{action_col_original}'")
-        else:
-            print("⚠️ CẢNH BÁO: Không tìm thấy cột Action!")
-
-        unique_values = {k: set() for k in CASCADING_FIELDS}
-        count = 0
+def build_ruleset(actual_path):
+    """Dựng một RuleSet mới hoàn chỉnh từ file luật (dùng snapshot nếu còn mới)"""
+    # Dùng snapshot nhị phân nếu file nguồn chưa đổi, không thì đọc lại và ghi snapshot mới
+    snapshot_path = os.path.join(SNAPSHOT_DIR, os.path.basename(actual_path) + '.snapshot.pkl')
+    snapshot = load_snapshot(snapshot_path, actual_path)
+    if snapshot:
+        rules, initial_values = snapshot['rules'], snapshot['initial_values']
+        print(f"⚡ Dùng snapshot: {snapshot_path}")
+    else:
+        rules, initial_values = read_rules_from_file(actual_path)
+        save_snapshot(snapshot_path, actual_path, {'rules': rules, 'initial_values': initial_values})
+    return RuleSet(rules, initial_values, CASCADING_FIELDS, chuan_hoa_quoc_gia, actual_path,
+                   previous=global_ruleset)
 
-        for idx, row in df.iterrows():
-            ve_phai = str(row.get('VE_PHAI') or row.get('THEN') or '').strip()
-            if not ve_phai: continue
-
-            raw_ve_trai = str(row.get('VE_TRAI', '')).strip()
-            combined_data = parse_ve_trai(raw_ve_trai)
-            dist_stat = combined_data.pop('DISTRIBUTION_STAT', 'Chưa có thông tin phân phối')
+def load_data_startup():
+    global global_ruleset
+    print(f"\n⏳ [STARTUP] Đang đọc file dữ liệu...")
 
-            if str(row.get('PRODUCT', '')).strip(): combined_data['PRODUCT'] = str(row.get('PRODUCT')).strip()
-            if str(row.get('NOT_COUNTRY', '')).strip(): combined_data['NOT_COUNTRY'] = str(row.get('NOT_COUNTRY')).strip()
-            
-            action_val = 'Chưa có thông tin'
-            if action_col_upper:
-                raw_val = row.get(action_col_upper)
-                if pd.notna(raw_val) and str(raw_val).strip() != '' and str(raw_val).lower() != 'nan':
-                    action_val = str(raw_val).strip()
-            
-            # === [MỚI] XỬ LÝ RISK PERCENTAGE TỰ ĐỘNG ===
-            # Lấy giá trị từ cột có sẵn
-            raw_risk = row.get('RISK_PERCENTAGE') or row.get('RISK')
-            risk_val = '0%'
-            
-            # Nếu có cột dữ liệu thì dùng
-            if pd.notna(raw_risk) and str(raw_risk).strip() != '' and str(raw_risk).strip() != '0%':
-                risk_val = str(raw_risk).strip()
-            else:
-                # Nếu không có, tự tính từ cột NOTE
-                note_content = str(row.get('NOTE') or '').strip()
-                calculated_risk = calculate_risk_from_note(note_content)
-                if calculated_risk > 0:
-                    risk_val = f"{calculated_risk}%"
-            # =============================================
-
-            filter_data = {}
-            conditions_display = []
-            has_valid_data = False
-
-            for field in CASCADING_FIELDS:
-                val = combined_data.get(field)
-                if val:
-                    filter_data[field] = val
-                    unique_values[field].add(val)
-                    conditions_display.append(f"{field}={val}")
-                    has_valid_data = True
-            
-            if has_valid_data:
-                rule_id = str(row.get('ID', idx + 1)).strip()
-                if rule_id.endswith('.0'): rule_id = rule_id[:-2]
-
-                global_rules.append({
-                    'id': rule_id, 
-                    'veTrai': ", ".join(conditions_display),
-                    'vePhai': ve_phai,
-                    'Note': str(row.get('NOTE') or 'N/A').strip(),
-                    'risk': risk_val, # Sử dụng giá trị đã xử lý ở trên
-                    'action_taken': action_val,
-                    'distribution': dist_stat,
-                    'filter_data': filter_data
-                })
-                count += 1
-
-        global_initial_values = {k: sorted(list(v)) for k, v in unique_values.items()}
-        print(f"✅ LOAD THÀNH CÔNG: {count} luật.")
+    actual_path = resolve_data_path()
+    if not actual_path:
+        return
 
+    try:
+        global_ruleset = build_ruleset(actual_path)
+        print(f"✅ LOAD THÀNH CÔNG: {len(global_ruleset.rules)} luật.")
     except Exception as e:
         print(f"❌ LỖI ĐỌC FILE: {e}")
         import traceback
         traceback.print_exc()
 
-load_data_startup()
+def reload_rules():
+    """
+    Dựng lại tập luật rồi hoán đổi nguyên khối. Request đang chạy vẫn dùng
+    bộ cũ cho tới khi phép gán global_ruleset hoàn tất.
+    Trả về False nếu đang có một lần nạp lại khác chạy.
+    """
+    global global_ruleset
+    if not _reload_lock.acquire(blocking=False):
+        return False
+    reload_status['running'] = True
+    try:
+        actual_path = resolve_data_path()
+        if not actual_path:
+            raise FileNotFoundError(EXCEL_FILE)
+        new_ruleset = build_ruleset(actual_path)
+        global_ruleset = new_ruleset
+        reload_status['last_error'] = None
+        print(f"🔄 Đã nạp lại: {len(new_ruleset.rules)} luật.")
+    except Exception as e:
+        reload_status['last_error'] = str(e)
+        print(f"❌ LỖI NẠP LẠI: {e}")
+    finally:
+        reload_status['running'] = False
+        reload_status['last_reload'] = time.time()
+        _reload_lock.release()
+    return True
 
-def chuan_hoa_quoc_gia(name):
-    if not name: return None
-    name = str(name).strip()
-    if name in VN_TO_EN_COUNTRY_MAP: return VN_TO_EN_COUNTRY_MAP[name]
-    return VN_TO_EN_COUNTRY_MAP.get(name.title(), name)
+def reload_rules_in_background():
+    if reload_status['running']:
+        return False
+    threading.Thread(target=reload_rules, name='rasff-reload', daemon=True).start()
+    return True
+
+def _watch_rule_file(interval):
+    """Luồng nền: nạp lại khi mtime/size của file luật thay đổi"""
+    def fingerprint():
+        path = resolve_data_path()
+        if not path: return None
+        st = os.stat(path)
+        return path, st.st_mtime_ns, st.st_size
+
+    last = fingerprint()
+    while True:
+        time.sleep(interval)
+        try:
+            current = fingerprint()
+        except OSError:
+            continue
+        if current and current != last:
+            last = current
+            reload_rules()
+
+def start_rule_file_watcher(interval=WATCH_INTERVAL):
+    if interval > 0:
+        threading.Thread(target=_watch_rule_file, args=(interval,), name='rasff-watch', daemon=True).start()
+
+load_data_startup()
 
 @app.route('/')
 def index():
@@ -208,103 +160,161 @@ def index():
 
 @app.route('/get_initial_data', methods=['GET'])
 def get_initial_data():
-    return jsonify({'success': True, 'values_by_key': global_initial_values})
+    return jsonify({'success': True, 'values_by_key': global_ruleset.initial_values})
 
 @app.route('/get_all_filtered_values', methods=['POST'])
 def get_all_filtered_values():
     try:
         data = request.get_json()
         selected_values = data.get('selectedValues', {})
-        available = {field: set() for field in CASCADING_FIELDS}
-        
-        for rule in global_rules:
-            is_match = True
-            for key, val in selected_values.items():
-                if rule['filter_data'].get(key) != val:
-                    is_match = False
-                    break
-            if is_match:
-                for field in CASCADING_FIELDS:
-                    val = rule['filter_data'].get(field)
-                    if val: available[field].add(val)
+        counts = global_ruleset.facets.counts(selected_values)
         
-        final = {k: sorted(list(v)) for k, v in available.items()}
-        return jsonify({'success': True, 'availableValuesByField': final})
+        final = {k: list(v.keys()) for k, v in counts.items()}
+        return jsonify({'success': True, 'availableValuesByField': final, 'countsByField': counts})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
+def run_forward_inference(facts, ruleset, debug=False):
+    """Chạy suy diễn tiến trên một RuleSet và làm giàu kết quả (id, action, risk)"""
+    trace = InferenceTrace(logger, debug)
+    # 1. Chạy suy diễn
+    response_data = forward_inference_detailed_rasff(facts, ruleset.rules, ruleset.index)
+    
+    # 2. TÌM LẠI ID CỦA LUẬT GỐC và ACTION
+    if 'results' in response_data:
+        for item in response_data['results']:
+            # Tra theo rule_id do engine trả về (nhiều luật có thể trùng kết luận)
+            matched_rule = ruleset.rule_by_id.get(item.get('rule_id'))
+            
+            if matched_rule:
+                found_id = matched_rule['id']
+                found_action = matched_rule['action_taken']
+                
+                # Gán lại ID và Action vào kết quả trả về cho FE
+                item['id'] = found_id
+                item['action_taken'] = found_action
+                
+                # Nếu trong kết quả suy diễn chưa có risk (hoặc risk=0%), lấy lại risk từ luật gốc
+                if 'risk' not in item or item['risk'] == '0%':
+                     item['risk'] = matched_rule['risk']
+                
+                trace('rule_enriched', "Khôi phục ID: %s -> Action: %s -> Risk: %s",
+                      found_id, found_action, item['risk'],
+                      rule_id=found_id, action_taken=found_action, risk=item['risk'])
+            else:
+                item['action_taken'] = "Không tìm thấy thông tin (Lỗi khớp ID)"
+    return response_data
+
 @app.route('/forward_inference_rasff', methods=['POST'])
 def forward_inference_rasff():
     try:
         data = request.get_json()
         facts = data.get('initial_facts', [])
+        debug = bool(data.get('debug', False))  # Bật vết chi tiết cho riêng request này
+        ruleset = global_ruleset  # Giữ một tham chiếu cho cả request (an toàn khi đang nạp lại)
         
-        # 1. Chạy suy diễn
-        response_data = forward_inference_detailed_rasff(facts, global_rules)
-        
-        # 2. TÌM LẠI ID CỦA LUẬT GỐC và ACTION
-        if 'results' in response_data:
-            for item in response_data['results']:
-                conclusion_text = item.get('conclusion')
-                
-                matched_rule = next((r for r in global_rules if r['vePhai'] == conclusion_text), None)
-                
-                if matched_rule:
-                    found_id = matched_rule['id']
-                    found_action = matched_rule['action_taken']
-                    
-                    # Gán lại ID và Action vào kết quả trả về cho FE
-                    item['id'] = found_id
-                    item['action_taken'] = found_action
-                    
-                    # Nếu trong kết quả suy diễn chưa có risk (hoặc risk=0%), lấy lại risk từ global_rules
-                    if 'risk' not in item or item['risk'] == '0%':
-                         item['risk'] = matched_rule['risk']
-                    
-                    print(f"✅ Khôi phục ID: {found_id} -> Action: {found_action} -> Risk: {item['risk']}")
-                else:
-                    item['action_taken'] = "Không tìm thấy thông tin (Lỗi khớp ID)"
-                    
-        return jsonify(response_data)
+        return jsonify(run_forward_inference(facts, ruleset, debug))
     except Exception as e:
         print(f"Lỗi API Inference: {e}")
         return jsonify({'success': False, 'status': str(e)})
 
+def _first_invalid_batch_item(batch):
+    """Vị trí phần tử đầu tiên không phải danh sách chuỗi (initial_facts), hoặc None"""
+    for i, facts in enumerate(batch):
+        if not isinstance(facts, list) or not all(isinstance(f, str) for f in facts):
+            return i
+    return None
+
+@app.route('/forward_inference_rasff_batch', methods=['POST'])
+def forward_inference_rasff_batch():
+    """
+    Sàng lọc cả lô hàng trong một request.
+    Body: {"batch": [[fact, ...], ...], "stream": false, "debug": false}
+    - mỗi phần tử của batch phải là danh sách chuỗi; nếu không trả về 400 kèm "index"
+      của phần tử sai đầu tiên (chưa suy diễn phần tử nào)
+    - stream=false: trả về {"results": [...]} đúng thứ tự đầu vào
+    - stream=true : trả về NDJSON, mỗi dòng một kết quả {"index": i, ...} ngay khi xong;
+      phần tử suy diễn lỗi cho dòng {"index": i, "error": ...} và lô vẫn chạy tiếp
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'status': 'Body phải là JSON object {"batch": [...]}'}), 400
+        batch = data.get('batch', [])
+        stream = bool(data.get('stream', False))
+        debug = bool(data.get('debug', False))
+        if not isinstance(batch, list):
+            return jsonify({'success': False, 'status': 'batch phải là danh sách các initial_facts'}), 400
+        bad_index = _first_invalid_batch_item(batch)
+        if bad_index is not None:
+            return jsonify({'success': False, 'index': bad_index,
+                            'status': f'batch[{bad_index}] phải là danh sách chuỗi (initial_facts)'}), 400
+        ruleset = global_ruleset  # Cả lô dùng chung một tập luật + chỉ mục
+
+        # Các bộ fact trùng nhau trong lô chỉ suy diễn một lần
+        memo = {}
+
+        def infer(facts):
+            key = tuple(facts)
+            if key not in memo:
+                memo[key] = run_forward_inference(facts, ruleset, debug)
+            return memo[key]
+
+        if stream:
+            def ndjson():
+                for i, facts in enumerate(batch):
+                    try:
+                        line = {'index': i, **infer(facts)}
+                    except Exception as e:
+                        # Response đã bắt đầu gửi: báo lỗi trên dòng của phần tử này thay vì cắt ngang stream
+                        logger.exception("Lỗi suy diễn phần tử %d của lô", i)
+                        line = {'index': i, 'error': str(e)}
+                    yield app.json.dumps(line) + '\n'
+            return Response(stream_with_context(ndjson()), mimetype='application/x-ndjson')
+
+        results = [infer(facts) for facts in batch]
+        return jsonify({'success': True, 'total': len(results), 'results': results})
+    except Exception as e:
+        print(f"Lỗi API Batch Inference: {e}")
+        return jsonify({'success': False, 'status': str(e)})
+
 @app.route('/get_dashboard_statistics', methods=['GET'])
 def get_dashboard_statistics():
     try:
-        countries = []
-        hazards = []
-        prod_cats = []
-        products = []
-        
-        for rule in global_rules:
-            fd = rule.get('filter_data', {})
-            raw_country = fd.get('NOT_COUNTRY')
-            if raw_country:
-                english_name = chuan_hoa_quoc_gia(raw_country)
-                if english_name: countries.append(english_name)
-                
-            if fd.get('HAZARDS_CAT'): hazards.append(fd.get('HAZARDS_CAT'))
-            if fd.get('PROD_CAT'): prod_cats.append(fd.get('PROD_CAT'))
-            if fd.get('PRODUCT'): products.append(fd.get('PRODUCT'))
-            
-        hazard_sorted = Counter(hazards).most_common(10)
-        prod_cat_sorted = Counter(prod_cats).most_common(10)
-        product_sorted = Counter(products).most_common(10)
-
-        return jsonify({
-            'success': True,
-            'total_rules': len(global_rules),
-            'stats': {
-                'country_counts': dict(Counter(countries).most_common()),
-                'hazard_stats': {'labels': [x[0] for x in hazard_sorted], 'values': [x[1] for x in hazard_sorted]},
-                'prod_cat_stats': {'labels': [x[0] for x in prod_cat_sorted], 'values': [x[1] for x in prod_cat_sorted]},
-                'top_products_list': [{'name': x[0], 'count': x[1]} for x in product_sorted]
-            }
-        })
+        # Thống kê đã tính sẵn khi nạp luật; trình duyệt poll lại sẽ nhận 304 nếu ETag khớp
+        body, etag, last_modified = global_ruleset.stats.snapshot()
+        response = app.response_class(body, mimetype='application/json')
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)})
 
+@app.route('/admin/reload_rules', methods=['POST'])
+def admin_reload_rules():
+    """Nạp lại file luật ở luồng nền, không chặn các request khác"""
+    started = reload_rules_in_background()
+    return jsonify({
+        'success': started,
+        'message': 'Đang nạp lại tập luật...' if started else 'Đang có một lần nạp lại khác chạy.'
+    }), 202 if started else 409
+
+@app.route('/admin/reload_status', methods=['GET'])
+def admin_reload_status():
+    return jsonify({
+        'success': True,
+        'total_rules': len(global_ruleset.rules),
+        'loaded_at': global_ruleset.loaded_at,
+        **reload_status
+    })
+
 if __name__ == '__main__':
-    app.run(host='127.0.0.1', port=5000, debug=True)
\ No newline at end of file
+    # Vết suy diễn (cờ debug của request) được ghi ở mức INFO
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(name)s] %(message)s')
+    use_reloader = True
+    # Với reloader, tiến trình cha chỉ theo dõi mã nguồn rồi chạy lại tiến trình con
+    # (WERKZEUG_RUN_MAIN=true) để phục vụ: chỉ con mới chạy luồng theo dõi file luật
+    if not use_reloader or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_rule_file_watcher()
+    app.run(host='127.0.0.1', port=5000, debug=True, use_reloader=use_reloader)
\ No newline at end of file
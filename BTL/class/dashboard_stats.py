@@ -0,0 +1,86 @@
+"""
+dashboard_stats.py - Thống kê Dashboard được tính sẵn khi nạp tập luật
+
+Các Counter được tính một lần khi nạp tập luật (rebuild), cùng lúc với nội dung
+JSON và ETag, nên các lần poll Dashboard không phải tính toán lại.
+Last-Modified là thời điểm ETag đổi lần cuối: nạp lại file luật mà thống kê không
+đổi thì giữ nguyên Last-Modified của bản trước.
+"""
+import hashlib
+import json
+from collections import Counter
+from datetime import datetime, timezone
+
+
+class DashboardStats:
+    def __init__(self, normalize_country=None):
+        """
+        Args:
+            normalize_country: hàm chuẩn hóa tên quốc gia (VD: chuan_hoa_quoc_gia)
+        """
+        self.normalize_country = normalize_country or (lambda name: name)
+        self._country_cache = {}
+        self.reset()
+
+    def reset(self):
+        self.total_rules = 0
+        self.countries = Counter()
+        self.hazards = Counter()
+        self.prod_cats = Counter()
+        self.products = Counter()
+        self._snapshot = None
+
+    def _add(self, rule):
+        fd = rule.get('filter_data', {})
+        raw_country = fd.get('NOT_COUNTRY')
+        if raw_country:
+            if raw_country not in self._country_cache:
+                self._country_cache[raw_country] = self.normalize_country(raw_country)
+            english_name = self._country_cache[raw_country]
+            if english_name: self.countries[english_name] += 1
+
+        if fd.get('HAZARDS_CAT'): self.hazards[fd.get('HAZARDS_CAT')] += 1
+        if fd.get('PROD_CAT'): self.prod_cats[fd.get('PROD_CAT')] += 1
+        if fd.get('PRODUCT'): self.products[fd.get('PRODUCT')] += 1
+        self.total_rules += 1
+
+    def rebuild(self, rules, previous=None):
+        """
+        Tính lại toàn bộ thống kê khi nạp lại tập luật.
+        previous: DashboardStats của tập luật đang phục vụ - giữ Last-Modified nếu ETag không đổi
+        """
+        self.reset()
+        for rule in rules:
+            self._add(rule)
+        body = json.dumps(self.to_dict(), ensure_ascii=False).encode('utf-8')
+        etag = hashlib.sha1(body).hexdigest()
+        if previous is not None and previous._snapshot is not None and previous._snapshot[1] == etag:
+            last_modified = previous._snapshot[2]
+        else:
+            last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self._snapshot = (body, etag, last_modified)
+
+    def to_dict(self):
+        hazard_sorted = self.hazards.most_common(10)
+        prod_cat_sorted = self.prod_cats.most_common(10)
+        product_sorted = self.products.most_common(10)
+
+        return {
+            'success': True,
+            'total_rules': self.total_rules,
+            'stats': {
+                'country_counts': dict(self.countries.most_common()),
+                'hazard_stats': {'labels': [x[0] for x in hazard_sorted], 'values': [x[1] for x in hazard_sorted]},
+                'prod_cat_stats': {'labels': [x[0] for x in prod_cat_sorted], 'values': [x[1] for x in prod_cat_sorted]},
+                'top_products_list': [{'name': x[0], 'count': x[1]} for x in product_sorted]
+            }
+        }
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple: (body JSON dạng bytes, etag, last_modified) - đã tính sẵn lúc rebuild
+        """
+        if self._snapshot is None:
+            self.rebuild([])
+        return self._snapshot
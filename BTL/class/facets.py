@@ -0,0 +1,68 @@
+"""
+facets.py - Bộ lọc dây chuyền (cascading facets) dựng sẵn khi khởi động
+
+Mỗi giá trị của một field được lưu thành một bitmap (số nguyên Python, bit i
+bật nếu luật thứ i có giá trị đó). Tập luật khớp với lựa chọn hiện tại là
+phép AND các bitmap, số luật ứng với mỗi giá trị là popcount của phép AND.
+"""
+
+try:
+    _popcount = int.bit_count  # Python 3.10+
+except AttributeError:
+    def _popcount(x):
+        return bin(x).count('1')
+
+
+def _bitmap_from_positions(positions, total):
+    buf = bytearray((total + 7) // 8)
+    for pos in positions:
+        buf[pos >> 3] |= 1 << (pos & 7)
+    return int.from_bytes(buf, 'little')
+
+
+class FacetEngine:
+    def __init__(self, index, total, fields):
+        """
+        Args:
+            index: chỉ mục ngược {field: {value: [vị trí luật]}} (build_inverted_index)
+            total: tổng số luật
+            fields: danh sách field cần tính facet (CASCADING_FIELDS)
+        """
+        self.fields = list(fields)
+        self.total = total
+        self.all_mask = (1 << total) - 1
+        self.bitmaps = {
+            field: {
+                value: _bitmap_from_positions(positions, total)
+                for value, positions in index.get(field, {}).items()
+            }
+            for field in self.fields
+        }
+        self._unfiltered = self._count(self.all_mask)
+
+    def _count(self, mask):
+        counts = {}
+        for field in self.fields:
+            field_counts = {}
+            if mask:
+                for value, bitmap in self.bitmaps[field].items():
+                    n = _popcount(bitmap & mask)
+                    if n:
+                        field_counts[value] = n
+            counts[field] = dict(sorted(field_counts.items()))
+        return counts
+
+    def counts(self, selected_values):
+        """
+        Trả về {field: {value: số luật}} cho các luật khớp TẤT CẢ lựa chọn.
+        Field/giá trị không tồn tại => không luật nào khớp.
+        """
+        if not selected_values:
+            return self._unfiltered
+
+        mask = self.all_mask
+        for key, val in selected_values.items():
+            mask &= self.bitmaps.get(key, {}).get(val, 0)
+            if not mask:
+                break
+        return self._count(mask)
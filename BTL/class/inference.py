@@ -1,4 +1,47 @@
-def forward_inference_detailed_rasff(initial_facts, rules):
+from bisect import bisect_left
+
+
+def build_inverted_index(rules):
+    """
+    Xây dựng chỉ mục ngược cho filter_data của các luật RASFF.
+
+    Kết quả: {field: {value: [vị trí luật trong `rules`]}}, mỗi danh sách
+    vị trí (posting list) được sắp tăng dần theo thứ tự luật.
+    """
+    index = {}
+    for pos, rule in enumerate(rules):
+        for key, val in rule.get('filter_data', {}).items():
+            index.setdefault(key, {}).setdefault(val, []).append(pos)
+    return index
+
+
+def _contains_sorted(postings, pos):
+    i = bisect_left(postings, pos)
+    return i < len(postings) and postings[i] == pos
+
+
+def _intersect_postings(fact_dict, index, total):
+    """Giao các posting list, bắt đầu từ danh sách ngắn nhất (fact chọn lọc nhất)"""
+    if not fact_dict:
+        return range(total)
+
+    postings = []
+    for key, val in fact_dict.items():
+        posting = index.get(key, {}).get(val)
+        if not posting:
+            return []
+        postings.append(posting)
+
+    postings.sort(key=len)
+    result = postings[0]
+    for other in postings[1:]:
+        result = [pos for pos in result if _contains_sorted(other, pos)]
+        if not result:
+            break
+    return result
+
+
+def forward_inference_detailed_rasff(initial_facts, rules, index=None):
     # Chuyển input của user thành Dict
     fact_dict = {}
     for f in initial_facts:
@@ -6,28 +49,36 @@ def forward_inference_detailed_rasff(initial_facts, rules):
             k, v = f.split('=', 1)
             fact_dict[k.strip()] = v.strip()
 
+    # Có chỉ mục ngược (build_inverted_index) thì chỉ duyệt các luật ứng viên,
+    # không thì quét toàn bộ tập luật như cũ
+    if index is not None:
+        candidates = _intersect_postings(fact_dict, index, len(rules))
+    else:
+        candidates = range(len(rules))
+
     matched_rules = []
-    
-    for rule in rules:
+
+    for pos in candidates:
+        rule = rules[pos]
         ve_phai = rule.get('vePhai')
         note = rule.get('Note')
         rule_id = rule.get('id')
         filter_data = rule.get('filter_data', {})
-        
+
         # Lấy thông tin Risk và Dist đã xử lý ở app.py
         risk = rule.get('risk', '0%')
         distribution = rule.get('distribution', 'N/A')
 
         is_match = True
         matched_conds = []
-        
-        # So sánh Input User vs Rule Data
+
+        # So sánh Input User vs Rule Data (đã được đảm bảo khi dùng chỉ mục)
         for key, val in fact_dict.items():
-            if filter_data.get(key) != val:
+            if index is None and filter_data.get(key) != val:
                 is_match = False
                 break
             matched_conds.append(f"{key}={val}")
-        
+
         if is_match and ve_phai:
             matched_rules.append({
                 'rule_id': rule_id,
@@ -45,4 +96,4 @@ def forward_inference_detailed_rasff(initial_facts, rules):
         'success': success,
         'results': matched_rules,
         'status': status
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,306 @@
+"""
+rasff_loader.py - Đọc file luật RASFF (Excel/CSV) thành global_rules
+
+Có hai loader cho cùng một kết quả:
+- build_rules_iterrows: loader gốc, xử lý từng dòng với df.iterrows()
+- build_rules_vectorized: xử lý theo cột bằng pandas (mặc định)
+"""
+import re
+import numpy as np
+import pandas as pd
+
+CASCADING_FIELDS = ['NOT_COUNTRY', 'TYPE', 'PROD_CAT', 'PRODUCT', 'HAZARDS_CAT', 'HAZARDS']
+
+def parse_ve_trai(ve_trai_str):
+    data = {}
+    if not isinstance(ve_trai_str, str) or not ve_trai_str:
+        return data
+    parts = ve_trai_str.split(',')
+    for part in parts:
+        if '=' in part:
+            key, val = part.split('=', 1)
+            key = key.strip().upper()
+            val = val.strip()
+            if key and val:  
+                data[key] = val
+    return data
+
+def find_action_column(columns):
+    if 'ACTION_TAKEN' in columns: return 'ACTION_TAKEN'
+    if 'ACTION' in columns: return 'ACTION'
+    for col in columns:
+        c_upper = str(col).upper()
+        if "ACTION" in c_upper or "TAKEN" in c_upper or "BIEN_PHAP" in c_upper or "XU_LY" in c_upper:
+            return col
+    return None
+
+# === [MỚI] HÀM TÍNH TOÁN RISK TỪ NOTE ===
+def calculate_risk_from_note(note_text):
+    """
+    Phân tích cột Note để tính chỉ số % rủi ro nếu cột RISK bị thiếu.
+    """
+    if not isinstance(note_text, str):
+        return 0 # Mặc định
+
+    # 1. Ưu tiên tìm mẫu "(x/5)" (Ví dụ: (3/5) -> 60%)
+    match = re.search(r'\((\d+)/5\)', note_text)
+    if match:
+        score = int(match.group(1))
+        # Quy đổi: (Điểm / 5) * 100
+        return int((score / 5) * 100)
+
+    # 2. Nếu không có số sao, tìm theo từ khóa ngữ nghĩa
+    text_lower = note_text.lower()
+    if 'serious' in text_lower or 'nghiêm trọng' in text_lower or 'cao' in text_lower:
+        return 85
+    elif 'decision not yet taken' in text_lower or 'chưa quyết định' in text_lower or 'undecided' in text_lower:
+        return 50
+    elif 'thấp' in text_lower or 'low' in text_lower:
+        return 20
+    
+    return 0 # Không xác định
+
+def read_dataframe(actual_path):
+    """Đọc file Excel/CSV, chuẩn hóa tên cột và tìm cột Action"""
+    if actual_path.endswith('.csv'):
+        try:
+            df = pd.read_csv(actual_path, encoding='utf-8-sig')
+        except:
+            df = pd.read_csv(actual_path, encoding='latin-1')
+    else:
+        df = pd.read_excel(actual_path, engine='openpyxl')
+    
+    action_col_original = find_action_column(df.columns)
+    df.columns = [str(c).strip().upper() for c in df.columns]
+    df = df.fillna('')
+    
+    action_col_upper = str(action_col_original).strip().upper() if action_col_original else None
+    
+    if action_col_upper:
+        print(f"✅ Đã map cột Action: '{action_col_original}'")
+    else:
+        print("⚠️ CẢNH BÁO: Không tìm thấy cột Action!")
+
+    return df, action_col_upper
+
+def build_rules_iterrows(df, action_col_upper):
+    """Loader gốc: xử lý từng dòng bằng df.iterrows() (giữ lại làm chuẩn so sánh)"""
+    rules = []
+    unique_values = {k: set() for k in CASCADING_FIELDS}
+
+    for idx, row in df.iterrows():
+        ve_phai = str(row.get('VE_PHAI') or row.get('THEN') or '').strip()
+        if not ve_phai: continue
+
+        raw_ve_trai = str(row.get('VE_TRAI', '')).strip()
+        combined_data = parse_ve_trai(raw_ve_trai)
+        dist_stat = combined_data.pop('DISTRIBUTION_STAT', 'Chưa có thông tin phân phối')
+
+        if str(row.get('PRODUCT', '')).strip(): combined_data['PRODUCT'] = str(row.get('PRODUCT')).strip()
+        if str(row.get('NOT_COUNTRY', '')).strip(): combined_data['NOT_COUNTRY'] = str(row.get('NOT_COUNTRY')).strip()
+        
+        action_val = 'Chưa có thông tin'
+        if action_col_upper:
+            raw_val = row.get(action_col_upper)
+            if pd.notna(raw_val) and str(raw_val).strip() != '' and str(raw_val).lower() != 'nan':
+                action_val = str(raw_val).strip()
+        
+        # === [MỚI] XỬ LÝ RISK PERCENTAGE TỰ ĐỘNG ===
+        # Lấy giá trị từ cột có sẵn
+        raw_risk = row.get('RISK_PERCENTAGE') or row.get('RISK')
+        risk_val = '0%'
+        
+        # Nếu có cột dữ liệu thì dùng
+        if pd.notna(raw_risk) and str(raw_risk).strip() != '' and str(raw_risk).strip() != '0%':
+            risk_val = str(raw_risk).strip()
+        else:
+            # Nếu không có, tự tính từ cột NOTE
+            note_content = str(row.get('NOTE') or '').strip()
+            calculated_risk = calculate_risk_from_note(note_content)
+            if calculated_risk > 0:
+                risk_val = f"{calculated_risk}%"
+        # =============================================
+
+        filter_data = {}
+        conditions_display = []
+        has_valid_data = False
+
+        for field in CASCADING_FIELDS:
+            val = combined_data.get(field)
+            if val:
+                filter_data[field] = val
+                unique_values[field].add(val)
+                conditions_display.append(f"{field}={val}")
+                has_valid_data = True
+        
+        if has_valid_data:
+            rule_id = str(row.get('ID', idx + 1)).strip()
+            if rule_id.endswith('.0'): rule_id = rule_id[:-2]
+
+            rules.append({
+                'id': rule_id, 
+                'veTrai': ", ".join(conditions_display),
+                'vePhai': ve_phai,
+                'Note': str(row.get('NOTE') or 'N/A').strip(),
+                'risk': risk_val, # Sử dụng giá trị đã xử lý ở trên
+                'action_taken': action_val,
+                'distribution': dist_stat,
+                'filter_data': filter_data
+            })
+
+    initial_values = {k: sorted(list(v)) for k, v in unique_values.items()}
+    return rules, initial_values
+
+
+def _or_chain(df, names, last):
+    """
+    Mô phỏng biểu thức `row.get(a) or row.get(b) or ... or last` cho cả cột.
+    `last` có thể là giá trị vô hướng hoặc một Series.
+    """
+    if isinstance(last, pd.Series):
+        result = last.astype(object)
+    else:
+        result = pd.Series([last] * len(df), index=df.index, dtype=object)
+    for name in reversed(names):
+        if name in df.columns:
+            col = df[name].astype(object)
+            result = col.where(col.astype(bool), result)
+    return result
+
+def _str_column(df, name):
+    """Tương đương str(row.get(name, '')).strip() cho cả cột"""
+    if name not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    return df[name].astype(str).str.strip()
+
+def _map_unique(series, fn):
+    """
+    Áp dụng phép biến đổi theo cột `fn` lên các giá trị KHÁC NHAU của series
+    rồi trải lại theo từng dòng (dictionary encoding: ô lặp lại chỉ xử lý 1 lần).
+    """
+    codes, uniques = pd.factorize(series)
+    result = fn(pd.Series(uniques, dtype=object))
+    taken = result.take(codes)
+    taken.index = series.index
+    return taken
+
+def _parse_ve_trai_columns(ve_trai, keys):
+    """
+    parse_ve_trai dạng cột: tách 'KEY=value, ...' của mọi dòng một lượt.
+    Trả về DataFrame (index = dòng, cột = keys), ô trống là ''.
+    """
+    def parse(values):
+        parts = values.str.split(',').explode()
+        kv = parts.str.partition('=')
+        pairs = pd.DataFrame({
+            'row': parts.index,
+            'key': kv[0].str.strip().str.upper().values,
+            'val': kv[2].str.strip().values,
+        })
+        valid = (kv[1].values == '=') & (pairs['key'] != '') & (pairs['val'] != '') & pairs['key'].isin(keys)
+        pairs = pairs[valid].drop_duplicates(['row', 'key'], keep='last')  # Key lặp lại: giá trị sau ghi đè
+        table = pairs.pivot(index='row', columns='key', values='val')
+        return table.reindex(index=values.index, columns=keys).fillna('')
+
+    return _map_unique(ve_trai, parse)
+
+def _risk_from_note_columns(note):
+    """calculate_risk_from_note dạng cột (str.extract + str.contains)"""
+    def compute(values):
+        score = values.str.extract(r'\((\d+)/5\)', expand=False)
+        has_score = score.notna()
+        score_pct = np.trunc(score.astype(float).fillna(0) / 5 * 100).astype(int)
+
+        text_lower = values.str.lower()
+        def contains_any(words):
+            mask = pd.Series(False, index=values.index)
+            for w in words:
+                mask |= text_lower.str.contains(w, regex=False)
+            return mask
+
+        return pd.Series(np.select(
+            [has_score,
+             contains_any(['serious', 'nghiêm trọng', 'cao']),
+             contains_any(['decision not yet taken', 'chưa quyết định', 'undecided']),
+             contains_any(['thấp', 'low'])],
+            [score_pct, 85, 50, 20],
+            default=0
+        ), index=values.index)
+
+    return _map_unique(note, compute)
+
+def build_rules_vectorized(df, action_col_upper):
+    """
+    Loader theo cột: xử lý mọi dòng cùng lúc bằng các phép toán pandas.
+    Cho kết quả giống hệt build_rules_iterrows.
+    """
+    ve_phai = _or_chain(df, ['VE_PHAI', 'THEN'], '').astype(str).str.strip()
+    df = df[ve_phai != '']
+    ve_phai = ve_phai[df.index]
+    if df.empty:
+        return [], {field: [] for field in CASCADING_FIELDS}
+
+    parsed = _parse_ve_trai_columns(_str_column(df, 'VE_TRAI'), CASCADING_FIELDS + ['DISTRIBUTION_STAT'])
+    dist_stat = parsed['DISTRIBUTION_STAT'].where(parsed['DISTRIBUTION_STAT'] != '', 'Chưa có thông tin phân phối')
+
+    # Cột PRODUCT / NOT_COUNTRY riêng (nếu có) ưu tiên hơn giá trị trong VE_TRAI
+    for field in ['PRODUCT', 'NOT_COUNTRY']:
+        col = _str_column(df, field)
+        parsed[field] = col.where(col != '', parsed[field])
+
+    action_val = pd.Series('Chưa có thông tin', index=df.index, dtype=object)
+    if action_col_upper:
+        raw_val = df[action_col_upper]
+        raw_str = raw_val.astype(str)
+        ok = raw_val.notna() & (raw_str.str.strip() != '') & (raw_str.str.lower() != 'nan')
+        action_val = raw_str.str.strip().where(ok, action_val)
+
+    # RISK: dùng cột có sẵn, thiếu thì tính từ NOTE
+    raw_risk = _or_chain(df, ['RISK_PERCENTAGE'], df['RISK'] if 'RISK' in df.columns else None)
+    raw_risk_str = raw_risk.astype(str).str.strip()
+    use_raw = raw_risk.notna() & (raw_risk_str != '') & (raw_risk_str != '0%')
+    risk_val = raw_risk_str.where(use_raw, '0%')
+    need_note = ~use_raw
+    if need_note.any():
+        # Chỉ phân tích NOTE cho các dòng thiếu RISK (giống loader gốc)
+        note_content = _or_chain(df[need_note], ['NOTE'], '').astype(str).str.strip()
+        calculated = _risk_from_note_columns(note_content)
+        risk_val[need_note] = (calculated.astype(str) + '%').where(calculated > 0, '0%')
+
+    fields = parsed[CASCADING_FIELDS]
+    has_valid_data = (fields != '').any(axis=1)
+
+    if 'ID' in df.columns:
+        rule_id = _str_column(df, 'ID')
+    else:
+        rule_id = pd.Series(df.index + 1, index=df.index).astype(str)
+    rule_id = rule_id.where(~rule_id.str.endswith('.0'), rule_id.str[:-2])
+
+    note_display = _or_chain(df, ['NOTE'], 'N/A').astype(str).str.strip()
+
+    keep = has_valid_data.values
+    rules = []
+    for rid, vp, note, risk, action, dist, values in zip(
+            rule_id[keep], ve_phai[keep], note_display[keep], risk_val[keep],
+            action_val[keep], dist_stat[keep], fields[keep].itertuples(index=False, name=None)):
+        filter_data = {field: val for field, val in zip(CASCADING_FIELDS, values) if val}
+        rules.append({
+            'id': rid,
+            'veTrai': ", ".join(f"{field}={val}" for field, val in filter_data.items()),
+            'vePhai': vp,
+            'Note': note,
+            'risk': risk,
+            'action_taken': action,
+            'distribution': dist,
+            'filter_data': filter_data
+        })
+
+    initial_values = {field: sorted(set(fields.loc[keep, field]) - {''}) for field in CASCADING_FIELDS}
+    return rules, initial_values
+
+def read_rules_from_file(actual_path, vectorized=True):
+    """Đọc file Excel/CSV và dựng danh sách luật + giá trị ban đầu cho bộ lọc"""
+    df, action_col_upper = read_dataframe(actual_path)
+    if vectorized:
+        return build_rules_vectorized(df, action_col_upper)
+    return build_rules_iterrows(df, action_col_upper)
@@ -0,0 +1,31 @@
+"""
+rule_set.py - Một phiên bản hoàn chỉnh của tập luật RASFF đang phục vụ
+
+RuleSet gom luật, chỉ mục ngược, facet và thống kê Dashboard thành một đối
+tượng dựng xong trọn vẹn rồi mới đưa vào dùng. Khi nạp lại, app.py dựng một
+RuleSet mới ở luồng nền rồi thay thế bằng MỘT phép gán tham chiếu, nên request
+đang chạy luôn thấy hoặc bộ cũ hoặc bộ mới, không bao giờ thấy trạng thái dở dang.
+"""
+import time
+
+from inference import build_inverted_index
+from facets import FacetEngine
+from dashboard_stats import DashboardStats
+
+
+class RuleSet:
+    def __init__(self, rules, initial_values, fields, normalize_country=None, source_path=None, previous=None):
+        """previous: RuleSet đang phục vụ (khi nạp lại) - thống kê không đổi thì giữ Last-Modified"""
+        self.rules = rules
+        self.initial_values = initial_values
+        self.index = build_inverted_index(rules)  # field -> value -> [vị trí luật]
+        self.facets = FacetEngine(self.index, len(rules), fields)
+        self.rule_by_id = {r['id']: r for r in rules}  # tra cứu O(1) khi làm giàu kết quả
+        self.stats = DashboardStats(normalize_country)
+        self.stats.rebuild(rules, previous.stats if previous is not None else None)
+        self.source_path = source_path
+        self.loaded_at = time.time()
+
+    @classmethod
+    def empty(cls, fields, normalize_country=None):
+        return cls([], {k: [] for k in fields}, fields, normalize_country)
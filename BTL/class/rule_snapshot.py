@@ -0,0 +1,63 @@
+"""
+rule_snapshot.py - Snapshot nhị phân (pickle) của tập luật RASFF đã parse
+
+Snapshot được gắn với file nguồn bằng (mtime, size) và SHA-256 nội dung:
+- mtime/size khớp  => dùng luôn, không cần đọc file nguồn
+- mtime/size đổi nhưng hash khớp (VD: file được copy lại) => vẫn dùng được
+- hash khác hoặc SNAPSHOT_VERSION khác => snapshot cũ, phải parse lại Excel
+"""
+import hashlib
+import os
+import pickle
+
+# Tăng khi thay đổi định dạng snapshot hoặc logic parse luật
+SNAPSHOT_VERSION = 1
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _fingerprint(path):
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def load_snapshot(snapshot_path, source_path):
+    """Trả về payload đã lưu, hoặc None nếu chưa có snapshot / snapshot đã cũ"""
+    if not os.path.exists(snapshot_path):
+        return None
+    try:
+        with open(snapshot_path, 'rb') as f:
+            snapshot = pickle.load(f)
+    except Exception:
+        return None
+
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        return None
+    if snapshot.get('source_fingerprint') == _fingerprint(source_path):
+        return snapshot['payload']
+    if snapshot.get('source_sha256') == file_sha256(source_path):
+        # Nội dung không đổi, chỉ cập nhật lại mtime để lần sau khỏi phải hash
+        save_snapshot(snapshot_path, source_path, snapshot['payload'], snapshot['source_sha256'])
+        return snapshot['payload']
+    return None
+
+
+def save_snapshot(snapshot_path, source_path, payload, source_sha256=None):
+    """Ghi snapshot ra file tạm rồi os.replace để không bao giờ để lại file ghi dở"""
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'source_fingerprint': _fingerprint(source_path),
+        'source_sha256': source_sha256 or file_sha256(source_path),
+        'payload': payload,
+    }
+    tmp_path = snapshot_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, snapshot_path)
@@ -0,0 +1,24 @@
+"""
+trace_log.py - Ghi vết suy diễn qua `logging` thay cho print()
+
+Vết chi tiết TẮT mặc định. Mỗi request có thể bật bằng cờ debug=True: khi đó
+bản ghi được phát ở mức INFO. Không bật cờ thì bản ghi ở mức DEBUG và chỉ xuất
+hiện khi logger được cấu hình ở DEBUG.
+
+Mỗi bản ghi mang thêm thuộc tính `event` (tên sự kiện) và `fields` (dict dữ
+liệu có cấu trúc) để handler/formatter JSON có thể dùng trực tiếp. Chuỗi
+thông điệp dùng định dạng lười (`%s`), chỉ được format khi thật sự ghi ra.
+"""
+import logging
+
+
+class InferenceTrace:
+    def __init__(self, logger, debug=False):
+        self.logger = logger
+        self.level = logging.INFO if debug else logging.DEBUG
+        # Kiểm tra một lần cho cả request; tắt thì mọi lời gọi chỉ tốn một phép so sánh
+        self.enabled = logger.isEnabledFor(self.level)
+
+    def __call__(self, event, msg, *args, **fields):
+        if self.enabled:
+            self.logger.log(self.level, msg, *args, extra={'event': event, 'fields': fields})
@@ -0,0 +1,28 @@
+# Các module của BTL nằm phẳng trong BTL/class (không phải package).
+# 16luat/class cũng có module phẳng trùng tên (inference, backward_inference), nên khi chạy
+# cả hai bộ test trong một lần pytest, trước khi nạp mỗi file test của thư mục này phải
+# đưa BTL/class lên đầu sys.path và bỏ các module cùng tên đã nạp từ thư mục khác.
+import glob
+import os
+import sys
+
+CLASS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'class'))
+MODULE_NAMES = {os.path.splitext(os.path.basename(p))[0] for p in glob.glob(os.path.join(CLASS_DIR, '*.py'))}
+
+
+def _use_class_dir():
+    if sys.path[:1] != [CLASS_DIR]:
+        sys.path.insert(0, CLASS_DIR)
+    for name in MODULE_NAMES:
+        module = sys.modules.get(name)
+        path = getattr(module, '__file__', None) or ''
+        if module is not None and os.path.dirname(os.path.abspath(path)) != CLASS_DIR:
+            del sys.modules[name]
+
+
+_use_class_dir()
+
+
+def pytest_collect_file(file_path, parent):
+    # Gọi cho từng file trong thư mục này, trước khi file test đó được import
+    _use_class_dir()
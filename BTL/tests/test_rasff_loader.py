@@ -0,0 +1,49 @@
+# Loader theo cột phải cho cùng luật và giá trị khởi tạo như loader iterrows
+import os
+
+import numpy as np
+import pytest
+
+from benchmark_loader import make_synthetic_sheet
+from rasff_loader import build_rules_iterrows, build_rules_vectorized, read_dataframe
+
+SOURCE = os.path.join(os.path.dirname(__file__), '..', 'class', 'RASFF_Final_Complete.xlsx')
+
+
+@pytest.fixture(scope='module')
+def source():
+    return read_dataframe(SOURCE)
+
+
+def _assert_same(df, action_col):
+    assert build_rules_vectorized(df, action_col) == build_rules_iterrows(df, action_col)
+
+
+def test_real_file(source):
+    df, action_col = source
+    _assert_same(df, action_col)
+
+
+def test_synthetic_sheet_with_missing_risk(source):
+    df, action_col = source
+    _assert_same(make_synthetic_sheet(df, 3000, seed=6), action_col)
+
+
+def test_blank_and_malformed_cells(source):
+    df, action_col = source
+    df = make_synthetic_sheet(df, 600, seed=7)
+    rng = np.random.default_rng(8)
+    for col, values in [('VE_TRAI', [np.nan, '', 'PROD_CAT', 'PROD_CAT=,=x', ' HAZARDS = a , PROD_CAT=b=c ']),
+                        ('VE_PHAI', [np.nan, '', 'RISK_DECISION=']),
+                        ('NOTE', [np.nan, '', 'rủi ro (4/5)']),
+                        (action_col, [np.nan, ''])]:
+        df[col] = df[col].astype(object)
+        picked = rng.random(len(df)) < 0.2
+        df.loc[picked, col] = rng.choice(np.array(values, dtype=object), size=picked.sum())
+    _assert_same(df, action_col)
+
+
+def test_without_optional_columns(source):
+    df, action_col = source
+    df = make_synthetic_sheet(df, 400, seed=9).drop(columns=['ID', 'RISK_PERCENTAGE', 'PRODUCT'])
+    _assert_same(df, action_col)